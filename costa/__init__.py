@@ -1,2 +1,64 @@
-from .buildpermap import build_cooling_permap, build_heating_permap
-from .permap import Permap
+"""
+Costa: complete and supplement performance tables.
+
+Submodules and their public objects are imported on first access, so
+that ``import costa`` does not load pandas.  The ``pm`` DataFrame
+accessor is registered by :mod:`costa.permap`, which is imported by all
+the submodules working with DataFrames, and on first access to any
+attribute of the package once pandas is imported.
+"""
+
+import importlib
+import sys
+
+_SUBMODULES = (
+    'backends', 'batch', 'buildpermap', 'cli', 'collection', 'compare',
+    'defaults', 'emulator', 'interpolate', 'permap', 'pipeline', 'spec',
+    'store'
+)
+_ATTRIBUTES = {
+    'build_directory': 'batch',
+    'build_cooling_permap': 'buildpermap',
+    'build_heating_permap': 'buildpermap',
+    'load_permap': 'buildpermap',
+    'read_permap': 'buildpermap',
+    'PermapCollection': 'collection',
+    'diff': 'compare',
+    'TabulatedCorrection': 'interpolate',
+    'Permap': 'permap',
+    'FillSpec': 'spec',
+    'run': 'spec',
+    'run_all': 'spec',
+    'run_pipeline': 'pipeline',
+    'MapStore': 'store',
+}
+
+__all__ = list(_ATTRIBUTES)
+
+
+def _register_accessor():
+    """Register the ``pm`` accessor if pandas is already imported."""
+    if 'pandas' in sys.modules:
+        importlib.import_module('.permap', __name__)
+
+
+def __getattr__(name):
+    """Import submodules and their public objects on first access."""
+    if name in _SUBMODULES:
+        module = importlib.import_module(f'.{name}', __name__)
+        _register_accessor()
+        return module
+    if name in _ATTRIBUTES:
+        module = importlib.import_module(f'.{_ATTRIBUTES[name]}', __name__)
+        _register_accessor()
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__) | set(_SUBMODULES))
+
+
+_register_accessor()
@@ -0,0 +1,394 @@
+"""
+The :mod:`~costa.backends` module provides the kernels doing the heavy
+numerical work of filling performance maps: the default correction
+functions, the outer-product extension along new levels, the split of
+the total capacity with the sensible heat ratio, and the scaling of
+values for normalization.
+
+The NumPy backend is the reference.  Backends based on numexpr_ or
+numba_ can be selected at runtime with :func:`set_backend` (or the
+``COSTA_BACKEND`` environment variable) when these packages are
+installed.  All backends give the same results within floating point
+rounding.
+
+.. _numexpr: https://github.com/pydata/numexpr
+.. _numba: https://numba.pydata.org
+"""
+
+import importlib.util
+import math
+import os
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+
+FLAG = -999
+# Below this number of values, accelerated backends defer to NumPy, whose
+# overhead is lower
+_MIN_SIZE = 4096
+
+
+class NumpyBackend:
+    """Reference backend, built on NumPy universal functions.
+
+    All kernels write their result into a preallocated `out` array, so
+    that they can be called on blocks of rows from several threads.
+    Accelerated backends override some of the kernels.
+    """
+
+    name = 'numpy'
+    requires = None
+
+    def weibull(self, x, amp, scale, shape, out):
+        """Scaled Weibull cumulative distribution function."""
+        np.divide(x, scale, out=out)
+        np.power(out, shape, out=out)
+        np.negative(out, out=out)
+        np.exp(out, out=out)
+        np.subtract(1, out, out=out)
+        np.multiply(amp, out, out=out)
+
+    def compexp(self, x, amp, scale, shape, lift, shift, out):
+        """Lifted and shifted compressed exponential function."""
+        np.subtract(x, shift, out=out)
+        np.maximum(out, 0, out=out)  # avoids divergence at low values
+        np.divide(out, scale, out=out)
+        np.power(out, shape, out=out)
+        np.negative(out, out=out)
+        np.exp(out, out=out)
+        np.multiply(np.subtract(amp, lift), out, out=out)
+        np.add(out, lift, out=out)
+
+    def outer(self, factors, values, out):
+        """Extend values with one block per row of factors.
+
+        Computes ``out[i, j, k] = factors[i, k] * values[j, k]``.
+        """
+        np.multiply(values[np.newaxis], factors[:, np.newaxis], out=out)
+
+    def scale(self, values, factors, out, keep_flags=False):
+        """Scale each column of values by a factor.
+
+        Computes ``out[j, k] = values[j, k] * factors[k]``, except for
+        values flagged with -999 if `keep_flags` is ``True``.
+        """
+        np.multiply(values, factors, out=out)
+        if keep_flags:
+            np.copyto(out, values, where=values == FLAG)
+
+    def split_capacity(self, total, power, ratio, valid, out):
+        """Split total capacities with sensible heat ratios.
+
+        The columns of `out` receive the power, the sensible capacity
+        ``total * ratio`` and the latent capacity (the remainder of the
+        total), and the rows which are not `valid` are flagged with -999.
+        """
+        out[:, 0] = power
+        # The sensible part is kept at full precision for the latent one
+        sensible = np.multiply(total, ratio)
+        out[:, 1] = sensible
+        np.subtract(total, sensible, out=out[:, 2], casting='same_kind')
+        out[~valid] = FLAG
+
+
+class NumexprBackend(NumpyBackend):
+    """Backend evaluating the kernels with numexpr.
+
+    numexpr evaluates whole expressions by cache-sized blocks on several
+    cores, without the temporary arrays of successive NumPy operations.
+    """
+
+    name = 'numexpr'
+    requires = 'numexpr'
+
+    def __init__(self):
+        """Constructor for the NumexprBackend class."""
+        import numexpr
+
+        self._evaluate = numexpr.evaluate
+
+    def _run(self, expression, out, **operands):
+        self._evaluate(expression, local_dict=operands, out=out,
+                       casting='same_kind')
+
+    def weibull(self, x, amp, scale, shape, out):
+        if out.size < _MIN_SIZE:
+            return super().weibull(x, amp, scale, shape, out)
+        self._run('amp * (1 - exp(-(x / scale) ** shape))', out,
+                  x=x, amp=amp, scale=scale, shape=shape)
+
+    def compexp(self, x, amp, scale, shape, lift, shift, out):
+        if out.size < _MIN_SIZE:
+            return super().compexp(x, amp, scale, shape, lift, shift, out)
+        self._run(
+            'lift + (amp - lift) * exp(-(where(x > shift, x - shift, 0) '
+            '/ scale) ** shape)', out,
+            x=x, amp=amp, scale=scale, shape=shape, lift=lift, shift=shift
+        )
+
+    def outer(self, factors, values, out):
+        if values.size < _MIN_SIZE:
+            return super().outer(factors, values, out)
+        # Blocks of rows of a single entry are contiguous
+        for i, row in enumerate(factors):
+            self._run('values * row', out[i], values=values, row=row)
+
+    def scale(self, values, factors, out, keep_flags=False):
+        if values.size < _MIN_SIZE:
+            return super().scale(values, factors, out, keep_flags)
+        expression = 'where(values == -999, values, values * factors)'
+        self._run(expression if keep_flags else 'values * factors', out,
+                  values=values, factors=factors)
+
+
+def _weibull(x, amp, scale, shape):
+    return amp * (1 - math.exp(-(x / scale) ** shape))
+
+
+def _compexp(x, amp, scale, shape, lift, shift):
+    shifted = max(x - shift, 0)
+    return lift + (amp - lift) * math.exp(-(shifted / scale) ** shape)
+
+
+def _outer(factors, values, out):
+    for i in range(factors.shape[0]):
+        for j in range(values.shape[0]):
+            for k in range(values.shape[1]):
+                out[i, j, k] = factors[i, k] * values[j, k]
+
+
+def _scale(values, factors, out, keep_flags):
+    for j in range(values.shape[0]):
+        for k in range(values.shape[1]):
+            value = values[j, k]
+            if keep_flags and value == FLAG:
+                out[j, k] = value
+            else:
+                out[j, k] = value * factors[k]
+
+
+class NumbaBackend(NumpyBackend):
+    """Backend running compiled numba kernels.
+
+    The correction functions are compiled as universal functions, and
+    the extension and scaling as loops releasing the GIL, so that blocks
+    of rows run in parallel threads.  The first call of each kernel
+    with new types is slower, since it is compiled.
+    """
+
+    name = 'numba'
+    requires = 'numba'
+
+    def __init__(self):
+        """Constructor for the NumbaBackend class."""
+        import numba
+
+        def ufunc(function, arguments):
+            signatures = [
+                f"{t}({', '.join([t] * arguments)})"
+                for t in ('float32', 'float64')
+            ]
+            return numba.vectorize(signatures, nopython=True)(function)
+
+        self._weibull = ufunc(_weibull, 4)
+        self._compexp = ufunc(_compexp, 6)
+        self._outer = numba.njit(nogil=True)(_outer)
+        self._scale = numba.njit(nogil=True)(_scale)
+
+    def weibull(self, x, amp, scale, shape, out):
+        if out.size < _MIN_SIZE:
+            return super().weibull(x, amp, scale, shape, out)
+        self._weibull(x, amp, scale, shape, out=out)
+
+    def compexp(self, x, amp, scale, shape, lift, shift, out):
+        if out.size < _MIN_SIZE:
+            return super().compexp(x, amp, scale, shape, lift, shift, out)
+        self._compexp(x, amp, scale, shape, lift, shift, out=out)
+
+    def outer(self, factors, values, out):
+        if values.size < _MIN_SIZE:
+            return super().outer(factors, values, out)
+        self._outer(factors, values, out)
+
+    def scale(self, values, factors, out, keep_flags=False):
+        if values.size < _MIN_SIZE:
+            return super().scale(values, factors, out, keep_flags)
+        self._scale(values, factors, out, keep_flags)
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (NumpyBackend, NumexprBackend, NumbaBackend)
+}
+_PREFERENCE = ('numba', 'numexpr', 'numpy')
+_instances = {}
+_current = None
+
+
+def available_backends():
+    """Return the names of the backends whose requirements are installed."""
+    return [
+        name for name, backend in BACKENDS.items()
+        if backend.requires is None
+        or importlib.util.find_spec(backend.requires) is not None
+    ]
+
+
+def _instance(name):
+    """Return the (cached) instance of a backend."""
+    if name == 'auto':
+        available = available_backends()
+        name = next(name for name in _PREFERENCE if name in available)
+    if name not in BACKENDS:
+        raise ValueError(
+            f"backend must be one of {list(BACKENDS)} or 'auto'."
+        )
+    if name not in _instances:
+        _instances[name] = BACKENDS[name]()
+    return _instances[name]
+
+
+def get_backend():
+    """Return the backend in use.
+
+    By default, the backend named by the ``COSTA_BACKEND`` environment
+    variable, or the NumPy backend.
+    """
+    global _current
+    if _current is None:
+        _current = _instance(os.environ.get('COSTA_BACKEND', 'numpy'))
+    return _current
+
+
+def set_backend(name):
+    """Select the backend used by subsequent computations.
+
+    Parameters
+    ----------
+    name : {'numpy', 'numexpr', 'numba', 'auto'}
+        The backend, or ``'auto'`` for the fastest installed one.
+
+    Returns
+    -------
+    backend
+        The selected backend.
+
+    Raises
+    ------
+    ValueError
+        If the backend is unknown.
+    ImportError
+        If the package required by the backend is not installed.
+
+    Examples
+    --------
+    >>> costa.backends.set_backend('numpy').name
+    'numpy'
+
+    """
+    global _current
+    _current = _instance(name)
+    return _current
+
+
+@contextmanager
+def use_backend(name):
+    """Context manager selecting a backend temporarily.
+
+    Examples
+    --------
+    >>> with use_backend('numba'):
+    ...     filled = permap.pm.fill()
+
+    """
+    previous = get_backend()
+    set_backend(name)
+    try:
+        yield _current
+    finally:
+        set_backend(previous.name)
+
+
+def benchmark(backends=None, rows=(10_000, 100_000, 1_000_000), repeat=3,
+              dtype=np.float64):
+    """Time the kernels of several backends.
+
+    The kernels run on arrays shaped like those of filled performance
+    maps: three columns, the default correction parameters, and ten
+    entries for the outer-product extension.
+
+    Parameters
+    ----------
+    backends : list of str, optional
+        The backends to compare, by default all the installed ones.
+    rows : sequence of int, default (10_000, 100_000, 1_000_000)
+        Numbers of rows of the performance maps.
+    repeat : int, default 3
+        Number of runs of each kernel, the fastest of which is kept.
+    dtype : data-type, default numpy.float64
+        Floating point type of the values.
+
+    Returns
+    -------
+    :class:`~pandas.DataFrame`
+        The time of each kernel in seconds, indexed by kernel and number
+        of rows, with one column per backend.
+
+    Examples
+    --------
+    >>> costa.backends.benchmark(rows=[100_000])
+                           numpy   numexpr
+    kernel         rows
+    weibull        100000  0.0031  0.0009
+    ...
+
+    """
+    import pandas as pd
+
+    backends = available_backends() if backends is None else backends
+    rng = np.random.default_rng(3254)
+    timings = {}
+    for name in backends:
+        backend = _instance(name)
+        for size in rows:
+            x = rng.uniform(0.1, 1.5, size).astype(dtype)
+            values = rng.uniform(0.1, 5, (size, 3)).astype(dtype)
+            values[::7, :] = FLAG
+            factors = rng.uniform(0.5, 1.5, (10, 3)).astype(dtype)
+            valid = values[:, 0] != FLAG
+            kernels = {
+                'weibull': lambda out: backend.weibull(
+                    x, 1.0, 0.75, 2.3, out
+                ),
+                'compexp': lambda out: backend.compexp(
+                    x, 1.03, 0.47, 1.86, -0.16, 0.07, out
+                ),
+                'outer': lambda out: backend.outer(
+                    factors, values[:size // 10], out
+                ),
+                'scale': lambda out: backend.scale(
+                    values, factors[0], out, keep_flags=True
+                ),
+                'split_capacity': lambda out: backend.split_capacity(
+                    values[:, 1], values[:, 0], x, valid, out
+                )
+            }
+            shapes = {
+                'weibull': x.shape, 'compexp': x.shape,
+                'outer': (10, size // 10, 3), 'scale': values.shape,
+                'split_capacity': values.shape
+            }
+            for kernel, run in kernels.items():
+                out = np.empty(shapes[kernel], dtype)
+                run(out)  # compiles numba kernels before timing
+                best = math.inf
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    run(out)
+                    best = min(best, time.perf_counter() - start)
+                timings[(kernel, size, name)] = best
+    result = pd.Series(timings).unstack()
+    result.index.names = ['kernel', 'rows']
+    return result.reindex(columns=backends)
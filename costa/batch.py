@@ -0,0 +1,287 @@
+"""
+The :mod:`~costa.batch` module generates performance maps for whole
+directories of manufacturer data files, rebuilding only the maps whose
+input or settings changed since the previous run.
+
+Pandas and the performance map machinery are only imported by the
+functions that need them, so that checking which inputs changed stays
+cheap in short-lived processes.
+"""
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+
+MANIFEST = "costa-manifest.json"
+
+
+def detect_mode(datafile):
+    """Return the operating mode of a manufacturer data file.
+
+    Cooling data files give both the dry-bulb and the wet-bulb room
+    temperatures on their first two lines, heating data files only the
+    dry-bulb temperature.
+    """
+    with open(datafile, 'r') as f:
+        f.readline()
+        second = f.readline().split()
+    return 'cooling' if second and second[0] == 'Twbr' else 'heating'
+
+
+def file_hash(filename, blocksize=1 << 20):
+    """Return the SHA-256 digest of the content of a file."""
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(blocksize), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def settings_hash(settings):
+    """Return the SHA-256 digest of JSON-serializable job settings."""
+    encoded = json.dumps(settings, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def build_one(datafile, output, settings=None):
+    """Build, fill and write the performance map of a manufacturer file.
+
+    Parameters
+    ----------
+    datafile : str or path-like
+        Manufacturer data file, in the format of the files read by
+        :func:`~costa.buildpermap.build_cooling_permap` or
+        :func:`~costa.buildpermap.build_heating_permap`.
+    output : str or path-like
+        File to which the filled performance map is written.
+    settings : dict, optional
+        Job settings: the fields of a :class:`~costa.spec.FillSpec`
+        other than the source (e.g. ``'entries'`` or ``'norm'``).  The
+        ``'majororder'`` key may be given directly instead of in
+        ``'output'``.
+
+    Returns
+    -------
+    int
+        The number of rows of the filled performance map.
+
+    """
+    from .spec import FillSpec, run
+
+    settings = dict({} if settings is None else settings)
+    output_settings = dict(settings.pop('output', {}))
+    if 'majororder' in settings:
+        output_settings['majororder'] = settings.pop('majororder')
+    # Outputs are written under a temporary name so that an interrupted
+    # job never leaves a partial file behind
+    temporary = f"{output}.tmp"
+    output_settings['filename'] = temporary
+    spec = FillSpec.from_dict(
+        {**settings, 'source': datafile, 'output': output_settings}
+    )
+    filled = run(spec)
+    os.replace(temporary, output)
+    return len(filled)
+
+
+def _read_manifest(path):
+    """Return the file records of a manifest, or an empty dict."""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)['files']
+    except FileNotFoundError:
+        return {}
+
+
+def _write_manifest(path, records):
+    """Write a manifest atomically."""
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w') as f:
+        json.dump({'version': 1, 'files': records}, f, indent=1,
+                  sort_keys=True)
+    os.replace(temporary, path)
+
+
+def _common_root(datafiles):
+    """Return the deepest directory containing all data files."""
+    parents = [os.path.abspath(datafile.parent) for datafile in datafiles]
+    return Path(os.path.commonpath(parents)) if parents else Path('.')
+
+
+def build_maps(datafiles, output_dir, settings=None, jobs=1, manifest=None,
+               force=False, root=None, callback=None):
+    """Generate the performance maps of manufacturer data files.
+
+    A manifest recording the hash of each input file, the hash of the job
+    settings and the output file is kept in `output_dir`.  On later runs,
+    only the inputs whose content or settings changed (or whose output is
+    missing) are built, filled and written again.  Other outputs are left
+    untouched.
+
+    Parameters
+    ----------
+    datafiles : iterable of str or path-like
+        Manufacturer data files.
+    output_dir : str or path-like
+        Directory receiving the performance maps, with the same paths
+        relative to `output_dir` as the inputs relative to `root`, and a
+        ``.dat`` suffix.
+    settings : dict, optional
+        Job settings shared by all files (see :func:`build_one`).
+    jobs : int, default 1
+        Number of worker processes.
+    manifest : str or path-like, optional
+        Manifest file, by default ``costa-manifest.json`` in `output_dir`.
+    force : bool, default False
+        If ``True``, all maps are rebuilt.
+    root : str or path-like, optional
+        Directory of reference for the input paths, by default the
+        deepest directory containing all the inputs.
+    callback : callable, optional
+        Function called as ``callback(input, status, seconds)`` each time
+        a map is written, e.g. to report progress.
+
+    Returns
+    -------
+    :class:`~pandas.DataFrame`
+        For each input file, the output file, the status (``'built'`` or
+        ``'unchanged'``), the number of rows written and the time taken.
+
+    Raises
+    ------
+    Exception
+        The error of the first job that failed, once all the other jobs
+        are completed and recorded in the manifest.
+
+    """
+    datafiles = [Path(datafile) for datafile in datafiles]
+    root = _common_root(datafiles) if root is None else Path(root)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = output_dir / MANIFEST if manifest is None else Path(manifest)
+    previous = _read_manifest(manifest)
+    config = settings_hash({} if settings is None else settings)
+    records, pending = {}, {}
+    for datafile in datafiles:
+        key = Path(os.path.abspath(datafile)).relative_to(root).as_posix()
+        output = (output_dir / key).with_suffix('.dat')
+        stat = datafile.stat()
+        record = previous.get(key, {})
+        if record.get('stat') == [stat.st_size, stat.st_mtime_ns]:
+            # The content is only hashed again if the file was touched
+            digest = record['input_hash']
+        else:
+            digest = file_hash(datafile)
+        records[key] = {
+            'input_hash': digest,
+            'settings_hash': config,
+            'stat': [stat.st_size, stat.st_mtime_ns],
+            'output': output.relative_to(output_dir).as_posix(),
+            'rows': record.get('rows')
+        }
+        unchanged = (
+            not force and output.exists()
+            and record.get('input_hash') == digest
+            and record.get('settings_hash') == config
+            and record.get('output') == records[key]['output']
+        )
+        if not unchanged:
+            output.parent.mkdir(parents=True, exist_ok=True)
+            pending[key] = (datafile, output)
+    status = {key: 'unchanged' for key in records}
+    seconds = {}
+    done = {key: record for key, record in records.items()
+            if key not in pending}
+
+    def complete(key, rows, elapsed):
+        records[key]['rows'] = rows
+        done[key], status[key], seconds[key] = records[key], 'built', elapsed
+        if callback is not None:
+            callback(key, 'built', elapsed)
+
+    errors = []
+
+    def run(key, build):
+        # A failed job does not prevent the others from being recorded
+        try:
+            rows, elapsed = build()
+        except Exception as error:
+            errors.append(error)
+        else:
+            complete(key, rows, elapsed)
+
+    try:
+        if jobs > 1 and len(pending) > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                futures = {
+                    executor.submit(_timed_build, *paths, settings): key
+                    for key, paths in pending.items()
+                }
+                # Outputs are reported in order of completion
+                for future in as_completed(futures):
+                    run(futures[future], future.result)
+        else:
+            for key, paths in pending.items():
+                run(key, lambda: _timed_build(*paths, settings))
+    finally:
+        # Completed jobs are recorded even if another one failed
+        _write_manifest(manifest, done)
+    if errors:
+        raise errors[0]
+    import pandas as pd
+
+    return pd.DataFrame({
+        'output': [
+            str(output_dir / record['output']) for record in records.values()
+        ],
+        'status': [status[key] for key in records],
+        'rows': [record['rows'] for record in records.values()],
+        'seconds': [seconds.get(key) for key in records]
+    }, index=pd.Index(list(records), name='input'))
+
+
+def _timed_build(datafile, output, settings):
+    """Run :func:`build_one` and return the rows written and the time."""
+    start = time.perf_counter()
+    rows = build_one(datafile, output, settings)
+    return rows, time.perf_counter() - start
+
+
+def build_directory(input_dir, output_dir, settings=None, pattern='*.txt',
+                    **kwargs):
+    """Generate the performance maps of a directory of manufacturer files.
+
+    Parameters
+    ----------
+    input_dir : str or path-like
+        Directory searched recursively for manufacturer data files.
+    output_dir : str or path-like
+        Directory receiving the performance maps, with the same relative
+        paths as the inputs and a ``.dat`` suffix.
+    settings : dict, optional
+        Job settings shared by all files (see :func:`build_one`).
+    pattern : str, default '*.txt'
+        Glob pattern of the input files.
+    **kwargs
+        Other arguments passed to :func:`build_maps`, e.g. `jobs`.
+
+    Returns
+    -------
+    :class:`~pandas.DataFrame`
+        See :func:`build_maps`.
+
+    Examples
+    --------
+    >>> settings = {'entries': {'freq': [0.2, 0.4, 0.6, 0.8, 1]}}
+    >>> report = build_directory("data", "maps", settings, jobs=4)
+
+    """
+    input_dir = Path(input_dir)
+    return build_maps(
+        sorted(input_dir.rglob(pattern)), output_dir, settings,
+        root=os.path.abspath(input_dir), **kwargs
+    )
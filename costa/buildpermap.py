@@ -1,9 +1,13 @@
+import json
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 
+from .permap import Permap, _infer_compression, _open_text
 
-def build_cooling_permap(datafile=None):
+
+def build_cooling_permap(datafile=None, dtype=None):
     """Read cooling performance map into an extendable DataFrame."""
     if datafile is None:
         parent = Path(__file__).parent
@@ -27,10 +31,11 @@ def build_cooling_permap(datafile=None):
         ['cooling', 'Tdbr', 'Twbr'], axis='columns'
     )
     permap = right_order.sort_index().stack().stack()
-    return permap.reorder_levels(['Tdbr', 'Twbr', 'Tdbo']).sort_index()
+    permap = permap.reorder_levels(['Tdbr', 'Twbr', 'Tdbo']).sort_index()
+    return permap if dtype is None else permap.astype(dtype)
 
 
-def build_heating_permap(datafile=None):
+def build_heating_permap(datafile=None, dtype=None):
     """Read heating performance map into an extendable DataFrame."""
     if datafile is None:
         parent = Path(__file__).parent
@@ -47,5 +52,129 @@ def build_heating_permap(datafile=None):
     rowidx = pd.Index(Tdbo, name='Tdbo')
     df = pd.DataFrame(raw_data, index=rowidx, columns=colidx)
     wrong_format = df.swaplevel('Tdbr', 'heating', axis=1).sort_index(axis=1)
-    wrong_format.T.unstack().T.swaplevel('Tdbo', 'Tdbr').sort_index()
-    return wrong_format.T.unstack().T.swaplevel('Tdbo', 'Tdbr').sort_index()
+    permap = wrong_format.T.unstack().T.swaplevel('Tdbo', 'Tdbr').sort_index()
+    return permap if dtype is None else permap.astype(dtype)
+
+
+def load_permap(filename, dtype=None):
+    """Read a performance map saved with :meth:`Permap.save
+    <costa.permap.Permap.save>`.
+
+    Parameters
+    ----------
+    filename : str or path-like
+        The file to read.
+    dtype : data-type, optional
+        Type of the returned values.  By default, the stored type is kept.
+
+    Returns
+    -------
+    :class:`~pandas.DataFrame`
+        The performance map, with its operating mode, ranges and
+        normalization state restored.
+
+    """
+    with np.load(filename) as archive:
+        attributes = json.loads(archive['attributes'][()])
+        levels = {
+            name: archive[f'level{i}']
+            for i, name in enumerate(attributes['levels'])
+        }
+        values = archive['values']
+    if dtype is not None:
+        values = values.astype(dtype, copy=False)
+    return _from_grid(levels, values, attributes)
+
+
+def _from_grid(levels, values, attributes):
+    """Build a performance map from a grid and its saved attributes."""
+    columns = pd.Index(attributes['columns'], name=attributes['mode'])
+    permap = Permap.from_grid(levels, values, columns)
+    pm = permap.pm
+    if attributes['mode'] is not None:
+        pm.mode = attributes['mode']
+    pm._normalized = attributes['normalized']
+    pm.ranges = {
+        name: pd.Interval(*bounds, closed='both')
+        for name, bounds in attributes['ranges'].items()
+    }
+    return permap
+
+
+def _read_header(f):
+    """Read the header of a Type 3254 file up to the data block.
+
+    Returns the level names with their operating ranges, and the names
+    of the data block columns.
+    """
+    ranges, names = {}, []
+    for line in f:
+        if line.startswith('!# Number of '):
+            name = line[len('!# Number of '):].split(' data points')[0]
+            _, left, right = next(f).split()
+            ranges[name] = pd.Interval(float(left), float(right), 'both')
+        elif line.startswith('!#\t'):
+            names = line.rstrip('\r\n').split('\t')[1:]
+            break
+    if not names:
+        raise ValueError("no performance data found in file.")
+    return ranges, names
+
+
+def read_permap(filename, chunksize=None, dtype=None, compression='infer'):
+    """Read a performance map written for the Type 3254.
+
+    Parameters
+    ----------
+    filename : str or path-like
+        A file written with :meth:`Permap.write <costa.permap.Permap.write>`.
+    chunksize : int, optional
+        If given, return an iterator over chunks of `chunksize` rows in
+        the order of the file, to process large files without loading
+        them entirely.
+    dtype : data-type, optional
+        Type of the returned values.
+    compression : {'infer', 'gzip', 'bz2', 'xz', None}, default 'infer'
+        Compression of the file, inferred from the extension of
+        `filename` (``.gz``, ``.bz2`` or ``.xz``) by default.  Files are
+        decompressed as they are read, also in chunks.
+
+    Returns
+    -------
+    :class:`~pandas.DataFrame` or iterator
+        The performance map, with its operating ranges and the mode
+        deduced from its columns, or an iterator over DataFrames.
+
+    """
+    f = _open_text(filename, 'r', _infer_compression(filename, compression))
+    try:
+        ranges, names = _read_header(f)
+        nlevels = len(ranges)
+        reader = pd.read_csv(
+            f, sep='\t', header=None, names=[''] + names,
+            # Fixed-width files pad the values, including 'nan' and 'inf'
+            skipinitialspace=True, usecols=names, index_col=list(range(nlevels)),
+            dtype=None if dtype is None else {
+                name: dtype for name in names[nlevels:]
+            },
+            chunksize=chunksize
+        )
+    except BaseException:
+        f.close()
+        raise
+    if chunksize is not None:
+        return _chunks(reader, f)
+    with f:
+        permap = reader
+    # Files written in column-major order have their levels flipped
+    permap = permap.reorder_levels(list(ranges)).sort_index()
+    mode = 'cooling' if 'sensible_capacity' in permap else 'heating'
+    permap.pm.mode = mode
+    permap.pm.ranges = ranges
+    return permap
+
+
+def _chunks(reader, f):
+    """Yield chunks from a reader and close the file afterwards."""
+    with f, reader:
+        yield from reader
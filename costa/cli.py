@@ -0,0 +1,196 @@
+"""
+The :mod:`~costa.cli` module provides the ``costa`` command, which
+generates performance maps from manufacturer data files in batch.
+
+Heavy modules (pandas and the performance map machinery) are only
+imported once the command line is parsed, so that ``costa --help``
+and argument errors are reported immediately.
+"""
+
+import argparse
+import glob
+import json
+import sys
+import time
+from pathlib import Path
+
+
+def _parser():
+    """Return the parser of the command line arguments."""
+    parser = argparse.ArgumentParser(
+        prog='costa',
+        description="Generate performance maps for the TRNSYS Type 3254."
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser(
+        'build',
+        help="build, fill and write performance maps",
+        description=(
+            "Build, fill and write the performance maps of manufacturer "
+            "data files. Only files whose content or settings changed "
+            "since the previous run are processed again."
+        )
+    )
+    build.add_argument(
+        'inputs', nargs='*', metavar='DATAFILE',
+        help="manufacturer data files, glob patterns or directories"
+    )
+    build.add_argument(
+        '-f', '--job-file', type=Path,
+        help="JSON file with 'inputs', 'output_dir', 'settings' and 'jobs'"
+    )
+    build.add_argument('-o', '--output-dir', type=Path,
+                       help="directory receiving the performance maps")
+    build.add_argument('--mode', choices=['cooling', 'heating'],
+                       help="operating mode (detected from files by default)")
+    build.add_argument('--freq', type=float, nargs='+',
+                       help="normalized frequency entries")
+    build.add_argument('--afr', type=float, nargs='+',
+                       help="normalized air flow rate entries")
+    build.add_argument('--rated-capacity', type=float,
+                       help="rated capacity used to normalize the data")
+    build.add_argument('--rated-power', type=float,
+                       help="rated power used to normalize the data")
+    build.add_argument('--dtype', choices=['float32', 'float64'],
+                       help="floating point type of the filled values")
+    build.add_argument('--majororder', choices=['row', 'col'],
+                       help="order in which values are written")
+    build.add_argument('-j', '--jobs', type=int,
+                       help="number of worker processes (default 1)")
+    build.add_argument('--force', action='store_true',
+                       help="rebuild all maps")
+    build.add_argument('-q', '--quiet', action='store_true',
+                       help="only print the summary")
+    run = subparsers.add_parser(
+        'run',
+        help="run fill specifications",
+        description=(
+            "Run fill specifications saved as JSON or TOML files. "
+            "Identical specifications are run only once."
+        )
+    )
+    run.add_argument('specs', nargs='+', metavar='SPEC',
+                     help="specification files")
+    run.add_argument('-j', '--jobs', type=int, default=1,
+                     help="number of worker processes (default 1)")
+    return parser
+
+
+def _expand(inputs):
+    """Return the data files matching paths, patterns or directories."""
+    datafiles = []
+    for pattern in inputs:
+        if Path(pattern).is_dir():
+            datafiles.extend(sorted(Path(pattern).rglob('*.txt')))
+        else:
+            matches = glob.glob(pattern, recursive=True)
+            datafiles.extend(Path(match) for match in sorted(matches))
+    # Files matched several times are only processed once
+    return list(dict.fromkeys(datafiles))
+
+
+def _job(args, parser):
+    """Merge the job file with the command line arguments."""
+    job = {}
+    if args.job_file is not None:
+        with open(args.job_file, 'r') as f:
+            job = json.load(f)
+    settings = dict(job.get('settings', {}))
+    entries = dict(settings.get('entries', {}))
+    if args.freq is not None:
+        entries['freq'] = args.freq
+    if args.afr is not None:
+        entries['AFR'] = args.afr
+    if entries:
+        settings['entries'] = entries
+    if (args.rated_capacity is None) != (args.rated_power is None):
+        parser.error("both --rated-capacity and --rated-power are required.")
+    if args.rated_capacity is not None:
+        settings['norm'] = {'capacity': args.rated_capacity,
+                            'power': args.rated_power}
+    for key in ('mode', 'dtype', 'majororder'):
+        if getattr(args, key) is not None:
+            settings[key] = getattr(args, key)
+    inputs = args.inputs or job.get('inputs', [])
+    output_dir = args.output_dir or job.get('output_dir')
+    if not inputs:
+        parser.error("no input data files given.")
+    if output_dir is None:
+        parser.error("no output directory given.")
+    datafiles = _expand(inputs)
+    if not datafiles:
+        parser.error("no data file matches the given inputs.")
+    jobs = args.jobs or job.get('jobs', 1)
+    return datafiles, Path(output_dir), settings, jobs
+
+
+def _build(args, parser):
+    """Run the ``build`` command."""
+    datafiles, output_dir, settings, jobs = _job(args, parser)
+    # Deferred import: pandas is only loaded when there is work to do
+    from .batch import build_maps
+
+    def report(key, status, seconds):
+        if not args.quiet:
+            print(f"{status}\t{key}\t{seconds:.3f} s", flush=True)
+
+    start = time.perf_counter()
+    result = build_maps(datafiles, output_dir, settings, jobs=jobs,
+                        force=args.force, callback=report)
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    built = result[result.status == 'built']
+    rows = int(built.rows.sum())
+    print(
+        f"{len(built)} maps built, {len(result) - len(built)} unchanged "
+        f"in {elapsed:.2f} s ({len(built) / elapsed:.1f} maps/s, "
+        f"{rows / elapsed:.0f} rows/s, {jobs} jobs)"
+    )
+    return 0
+
+
+def _run(args, parser):
+    """Run the ``run`` command."""
+    from .spec import FillSpec, run_all
+
+    specs = [FillSpec.load(filename) for filename in args.specs]
+    start = time.perf_counter()
+    filenames = run_all(specs, jobs=args.jobs)
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    for key, outputs in filenames.items():
+        print(f"{key[:12]}\t" + '\t'.join(outputs))
+    print(
+        f"{len(filenames)} fills for {len(specs)} specifications "
+        f"in {elapsed:.2f} s ({len(filenames) / elapsed:.1f} fills/s, "
+        f"{args.jobs} jobs)"
+    )
+    return 0
+
+
+def main(argv=None):
+    """Entry point of the ``costa`` command.
+
+    Parameters
+    ----------
+    argv : list of str, optional
+        Command line arguments, by default those of the current process.
+
+    Returns
+    -------
+    int
+        The exit status.
+
+    Examples
+    --------
+    .. code-block:: console
+
+        $ costa build data/*.txt -o maps --freq 0.2 0.4 0.6 0.8 1 --jobs 8
+        $ costa run specs/*.toml --jobs 8
+
+    """
+    parser = _parser()
+    args = parser.parse_args(argv)
+    return {'build': _build, 'run': _run}[args.command](args, parser)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,304 @@
+"""
+The :mod:`~costa.collection` module provides the PermapCollection class,
+which stacks performance maps of several units in a single array.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .permap import Permap
+
+
+class PermapCollection:
+    """
+    Performance maps of several units stacked along a ``unit`` axis.
+
+    All performance maps must share the same index and columns (see
+    :meth:`Permap.regrid <costa.permap.Permap.regrid>` to harmonize
+    them).  Their values are stored in one contiguous array of shape
+    ``(units, rows, columns)``, so that operations on the whole fleet
+    are performed at once instead of looping over the units.  The
+    ``pm`` attributes (mode, entries, corrections, etc.) are shared and
+    taken from the first performance map.
+
+    Parameters
+    ----------
+    permaps : dict or list of :class:`~pandas.DataFrame`
+        The performance maps, with unit names as keys if a dict is given.
+    units : list, optional
+        Unit names, by default the keys of `permaps` or ``0, 1, ...``.
+
+    Attributes
+    ----------
+    values : :class:`~numpy.ndarray`
+        Performance values, with shape ``(units, rows, columns)``.
+    units : :class:`~pandas.Index`
+        Unit names.
+
+    Examples
+    --------
+    >>> small = costa.build_heating_permap()
+    >>> large = 1.5 * small
+    >>> fleet = costa.PermapCollection({'small': small, 'large': large})
+    >>> fleet.values.shape
+    (2, 40, 2)
+    >>> fleet.mode = 'heating'
+    >>> fleet.entries['freq'] = np.arange(0.1, 1.1, 0.1)
+    >>> fleet.fill().values.shape
+    (2, 800, 2)
+
+    """
+
+    def __init__(self, permaps, units=None):
+        """Constructor for the PermapCollection class."""
+        if isinstance(permaps, dict):
+            units = list(permaps) if units is None else units
+            permaps = list(permaps.values())
+        if len(permaps) == 0:
+            raise ValueError("at least one performance map is required.")
+        units = range(len(permaps)) if units is None else units
+        template = permaps[0]
+        for permap in permaps[1:]:
+            same_index = permap.index.equals(template.index)
+            if not same_index or not permap.columns.equals(template.columns):
+                raise ValueError(
+                    "performance maps must have the same index and columns."
+                )
+        values = np.stack([permap.to_numpy() for permap in permaps])
+        self._setup(values, units, template)
+
+    def _setup(self, values, units, template):
+        """Set the collection data from an array and a template."""
+        if len(units) != len(values):
+            raise ValueError("there must be one unit name per map.")
+        self.values = values
+        self.units = pd.Index(units, name='unit')
+        # The first unit (sharing memory with values) holds the attributes
+        first = pd.DataFrame(
+            values[0], index=template.index, columns=template.columns
+        )
+        self._template = first.pm.copyattr(template, deep=False)
+
+    @classmethod
+    def from_array(cls, values, units, template):
+        """Build a collection from a stacked array of values.
+
+        Parameters
+        ----------
+        values : :class:`~numpy.ndarray`
+            Performance values, with shape ``(units, rows, columns)``.
+        units : list
+            Unit names.
+        template : :class:`~pandas.DataFrame`
+            A performance map providing the index, the columns and the
+            ``pm`` attributes shared by all units.
+
+        """
+        new = cls.__new__(cls)
+        new._setup(values, units, template)
+        return new
+
+    @property
+    def pm(self):
+        """The :class:`~costa.permap.Permap` attributes of the units."""
+        return self._template.pm
+
+    @property
+    def mode(self):
+        return self.pm.mode
+
+    @mode.setter
+    def mode(self, operating_mode):
+        self.pm.mode = operating_mode
+
+    @property
+    def entries(self):
+        return self.pm.entries
+
+    @property
+    def normalized(self):
+        return self.pm.normalized
+
+    @property
+    def index(self):
+        return self._template.index
+
+    @property
+    def columns(self):
+        return self._template.columns
+
+    def __len__(self):
+        return len(self.units)
+
+    def __iter__(self):
+        return iter(self.units)
+
+    def __getitem__(self, unit):
+        """Return the performance map of a unit as a DataFrame."""
+        values = self.values[self.units.get_loc(unit)]
+        permap = pd.DataFrame(values, index=self.index, columns=self.columns)
+        return permap.pm.copyattr(self._template)
+
+    def __repr__(self):
+        return (
+            f"{type(self).__name__}({len(self)} units, "
+            f"{len(self.index)} rows x {len(self.columns)} columns)"
+        )
+
+    def to_frame(self):
+        """Return all performance maps in a single DataFrame.
+
+        The unit names are added as the first index level.
+        """
+        index = pd.MultiIndex.from_arrays(
+            [
+                np.repeat(self.units, len(self.index)),
+                *(
+                    np.tile(self.index.get_level_values(i), len(self))
+                    for i in range(self.index.nlevels)
+                )
+            ],
+            names=['unit', *self.index.names]
+        )
+        data = self.values.reshape(-1, self.values.shape[-1])
+        return pd.DataFrame(data, index=index, columns=self.columns)
+
+    def _rated_values(self, values):
+        """Return rated values as an array of shape ``(units, 1, columns)``.
+
+        `values` may have either one row per unit (in the same order) or
+        a single row shared by all units.
+        """
+        self.pm._norm_factors(values.iloc[:1])  # check column consistency
+        if set(self.columns) - set(values.columns):
+            values = Permap._add_missing_df_column(values)
+        rated = values[list(self.columns)].to_numpy(dtype=float)
+        if len(rated) not in (1, len(self)):
+            raise ValueError("there must be one row of values per unit.")
+        return rated[:, np.newaxis, :]
+
+    def fill(self, norm=None, dtype=None, threads=None):
+        """Fill the performance maps of all units.
+
+        All units are extended in a single pass, see :meth:`Permap.fill
+        <costa.permap.Permap.fill>` for details.
+
+        Parameters
+        ----------
+        norm : :class:`~pandas.DataFrame`, optional
+            Rated values, with either one row per unit or a single row
+            for all units.  If not provided, the data is not normalized.
+        dtype : data-type, optional
+            Floating point type of the filled values.
+        threads : int, optional
+            Number of threads among which the computations are shared.
+
+        Returns
+        -------
+        :class:`PermapCollection`
+            The filled performance maps.
+
+        """
+        if self.normalized:
+            raise RuntimeError("values are already normalized.")
+        values = self.values
+        if norm is not None:
+            # Normalizing the base data normalizes all filled values
+            values = values / self._rated_values(norm)
+        # Unit positions keep the original order when sorting the index
+        positions = range(len(self))
+        stacked = self.from_array(values, positions, self._template)
+        stacked = stacked.to_frame().pm.copyattr(self._template, deep=False)
+        filled = stacked.pm.fill(dtype=dtype, threads=threads)
+        nrows = len(filled) // len(self)
+        template = filled.iloc[:nrows].droplevel('unit')
+        template = template.pm.copyattr(filled, deep=False)
+        template.pm._normalized = norm is not None
+        template.pm.ranges = {
+            name: rng for name, rng in filled.pm.ranges.items()
+            if name != 'unit'
+        }
+        template.pm._restricted_levels = {
+            name: filled.pm.restricted_levels.get(name)
+            for name in template.pm.ranges
+        }
+        filled_values = filled.to_numpy().reshape(len(self), nrows, -1)
+        return self.from_array(filled_values, self.units, template)
+
+    def normalize(self, values=None):
+        """Normalize the performance maps of all units.
+
+        Invalid states flagged with -999 are left untouched.
+
+        Parameters
+        ----------
+        values : :class:`~pandas.DataFrame`, optional
+            Rated values, with either one row per unit or a single row
+            for all units (see :meth:`Permap.normalize
+            <costa.permap.Permap.normalize>`).
+
+        Returns
+        -------
+        :class:`PermapCollection`
+            A normalized copy of the collection.
+
+        """
+        if self.normalized:
+            raise RuntimeError("values are already normalized.")
+        self.pm._check_mode(before='normalizing')
+        normalized = self.values.copy()
+        if values is None:
+            return self.from_array(normalized, self.units, self._template)
+        np.divide(
+            normalized, self._rated_values(values),
+            out=normalized, where=normalized != -999
+        )
+        new = self.from_array(normalized, self.units, self._template)
+        new._template.pm._normalized = True
+        return new
+
+    def reduce(self, func=np.mean):
+        """Reduce the performance values of each unit.
+
+        Invalid states flagged with -999 are excluded.
+
+        Parameters
+        ----------
+        func : callable, default :func:`numpy.mean`
+            Reduction with an `axis` argument, e.g. :func:`numpy.max`.
+
+        Returns
+        -------
+        :class:`~pandas.DataFrame`
+            Reduced values with units as index and output quantities as
+            columns.
+
+        """
+        valid = ~np.all(self.values == -999, axis=(0, 2))
+        reduced = func(self.values[:, valid], axis=1)
+        return pd.DataFrame(reduced, index=self.units, columns=self.columns)
+
+    def write(self, filename, majororder='row'):
+        """Write the performance map of each unit in a separate file.
+
+        Parameters
+        ----------
+        filename : str
+            File name pattern, with a ``{unit}`` field replaced by the
+            unit name, e.g. ``"permap-{unit}.dat"``.
+        majororder : {'row', 'col'}
+            See :meth:`Permap.write <costa.permap.Permap.write>`.
+
+        Returns
+        -------
+        list of str
+            The names of the written files.
+
+        """
+        if '{unit}' not in filename:
+            raise ValueError("'filename' must contain a '{unit}' field.")
+        filenames = []
+        for unit in self.units:
+            filenames.append(filename.format(unit=unit))
+            self[unit].pm.write(filenames[-1], majororder=majororder)
+        return filenames
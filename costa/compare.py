@@ -0,0 +1,191 @@
+"""
+The :mod:`~costa.compare` module compares performance maps, either in
+memory or written to files for the Type 3254, within given tolerances.
+"""
+
+from collections import namedtuple
+from itertools import zip_longest
+from os import PathLike
+
+import numpy as np
+import pandas as pd
+
+from .buildpermap import read_permap
+
+
+_STATISTICS = ['max_abs_error', 'mean_abs_error', 'max_rel_error',
+               'n_exceeding']
+_MISMATCH = "performance maps must have the same grid points and outputs."
+
+
+class DiffReport(namedtuple('DiffReport', ['summary', 'levels', 'worst'])):
+    """Deviations between two performance maps.
+
+    Attributes
+    ----------
+    summary : :class:`~pandas.DataFrame`
+        Maximum and mean absolute errors, maximum relative error and
+        number of points out of tolerance, for each output quantity.
+    levels : dict of :class:`~pandas.DataFrame`
+        For each level, maximum and mean absolute errors of each output
+        quantity in each slice (i.e. at each entry of the level).
+    worst : :class:`~pandas.DataFrame`
+        The points deviating the most with respect to the tolerance,
+        with values of both maps, sorted by decreasing deviation.
+
+    """
+
+    __slots__ = ()
+
+    @property
+    def equal(self):
+        """Whether all values are equal within the tolerance."""
+        return bool((self.summary.n_exceeding == 0).all())
+
+
+def _chunks(permap, chunksize):
+    """Iterate over chunks of a performance map or of a file."""
+    if isinstance(permap, (str, PathLike)):
+        yield from read_permap(permap, chunksize=chunksize)
+    else:
+        for start in range(0, len(permap), chunksize):
+            yield permap.iloc[start:start + chunksize]
+
+
+def _common_order(a, b):
+    """Sort in-memory performance maps so that their rows match."""
+    if isinstance(a, pd.DataFrame) and isinstance(b, pd.DataFrame):
+        if not a.index.equals(b.index):
+            b = b.reorder_levels(a.index.names).sort_index()
+            a = a.sort_index()
+    return a, b
+
+
+def diff(a, b, rtol=1e-5, atol=1e-8, levels=None, worst=10,
+         chunksize=100_000):
+    """Compare two performance maps within a tolerance.
+
+    The maps are processed by chunks of rows, so that large files can be
+    compared without loading them in memory.  A value `x` of `a` is
+    within tolerance if ``abs(x - y) <= atol + rtol * abs(y)``, where `y`
+    is the corresponding value in `b` (as in :func:`numpy.isclose`).
+
+    Parameters
+    ----------
+    a, b : :class:`~pandas.DataFrame` or str or path-like
+        Performance maps, or files written with :meth:`Permap.write
+        <costa.permap.Permap.write>`.  They must have the same grid
+        points and output quantities, and files must be written in the
+        same major order.
+    rtol : float, default 1e-5
+        Relative tolerance, with respect to `b`.
+    atol : float, default 1e-8
+        Absolute tolerance.
+    levels : list of str, optional
+        Levels along which deviations are reported by slice, by default
+        all levels.
+    worst : int, default 10
+        Number of worst points reported.
+    chunksize : int, default 100000
+        Number of rows processed at once.
+
+    Returns
+    -------
+    :class:`DiffReport`
+        Deviations per output, per level slice, and at the worst points.
+
+    Raises
+    ------
+    ValueError
+        If the maps do not have the same grid points or outputs, or if
+        `levels` are not levels of the maps.
+
+    Examples
+    --------
+    >>> hm = costa.build_heating_permap()
+    >>> hm.pm.mode = 'heating'
+    >>> filled = hm.pm.fill()
+    >>> report = costa.diff(filled, filled * (1 + 1e-7))
+    >>> report.equal
+    True
+    >>> costa.diff(filled, filled * 1.01).summary.n_exceeding
+    heating
+    power       240
+    capacity    240
+    Name: n_exceeding, dtype: int64
+
+    """
+    a, b = _common_order(a, b)
+    columns = None
+    count, sum_abs, slices, largest = 0, 0, {}, []
+    max_abs = max_rel = n_exceeding = None
+    pairs = zip_longest(_chunks(a, chunksize), _chunks(b, chunksize))
+    for chunk_a, chunk_b in pairs:
+        if chunk_a is None or chunk_b is None:
+            raise ValueError(_MISMATCH)
+        if columns is None:
+            columns = chunk_a.columns
+            levels = chunk_a.index.names if levels is None else levels
+            unknown = [name for name in levels
+                       if name not in chunk_a.index.names]
+            if unknown:
+                raise ValueError(
+                    f"levels {unknown} are not in the performance maps, "
+                    f"whose levels are {list(chunk_a.index.names)}."
+                )
+            max_abs = max_rel = pd.Series(0.0, index=columns)
+            n_exceeding = pd.Series(0, index=columns)
+        if not (chunk_a.index.equals(chunk_b.index)
+                and chunk_b.columns.equals(columns)):
+            raise ValueError(_MISMATCH)
+        values_b = chunk_b.to_numpy(dtype=float)
+        error = np.abs(chunk_a.to_numpy(dtype=float) - values_b)
+        tolerance = atol + rtol * np.abs(values_b)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rel_error = np.where(error > 0, error / np.abs(values_b), 0)
+        # Accumulate statistics per output
+        count += len(error)
+        sum_abs = sum_abs + error.sum(axis=0)
+        max_abs = np.maximum(max_abs, error.max(axis=0))
+        max_rel = np.maximum(max_rel, rel_error.max(axis=0))
+        n_exceeding = n_exceeding + (error > tolerance).sum(axis=0)
+        error = pd.DataFrame(error, index=chunk_a.index, columns=columns)
+        for name in levels:
+            grouped = error.groupby(level=name)
+            slices.setdefault(name, []).append(
+                pd.concat({'max': grouped.max(), 'sum': grouped.sum(),
+                           'count': grouped.count()}, axis='columns')
+            )
+        # Keep the worst points of the chunk only
+        # Any error is infinitely in excess of a zero tolerance
+        excess = np.divide(
+            error.to_numpy(), tolerance, where=tolerance > 0,
+            out=np.where(error.to_numpy() > 0, np.inf, 0.0)
+        ).max(axis=1)
+        top = np.argsort(-excess, kind='stable')[:worst]
+        largest.append(pd.concat(
+            {'a': chunk_a.iloc[top], 'b': chunk_b.iloc[top],
+             'excess': pd.DataFrame({'': excess[top]}, chunk_a.index[top])},
+            axis='columns'
+        ))
+    if columns is None:
+        raise ValueError(_MISMATCH)
+    summary = pd.DataFrame({
+        'max_abs_error': max_abs,
+        'mean_abs_error': sum_abs / count,
+        'max_rel_error': max_rel,
+        'n_exceeding': n_exceeding
+    }, columns=_STATISTICS)
+    report_levels = {}
+    for name, parts in slices.items():
+        totals = pd.concat(parts).groupby(level=0)
+        maxima, sums = totals.max()['max'], totals.sum()
+        means = sums['sum'] / sums['count']
+        report_levels[name] = pd.concat({
+            column: pd.DataFrame({'max_abs_error': maxima[column],
+                                  'mean_abs_error': means[column]})
+            for column in columns
+        }, axis='columns')
+    largest = pd.concat(largest)
+    largest = largest.sort_values(('excess', ''), ascending=False)
+    return DiffReport(summary, report_levels, largest.iloc[:worst])
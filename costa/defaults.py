@@ -5,24 +5,60 @@ used to obtain missing values in a performance map.
 
 import numpy as np
 
+from .backends import get_backend
 
-def weibull(x, amp, scale, shape):
+
+def _output(out, x, *parameters):
+    """Return the buffer receiving the result of a correction kernel.
+
+    If no buffer is provided, a new one is allocated with the broadcast
+    shape of the arguments and a floating dtype following the one of
+    `x` (e.g. single precision inputs give single precision outputs).
+    """
+    if out is not None:
+        return out
+    x = np.asarray(x)
+    shape = np.broadcast_shapes(x.shape, *(np.shape(p) for p in parameters))
+    # Scalar parameters must not promote single precision inputs
+    arrays = (np.asarray(p).dtype for p in parameters if np.ndim(p))
+    dtype = np.result_type(x.dtype, *arrays, np.float16)
+    return np.empty(shape, dtype=dtype)
+
+
+def _result(out, given):
+    """Return scalars for 0-d results computed in a new buffer."""
+    return out if given or out.ndim else out[()]
+
+
+def weibull(x, amp, scale, shape, out=None):
     """Scaled `Weibull cumulative distribution function`_.
 
+    The parameters may be arrays, in which case they are broadcast
+    against `x`.  For example, parameters of shape ``(n, 1)`` and `x` of
+    shape ``(m,)`` give a ``(n, m)`` matrix in a single call.  The
+    computation is done in-place in `out`, which may be provided to
+    avoid any memory allocation, by the current backend (see
+    :mod:`costa.backends`).
+
     .. _Weibull cumulative distribution function:
        https://en.wikipedia.org/wiki/Weibull_distribution#Cumulative_distribution_function
     """
-    return amp * (1 - np.exp(-(x/scale) ** shape))
+    result = _output(out, x, amp, scale, shape)
+    get_backend().weibull(x, amp, scale, shape, result)
+    return _result(result, out is not None)
 
 
-def compexp(x, amp, scale, shape, lift, shift):
+def compexp(x, amp, scale, shape, lift, shift, out=None):
     """Lifted and shifted version of the `compressed exponential function`_.
 
+    See :func:`weibull` for the broadcasting rules and the `out` argument.
+
     .. _compressed exponential function:
        https://en.wikipedia.org/wiki/Stretched_exponential_function
     """
-    shifted = np.maximum(x - shift, 0)  # avoids divergence at low values
-    return (amp - lift) * np.exp(-(shifted / scale) ** shape) + lift
+    result = _output(out, x, amp, scale, shape, lift, shift)
+    get_backend().compexp(x, amp, scale, shape, lift, shift, result)
+    return _result(result, out is not None)
 
 
 def default_correction(mode, pminput, pmoutput=None):
@@ -92,7 +128,7 @@ def default_correction(mode, pminput, pmoutput=None):
             ('heating', 'power'): (2.5121, 1.30389, 2.5551829)
         }[(mode, pmoutput)]
         function = weibull if pmoutput == 'power' else compexp
-        return lambda x: function(x, *parameters)
+        return lambda x, out=None: function(x, *parameters, out=out)
     elif pminput == 'AFR':
         # Placeholder (no correction for now)
         def correction_afr(AFR): return 1
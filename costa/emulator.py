@@ -0,0 +1,355 @@
+"""
+The :mod:`~costa.emulator` module evaluates filled performance maps the
+way the TRNSYS `Type 3254 <https://github.com/polymtl-bee/vcaahp-model>`_
+does, to get quick performance estimates without running a simulation.
+"""
+
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+from .collection import PermapCollection
+from .interpolate import _locate
+from .permap import Permap
+
+
+def _grid(permap):
+    """Return level entries and values with a leading unit axis."""
+    if isinstance(permap, PermapCollection):
+        levels, _ = permap[permap.units[0]].pm.to_grid()
+        shape = (len(permap),) + tuple(len(v) for v in levels.values())
+        values = permap.values.reshape(shape + (permap.values.shape[-1],))
+        return levels, values, permap.units, permap.columns
+    levels, values = permap.pm.to_grid()
+    return levels, values[np.newaxis], None, permap.columns
+
+
+def _interpolate(levels, values, conditions):
+    """Multilinear interpolation with clamped inputs.
+
+    Corners flagged with -999 (invalid states) are ignored, and the
+    weights of the remaining corners are scaled accordingly.
+    """
+    positions, weights = [], []
+    for name, entries in levels.items():
+        x = conditions[name].to_numpy(dtype=float)
+        if len(entries) == 1:
+            positions.append(np.zeros(len(x), dtype=int))
+            weights.append(np.zeros(len(x)))
+            continue
+        # Inputs are clamped to the map bounds
+        i, t = _locate(x, np.asarray(entries, dtype=float), 'constant')
+        positions.append(i)
+        weights.append(t)
+    result = np.zeros((values.shape[0], len(conditions), values.shape[-1]))
+    total_weight = np.zeros((values.shape[0], len(conditions), 1))
+    for corner in product((0, 1), repeat=len(levels)):
+        weight = np.ones(len(conditions))
+        index = [slice(None)]
+        for offset, i, t, entries in zip(
+            corner, positions, weights, levels.values()
+        ):
+            weight = weight * (t if offset else 1 - t)
+            index.append(np.minimum(i + offset, len(entries) - 1))
+        corner_values = values[tuple(index)]
+        valid = np.all(corner_values != -999, axis=-1, keepdims=True)
+        weight = np.where(valid, weight[:, np.newaxis], 0)
+        result += weight * np.where(valid, corner_values, 0)
+        total_weight += weight
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return result / total_weight
+
+
+def evaluate(permap, conditions, rated=None):
+    """Evaluate performance maps at given operating conditions.
+
+    Values are obtained by multilinear interpolation in the performance
+    map, with inputs clamped to the map bounds, as in the Type 3254.
+    Invalid states (flagged with -999) are excluded from the
+    interpolation; conditions where no valid data is available give NaN.
+
+    Parameters
+    ----------
+    permap : :class:`~pandas.DataFrame` or \
+:class:`~costa.collection.PermapCollection`
+        Filled performance map(s).
+    conditions : :class:`~pandas.DataFrame`
+        Operating conditions, one row per timestep, with a column for
+        each level of the performance map (e.g. ``'Tdbr'``, ``'Tdbo'``,
+        ``'AFR'`` and ``'freq'`` in heating mode).
+    rated : :class:`~pandas.DataFrame`, optional
+        Rated capacity and power by which normalized values are
+        multiplied, with one row or one row per unit.
+
+    Returns
+    -------
+    :class:`~pandas.DataFrame`
+        Performance at each timestep, including the total capacity and
+        the COP.  For a collection, columns have an additional
+        first level with the unit names.
+
+    Raises
+    ------
+    ValueError
+        If a level of the performance map is missing in `conditions`.
+
+    Examples
+    --------
+    >>> hm = costa.build_heating_permap()
+    >>> hm.pm.mode = 'heating'
+    >>> hm.pm.entries['freq'] = np.arange(0.1, 1.1, 0.1)
+    >>> filled = hm.pm.fill()
+    >>> conditions = pd.DataFrame({
+    ...     'Tdbr': [20, 21], 'Tdbo': [-5, 40], 'AFR': [1, 1], 'freq': [1, 0.5]
+    ... })
+    >>> evaluate(filled, conditions)
+    heating     power  capacity       COP
+    0        2.164286  5.635000  2.603630
+    1        0.355216  2.105926  5.928571
+
+    """
+    levels, values, units, columns = _grid(permap)
+    missing = [name for name in levels if name not in conditions]
+    if missing:
+        raise ValueError(f"missing operating conditions: {missing}.")
+    result = _interpolate(levels, values, conditions)
+    if rated is not None:
+        if 'capacity' not in rated or 'power' not in rated:
+            rated = Permap._add_missing_df_column(rated)
+        # Power is scaled by the rated power, and capacities by the
+        # rated capacity
+        factors = np.column_stack([
+            rated['power' if column == 'power' else 'capacity']
+            for column in columns
+        ])
+        result *= factors[:, np.newaxis, :]
+    frames = []
+    for unit_result in result:
+        frame = pd.DataFrame(unit_result, index=conditions.index,
+                             columns=columns)
+        if 'capacity' not in frame:
+            sensible, latent = frame.sensible_capacity, frame.latent_capacity
+            frame['capacity'] = sensible + latent
+        frame['COP'] = frame.capacity / frame.power
+        frames.append(frame)
+    if units is None:
+        return frames[0]
+    return pd.concat(frames, axis='columns', keys=units)
+
+
+def seasonal_performance(permap, conditions, rated=None, timestep=1):
+    """Estimate energy use and seasonal COP over a time series.
+
+    Parameters
+    ----------
+    permap, conditions, rated
+        See :func:`evaluate`.
+    timestep : float or array_like, default 1
+        Duration of each timestep (e.g. in hours).
+
+    Returns
+    -------
+    :class:`~pandas.DataFrame`
+        Delivered energy (``'energy_output'``), consumed energy
+        (``'energy_input'``) and seasonal COP (``'SCOP'``), with one row
+        per unit (a single row for a single performance map).
+        Timesteps with invalid states are ignored.
+
+    """
+    performance = evaluate(permap, conditions, rated)
+    if not isinstance(performance.columns, pd.MultiIndex):
+        performance = pd.concat([performance], axis='columns', keys=[0])
+    timestep = np.broadcast_to(timestep, (len(performance),))
+    output = performance.xs('capacity', axis='columns', level=1)
+    power = performance.xs('power', axis='columns', level=1)
+    summary = pd.DataFrame({
+        'energy_output': output.mul(timestep, axis='index').sum(),
+        'energy_input': power.mul(timestep, axis='index').sum()
+    })
+    summary['SCOP'] = summary.energy_output / summary.energy_input
+    return summary
+
+
+class InverseTable:
+    """Level of a performance map as a function of an output quantity.
+
+    Inverse tables are built by :func:`invert`.  For each combination of
+    the other levels (each grid line), they give the level (e.g. the
+    compressor frequency) at which the output quantity reaches a given
+    fraction of its maximum along the grid line.
+
+    Attributes
+    ----------
+    levels : dict
+        Entries of the other levels of the performance map.
+    fractions : :class:`~numpy.ndarray`
+        Fractions of the maximum of the quantity at which the level is
+        tabulated.
+    maximum : :class:`~numpy.ndarray`
+        Maximum of the quantity on each grid line, -999 on lines with
+        invalid states.
+    values : :class:`~numpy.ndarray`
+        Level reaching each fraction on each grid line, with shape
+        ``maximum.shape + fractions.shape``.
+    quantity : str
+        The output quantity.
+    along : str
+        The inverted level.
+
+    """
+
+    def __init__(self, levels, fractions, maximum, values, quantity, along):
+        """Constructor for the InverseTable class."""
+        self.levels = levels
+        self.fractions = fractions
+        self.maximum = maximum
+        self.values = values
+        self.quantity = quantity
+        self.along = along
+
+    def __repr__(self):
+        shape = ' x '.join(
+            str(len(entries)) for entries in self.levels.values()
+        )
+        return (
+            f"<{type(self).__name__}: {self.along} as a function of "
+            f"{self.quantity}, {shape} x {len(self.fractions)} nodes>"
+        )
+
+    def __call__(self, conditions, values=None):
+        """Return the level delivering given values at given conditions.
+
+        Parameters
+        ----------
+        conditions : :class:`~pandas.DataFrame`
+            Operating conditions, one row per query, with a column for
+            each level of the table.
+        values : array_like, optional
+            Required values of the quantity, in the units of the
+            performance map, by default the column of `conditions` named
+            after the quantity.
+
+        Returns
+        -------
+        :class:`~pandas.Series`
+            The level at each query.  Values below the quantity at the
+            lowest level entry give the lowest entry (the unit would
+            cycle), values above the maximum give the highest entry, and
+            conditions without valid data give NaN.
+
+        Raises
+        ------
+        ValueError
+            If a level of the table is missing in `conditions`.
+
+        """
+        missing = [name for name in self.levels if name not in conditions]
+        if missing:
+            raise ValueError(f"missing operating conditions: {missing}.")
+        if values is None:
+            values = conditions[self.quantity]
+        maximum = _interpolate(
+            self.levels, self.maximum[np.newaxis, ..., np.newaxis], conditions
+        )[0, :, 0]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fraction = np.asarray(values, dtype=float) / maximum
+        lookup = pd.DataFrame({
+            **{name: conditions[name].to_numpy() for name in self.levels},
+            'fraction': fraction
+        })
+        result = _interpolate(
+            {**self.levels, 'fraction': self.fractions},
+            self.values[np.newaxis, ..., np.newaxis], lookup
+        )[0, :, 0]
+        return pd.Series(result, index=conditions.index, name=self.along)
+
+
+def invert(permap, quantity, along='freq', fractions=101):
+    """Build an inverse lookup table of a filled performance map.
+
+    The quantity is made non-decreasing along the inverted level on each
+    grid line (decreasing segments are flattened), then the level is
+    found at the required fractions of the maximum on all grid lines at
+    once.  Queries are then answered by multilinear interpolation
+    instead of root-finding.
+
+    Parameters
+    ----------
+    permap : :class:`~pandas.DataFrame`
+        Filled performance map.
+    quantity : str
+        A column of the performance map, or ``'capacity'`` for the total
+        capacity in cooling mode.
+    along : str, default 'freq'
+        The level to express as a function of the quantity.
+    fractions : int or array_like, default 101
+        Fractions of the maximum of the quantity on each grid line at
+        which the level is tabulated, or their number, evenly spaced
+        between 0 and 1.
+
+    Returns
+    -------
+    :class:`InverseTable`
+        The inverse table, called with operating conditions and values
+        of the quantity.
+
+    Raises
+    ------
+    ValueError
+        If `along` is not a level, or `quantity` not a column of the
+        performance map.
+
+    Examples
+    --------
+    >>> table = filled.pm.invert('capacity', along='freq')
+    >>> conditions = pd.DataFrame({'Tdbr': [20, 21], 'Tdbo': [-5, 5],
+    ...                            'AFR': [1, 1], 'capacity': [2.5, 3]})
+    >>> freq = table(conditions)
+
+    """
+    levels, values = permap.pm.to_grid()
+    if along not in levels:
+        raise ValueError(f"'{along}' is not a level of the performance map.")
+    columns = list(permap.columns)
+    if quantity in columns:
+        target = values[..., columns.index(quantity)]
+    elif quantity == 'capacity' and 'sensible_capacity' in columns:
+        target = (values[..., columns.index('sensible_capacity')]
+                  + values[..., columns.index('latent_capacity')])
+    else:
+        raise ValueError(f"'{quantity}' is not a performance map column.")
+    if np.ndim(fractions) == 0:
+        fractions = np.linspace(0, 1, fractions)
+    fractions = np.sort(np.asarray(fractions, dtype=float))
+    axis = list(levels).index(along)
+    invalid = np.moveaxis(np.any(values == -999, axis=-1), axis, -1)
+    target = np.moveaxis(target.astype(float), axis, -1)
+    target = np.fmax.accumulate(np.where(invalid, np.nan, target), axis=-1)
+    maximum = target[..., -1]
+    invalid = np.any(invalid, axis=-1) | ~(maximum > 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        normalized = target / maximum[..., np.newaxis]
+    # Number of entries below each fraction, counted for all grid lines
+    # at once; fractions are then located between two entries
+    below = np.zeros(maximum.shape + fractions.shape, dtype=int)
+    for j in range(normalized.shape[-1]):
+        below += normalized[..., j, np.newaxis] < fractions
+    entries = np.asarray(levels[along], dtype=float)
+    if len(entries) == 1:
+        inverse = np.full(below.shape, entries[0])
+    else:
+        i = np.clip(below - 1, 0, len(entries) - 2)
+        left = np.take_along_axis(normalized, i, axis=-1)
+        right = np.take_along_axis(normalized, i + 1, axis=-1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            t = np.where(right > left, (fractions - left) / (right - left), 0)
+        t = np.clip(t, 0, 1)
+        inverse = entries[i] + t * (entries[i + 1] - entries[i])
+    # Invalid lines are flagged like invalid states, to be ignored by
+    # the interpolation
+    inverse[invalid] = -999
+    maximum = np.where(invalid, -999, maximum)
+    others = {name: entries for name, entries in levels.items()
+              if name != along}
+    return InverseTable(others, fractions, maximum, inverse, quantity, along)
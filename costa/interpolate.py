@@ -0,0 +1,452 @@
+"""
+The :mod:`~costa.interpolate` module provides vectorized one-dimensional
+interpolation routines, and tabulated corrections built upon them.
+"""
+
+import numpy as np
+
+
+EXTRAPOLATIONS = ('constant', 'linear', 'raise')
+
+
+def _check_extrapolation(extrapolation):
+    """Ensure that the extrapolation rule is known."""
+    if extrapolation not in EXTRAPOLATIONS:
+        raise ValueError(
+            f"'extrapolation' must be one of {', '.join(EXTRAPOLATIONS)}."
+        )
+
+
+def _check_nodes(xp):
+    """Ensure that interpolation nodes are strictly increasing."""
+    if xp.ndim != 1 or len(xp) < 2:
+        raise ValueError("at least two interpolation nodes are required.")
+    if np.any(np.diff(xp) <= 0):
+        raise ValueError("interpolation nodes must be strictly increasing.")
+
+
+def _locate(x, xp, extrapolation):
+    """Return interval indices and local coordinates of `x` in `xp`.
+
+    Indices are clipped so that values out of the nodes range are
+    located in the first or last interval.  The local coordinate `t`
+    is 0 on the left node and 1 on the right node of each interval.
+    """
+    if extrapolation == 'raise' and (
+        np.any(x < xp[0]) or np.any(x > xp[-1])
+    ):
+        raise ValueError(
+            f"values out of the interpolation range [{xp[0]}, {xp[-1]}]."
+        )
+    i = np.searchsorted(xp, x, side='right') - 1
+    i = np.clip(i, 0, len(xp) - 2)
+    left = xp[i]
+    t = np.asarray((x - left) / (xp[i + 1] - left))
+    if extrapolation == 'constant':
+        t = np.clip(t, 0, 1)
+    return i, t
+
+
+def _move_to_front(fp, axis):
+    """Move the interpolation axis of `fp` to the front."""
+    return np.moveaxis(np.asarray(fp), axis, 0)
+
+
+def _restore_axis(result, x, axis, ndim):
+    """Move the dimensions of `x` back to position `axis` of `result`."""
+    if axis < 0:
+        axis += ndim
+    source = list(range(x.ndim))
+    return np.moveaxis(result, source, [axis + s for s in source])
+
+
+def _expand(t, fp):
+    """Make `t` broadcastable with values taken along the first axis."""
+    return t.reshape(t.shape + (1,) * (fp.ndim - 1))
+
+
+def interp_linear(x, xp, fp, axis=-1, extrapolation='constant'):
+    """Piecewise linear interpolation along an axis.
+
+    Contrary to :func:`numpy.interp`, `fp` may have any number of
+    dimensions; all the values along the other axes are interpolated
+    in one go.
+
+    Parameters
+    ----------
+    x : array_like
+        The coordinates at which to evaluate the interpolated values.
+    xp : array_like
+        The strictly increasing coordinates of the data points.
+    fp : array_like
+        The data values, with ``fp.shape[axis] == len(xp)``.
+    axis : int, default -1
+        The axis of `fp` along which to interpolate.
+    extrapolation : {'constant', 'linear', 'raise'}, default 'constant'
+        Behaviour out of the `xp` range: repeat the boundary values,
+        extend the boundary segments, or raise a :class:`ValueError`.
+
+    Returns
+    -------
+    :class:`~numpy.ndarray`
+        Interpolated values, with shape
+        ``fp.shape[:axis] + x.shape + fp.shape[axis+1:]``.
+
+    Examples
+    --------
+    >>> interp_linear([0.5, 3], [0, 1, 2], [[0, 2, 4], [1, 1, 1]])
+    array([[1., 4.],
+           [1., 1.]])
+
+    """
+    _check_extrapolation(extrapolation)
+    x, xp = np.asarray(x, dtype=float), np.asarray(xp, dtype=float)
+    _check_nodes(xp)
+    fp = _move_to_front(fp, axis)
+    i, t = _locate(x, xp, extrapolation)
+    left = fp[i]
+    result = left + _expand(t, fp) * (fp[i + 1] - left)
+    return _restore_axis(result, x, axis, fp.ndim)
+
+
+def pchip_slopes(xp, fp, axis=-1):
+    """Derivatives at the nodes of a monotone cubic interpolant.
+
+    The slopes are computed with the Fritsch-Carlson method (as in
+    :class:`scipy.interpolate.PchipInterpolator`), which preserves the
+    monotonicity of the data.
+
+    Parameters
+    ----------
+    xp : array_like
+        The strictly increasing coordinates of the data points.
+    fp : array_like
+        The data values, with ``fp.shape[axis] == len(xp)``.
+    axis : int, default -1
+        The axis of `fp` corresponding to `xp`.
+
+    Returns
+    -------
+    :class:`~numpy.ndarray`
+        The slopes, with the same shape as `fp`.
+
+    """
+    xp = np.asarray(xp, dtype=float)
+    _check_nodes(xp)
+    fp = _move_to_front(fp, axis).astype(float)
+    h = _expand(np.diff(xp), fp)
+    delta = np.diff(fp, axis=0) / h
+    slopes = np.empty_like(fp)
+    if len(xp) == 2:
+        slopes[:] = delta
+        return np.moveaxis(slopes, 0, axis)
+    # Interior nodes: weighted harmonic mean of the adjacent secant slopes
+    w1 = 2 * h[1:] + h[:-1]
+    w2 = h[1:] + 2 * h[:-1]
+    same_sign = delta[:-1] * delta[1:] > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        harmonic = (w1 + w2) / (w1 / delta[:-1] + w2 / delta[1:])
+    slopes[1:-1] = np.where(same_sign, harmonic, 0)
+    # End nodes: shape-preserving three-point estimates
+    for end, (h0, h1, d0, d1) in (
+        (0, (h[0], h[1], delta[0], delta[1])),
+        (-1, (h[-1], h[-2], delta[-1], delta[-2]))
+    ):
+        slope = ((2 * h0 + h1) * d0 - h0 * d1) / (h0 + h1)
+        slope = np.where(np.sign(slope) != np.sign(d0), 0, slope)
+        overshoot = (np.sign(d0) != np.sign(d1)) & (abs(slope) > 3 * abs(d0))
+        slopes[end] = np.where(overshoot, 3 * d0, slope)
+    return np.moveaxis(slopes, 0, axis)
+
+
+def interp_hermite(x, xp, fp, slopes, axis=-1, extrapolation='constant'):
+    """Cubic Hermite interpolation along an axis.
+
+    Parameters are the same as for :func:`interp_linear`, with the
+    additional `slopes` giving the derivatives at the nodes (e.g. from
+    :func:`pchip_slopes`).  Linear extrapolation uses the end slopes.
+    """
+    _check_extrapolation(extrapolation)
+    x, xp = np.asarray(x, dtype=float), np.asarray(xp, dtype=float)
+    fp, slopes = _move_to_front(fp, axis), _move_to_front(slopes, axis)
+    i, t = _locate(x, xp, extrapolation)
+    outside = (t < 0) | (t > 1)
+    t = np.clip(t, 0, 1)
+    h = _expand(xp[i + 1] - xp[i], fp)
+    t = _expand(t, fp)
+    t2 = t * t
+    t3 = t2 * t
+    result = (
+        (2 * t3 - 3 * t2 + 1) * fp[i]
+        + (t3 - 2 * t2 + t) * h * slopes[i]
+        + (3 * t2 - 2 * t3) * fp[i + 1]
+        + (t3 - t2) * h * slopes[i + 1]
+    )
+    if extrapolation == 'linear' and np.any(outside):
+        # Extend the curve with its slope at the closest end node
+        end = np.where(x < xp[0], 0, len(xp) - 1)
+        distance = _expand(x - xp[end], fp)
+        result = result + np.where(
+            _expand(outside, fp), distance * slopes[end], 0
+        )
+    return _restore_axis(result, x, axis, fp.ndim)
+
+
+def interp_pchip(x, xp, fp, axis=-1, extrapolation='constant'):
+    """Monotone piecewise cubic interpolation along an axis.
+
+    See :func:`interp_linear` for a description of the parameters.
+    """
+    slopes = pchip_slopes(xp, fp, axis=axis)
+    return interp_hermite(x, xp, fp, slopes, axis, extrapolation)
+
+
+def select_nodes(xp, fp, reference=None, rtol=1e-3, atol=0, axis=-1):
+    """Select nodes from which linear interpolation reproduces the data.
+
+    Nodes are selected greedily from the first one: each selected node
+    is followed by the farthest node such that linearly interpolating
+    between them gives all the values in between within tolerance.
+    The end nodes are always selected.
+
+    Parameters
+    ----------
+    xp : array_like
+        The strictly increasing coordinates of the data points.
+    fp : array_like
+        The data values, with ``fp.shape[axis] == len(xp)``.  All values
+        along the other axes must be reproduced within tolerance.
+    reference : array_like, optional
+        Values to compare the interpolation with, with the same shape as
+        `fp`.  By default, `fp` itself is used.
+    rtol, atol : float, default 1e-3 and 0
+        Relative and absolute tolerances, satisfying
+        ``abs(interpolated - reference) <= atol + rtol * abs(reference)``.
+    axis : int, default -1
+        The axis of `fp` corresponding to `xp`.
+
+    Returns
+    -------
+    :class:`~numpy.ndarray`
+        Sorted indices of the selected nodes.
+
+    Examples
+    --------
+    >>> select_nodes([0, 1, 2, 3, 4], [0, 1, 2, 4, 6])
+    array([0, 2, 4])
+
+    """
+    xp = np.asarray(xp, dtype=float)
+    _check_nodes(xp)
+    fp = _move_to_front(fp, axis)
+    reference = fp if reference is None else _move_to_front(reference, axis)
+    tolerance = atol + rtol * abs(reference)
+
+    def fits(start, stop):
+        """Check interpolation between nodes `start` and `stop`."""
+        inner = slice(start + 1, stop)
+        weights = (xp[inner] - xp[start]) / (xp[stop] - xp[start])
+        estimate = fp[start] + _expand(weights, fp) * (fp[stop] - fp[start])
+        return np.all(abs(estimate - reference[inner]) <= tolerance[inner])
+
+    nodes, start = [0], 0
+    while start < len(xp) - 1:
+        stop = start + 1
+        while stop + 1 < len(xp) and fits(start, stop + 1):
+            stop += 1
+        nodes.append(stop)
+        start = stop
+    return np.array(nodes)
+
+
+def fill_missing(xp, fp, axis=-1, method='linear', extrapolation='constant'):
+    """Replace missing values by interpolation along an axis.
+
+    Each missing value (NaN) is interpolated from the closest valid
+    values before and after it along `axis`, for all the values along
+    the other axes at once, each with its own missing values.
+
+    Parameters
+    ----------
+    xp : array_like
+        The strictly increasing coordinates of the data points.
+    fp : array_like
+        The data values, with ``fp.shape[axis] == len(xp)``.
+    axis : int, default -1
+        The axis of `fp` corresponding to `xp`.
+    method : {'linear', 'nearest'}, default 'linear'
+        Interpolate linearly between the valid neighbours, or take the
+        value of the closest one.
+    extrapolation : {'constant', 'linear', 'raise'}, default 'constant'
+        Behaviour before the first or after the last valid value: repeat
+        it, extend the segment between the two closest valid values (with
+        the linear method), or raise a :class:`ValueError`.  Values along
+        lines without any valid value are left missing.
+
+    Returns
+    -------
+    :class:`~numpy.ndarray`
+        The values of `fp` with missing values replaced.
+
+    Examples
+    --------
+    >>> fill_missing([0, 1, 2, 3], [1, np.nan, 3, np.nan])
+    array([1., 2., 3., 3.])
+    >>> fill_missing([0, 1, 2, 3], [1, np.nan, 3, np.nan],
+    ...              extrapolation='linear')
+    array([1., 2., 3., 4.])
+
+    """
+    if method not in ('linear', 'nearest'):
+        raise ValueError("'method' must be either 'linear' or 'nearest'.")
+    _check_extrapolation(extrapolation)
+    xp = np.asarray(xp, dtype=float)
+    _check_nodes(xp)
+    fp = _move_to_front(np.asarray(fp, dtype=float), axis)
+    n, missing = len(xp), np.isnan(fp)
+    positions = np.broadcast_to(_expand(np.arange(n), fp), fp.shape)
+    # Positions of the closest valid values before and after each value
+    before = np.maximum.accumulate(
+        np.where(missing, -1, positions), axis=0
+    )
+    after = np.minimum.accumulate(
+        np.where(missing, n, positions)[::-1], axis=0
+    )[::-1]
+    left, right = np.clip(before, 0, n - 1), np.clip(after, 0, n - 1)
+    x = np.broadcast_to(_expand(xp, fp), fp.shape)
+    fleft = np.take_along_axis(fp, left, axis=0)
+    fright = np.take_along_axis(fp, right, axis=0)
+    first = missing & (before < 0) & (after < n)
+    last = missing & (before >= 0) & (after >= n)
+    if extrapolation == 'raise' and np.any(first | last):
+        raise ValueError("missing values out of the range of valid values.")
+    if method == 'nearest':
+        inner = np.where(x - xp[left] <= xp[right] - x, fleft, fright)
+    else:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            t = (x - xp[left]) / (xp[right] - xp[left])
+        inner = fleft + t * (fright - fleft)
+        if extrapolation == 'linear':
+            # Second closest valid values, beyond the closest ones
+            following = np.concatenate([after[1:], np.full_like(after[:1], n)])
+            preceding = np.concatenate([np.full_like(before[:1], -1),
+                                        before[:-1]])
+            second = np.where(
+                first, np.take_along_axis(following, right, axis=0),
+                np.take_along_axis(preceding, left, axis=0)
+            )
+            known = np.where(first, right, left)
+            usable = (first | last) & (second >= 0) & (second < n)
+            second = np.clip(second, 0, n - 1)
+            fsecond = np.take_along_axis(fp, second, axis=0)
+            fknown = np.where(first, fright, fleft)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                slope = (fsecond - fknown) / (xp[second] - xp[known])
+            fright = np.where(usable & first,
+                              fknown + slope * (x - xp[known]), fright)
+            fleft = np.where(usable & last,
+                             fknown + slope * (x - xp[known]), fleft)
+    result = np.where(missing & (before >= 0) & (after < n), inner, fp)
+    result = np.where(first, fright, result)
+    result = np.where(last, fleft, result)
+    return np.moveaxis(result, 0, axis)
+
+
+class TabulatedCorrection:
+    """
+    Correction function defined by tabulated (e.g. measured) values.
+
+    Tabulated corrections can be used wherever a correction function is
+    expected, for example in :attr:`Permap.corrections
+    <costa.permap.Permap.corrections>`.  They evaluate whole arrays at
+    once using :func:`numpy.searchsorted`.
+
+    Parameters
+    ----------
+    x : array_like
+        Values of the input quantity, e.g. normalized frequencies.
+    factors : array_like
+        Correction factors corresponding to `x`.
+    method : {'linear', 'pchip'}, default 'linear'
+        Interpolation method, either piecewise linear or
+        monotone piecewise cubic.
+    extrapolation : {'constant', 'linear', 'raise'}, default 'constant'
+        Behaviour out of the tabulated range (see :func:`interp_linear`).
+
+    Examples
+    --------
+    >>> corr = TabulatedCorrection([0, 0.5, 1], [0, 0.4, 1])
+    >>> corr(0.75)
+    0.7
+    >>> corr(np.array([-1, 0.25, 2]))
+    array([0. , 0.2, 1. ])
+
+    """
+
+    methods = ('linear', 'pchip')
+
+    def __init__(self, x, factors, method='linear', extrapolation='constant'):
+        x, factors = np.asarray(x, dtype=float), np.asarray(factors, float)
+        if x.shape != factors.shape:
+            raise ValueError("'x' and 'factors' must have the same shape.")
+        order = np.argsort(x, kind='stable')
+        x, factors = x[order], factors[order]
+        _check_nodes(x)
+        if method not in self.methods:
+            raise ValueError("'method' must be either 'linear' or 'pchip'.")
+        _check_extrapolation(extrapolation)
+        self.x = x
+        self.factors = factors
+        self.method = method
+        self.extrapolation = extrapolation
+        if method == 'pchip':
+            self._slopes = pchip_slopes(x, factors)
+
+    @classmethod
+    def from_csv(cls, filename, x=0, factors=1, method='linear',
+                 extrapolation='constant', **kwargs):
+        """Build a tabulated correction from a CSV file.
+
+        Parameters
+        ----------
+        filename : str or path-like
+            The file to read, passed to :func:`pandas.read_csv`.
+        x, factors : int or str, default 0 and 1
+            Position or name of the columns holding the input values
+            and the correction factors.
+        method, extrapolation : str
+            See :class:`TabulatedCorrection`.
+        **kwargs
+            Additional keyword arguments passed to :func:`pandas.read_csv`.
+
+        """
+        # pandas is imported lazily, so that this module stays light
+        import pandas as pd
+
+        table = pd.read_csv(filename, **kwargs)
+
+        def column(key):
+            return table.iloc[:, key] if isinstance(key, int) else table[key]
+
+        return cls(
+            column(x).to_numpy(), column(factors).to_numpy(),
+            method=method, extrapolation=extrapolation
+        )
+
+    def __call__(self, x):
+        if self.method == 'pchip':
+            result = interp_hermite(
+                x, self.x, self.factors, self._slopes,
+                extrapolation=self.extrapolation
+            )
+        else:
+            result = interp_linear(
+                x, self.x, self.factors, extrapolation=self.extrapolation
+            )
+        return result[()] if result.ndim == 0 else result
+
+    def __repr__(self):
+        return (
+            f"{type(self).__name__}({len(self.x)} points, "
+            f"method={self.method!r}, extrapolation={self.extrapolation!r})"
+        )
@@ -3,14 +3,25 @@ The ``permap`` module provides the Permap class, an extension of
 :class:`pandas.DataFrame` to fill incomplete performance maps.
 """
 
+import bz2
+import gzip
+import json
+import lzma
+import os
 import warnings
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from copy import deepcopy
 from collections.abc import MutableMapping
 
 import numpy as np
 import pandas as pd
 
+from .backends import get_backend
 from .defaults import build_default_corrections
+from .interpolate import (
+    fill_missing, interp_linear, interp_pchip, select_nodes
+)
+from .spec import _coerce as _coerce_spec
 
 
 @pd.api.extensions.register_dataframe_accessor('pm')
@@ -46,7 +57,8 @@ class Permap:
         of the first level are the input quantities and those of the
         second level are the output quantities.  Dictionary values
         (the corrections) must be provided as functions with one
-        argument. See examples for more details.
+        argument, or as :class:`~costa.interpolate.TabulatedCorrection`
+        objects for tabulated data. See examples for more details.
     initial_norm_values : :class:`dict`, default :obj:`None`
         Manufacturer tables are not always provided in rated conditions;
         for example, some performance tables are provided at maximum
@@ -125,6 +137,7 @@ class Permap:
             setitem=set_range
         )
         self._restricted_levels = {key: None for key in self.ranges}
+        self._fill_inputs = None
 
     def update_data(self, df, update_ranges=True, keep_restrictions=False):
         """Return a new performance map with updated data.
@@ -267,11 +280,14 @@ class Permap:
     def copy(self):
         return self.copyattr(self)
 
-    def copyattr(self, other):
+    def copyattr(self, other, deep=True):
         """Return a copy of the Permap with some selected attributes
         copied from `other`.
+
+        If `deep` is ``False``, the data of the returned copy is shared
+        with the original DataFrame.
         """
-        new = self.data.copy(deep=True)
+        new = self.data.copy(deep=deep)
         if isinstance(other, Permap) or hasattr(other, 'pm'):
             pm = other.pm if hasattr(other, 'pm') else other
             for attribute in self._attributes_to_copy:
@@ -296,7 +312,61 @@ class Permap:
         #                                           dict      str        list
         self._entries = new_entries
 
-    def normalize(self, values=None):
+    def suggest_entries(self, quantity, tol=1e-3, bounds=None, num=1001):
+        """Suggest entries adapted to the shape of the corrections.
+
+        Entries are placed such that linearly interpolating the
+        corrections of all output quantities between them gives back the
+        corrections within the specified tolerance.  They are thus dense
+        where the corrections are strongly curved and sparse elsewhere.
+
+        Parameters
+        ----------
+        quantity : str
+            The input quantity, e.g. ``'freq'`` or ``'AFR'``.
+        tol : float, default 1e-3
+            Absolute tolerance on the correction factors, i.e. on the
+            performance values relative to the initial ones.
+        bounds : tuple of float, optional
+            Lowest and highest entries.  By default, the bounds of the
+            current :attr:`entries` are used.
+        num : int, default 1001
+            Number of evenly spaced candidates between the bounds.
+
+        Returns
+        -------
+        :class:`~numpy.ndarray`
+            Suggested entries, including both bounds.
+
+        Raises
+        ------
+        RuntimeError
+            If the operating :attr:`mode` is not yet set.
+
+        Examples
+        --------
+        >>> hm = costa.build_heating_permap()
+        >>> hm.pm.mode = 'heating'
+        >>> entries = hm.pm.suggest_entries('freq', tol=1e-2, bounds=(0.1, 2))
+        >>> len(entries)
+        12
+
+        """
+        corrections = self.get_correction(quantity)
+        if bounds is None:
+            entries = self.entries[quantity]
+            bounds = np.min(entries), np.max(entries)
+        candidates = np.linspace(*bounds, num)
+        initial = self.initial_norm_values[quantity]
+        # Constant corrections may return scalars
+        factors = np.stack([
+            np.broadcast_to(corr(candidates) / corr(initial), (num,))
+            for corr in corrections.values()
+        ])
+        nodes = select_nodes(candidates, factors, rtol=0, atol=tol)
+        return candidates[nodes]
+
+    def normalize(self, values=None, threads=None):
         """Normalize values in the performance map.
 
         Parameters
@@ -307,6 +377,8 @@ class Permap:
             The performance data will be normalized by those values.  By
             default, `values` is ``None`` and in that case the original
             performance map is returned.
+        threads : int, optional
+            Number of threads among which blocks of rows are shared.
 
         Returns
         -------
@@ -380,26 +452,182 @@ class Permap:
         if self.normalized:
             raise RuntimeError("values are already normalized.")
         self._check_mode(before='normalizing')
-        pm = self.copy()
         if values is None:
-            return pm
-        pmcols, vacols = set(pm.pm.data.columns), set(values.columns)
+            return self.copy()
+        factors = self._norm_factors(values)
+        data = self.data
+        if len(factors) > len(data.columns):
+            data = self._add_missing_df_column(data)
+        factors = factors.reindex(data.columns).to_numpy()
+        values = data.to_numpy()
+        normalized = np.empty(values.shape, np.result_type(values, factors))
+
+        backend = get_backend()
+
+        def normalize_rows(start, stop):
+            backend.scale(values[start:stop], factors, normalized[start:stop])
+
+        _blockwise(normalize_rows, len(values), threads)
+        normalized = pd.DataFrame(
+            normalized, index=data.index, columns=data.columns
+        )
+        pm = normalized.pm.copyattr(self, deep=False)
+        pm.pm._normalized = True
+        return pm
+
+    def normalize_many(self, values, filenames=None, majororder='row',
+                       threads=None):
+        """Normalize a filled performance map with several rated values.
+
+        Each variant is a scaling of the columns of the shared
+        performance values, so that a filled map can be used for several
+        products differing only by their rated values.  Power values are
+        divided by the rated power, and (sensible, latent or total)
+        capacities by the rated capacity.  Invalid states flagged with
+        -999 are left untouched.
+
+        Parameters
+        ----------
+        values : list of :class:`~pandas.DataFrame` or \
+:class:`~pandas.DataFrame`
+            Rated values of each variant (see :meth:`normalize`), either
+            as a list of one-row DataFrames or as a DataFrame with one row
+            per variant.
+        filenames : list of str, optional
+            If given, each variant is written to the corresponding file
+            (see :meth:`write`) instead of being returned.  Variants are
+            then computed one after the other in a single buffer.
+        majororder : {'row', 'col'}
+            See :meth:`write`.
+        threads : int, optional
+            Number of threads among which blocks of rows are shared.
+
+        Returns
+        -------
+        iterator of :class:`~pandas.DataFrame` or list of str
+            The normalized performance maps, computed as they are
+            iterated over, or the names of the written files.
+
+        Raises
+        ------
+        RuntimeError
+            If the data is already normalized.
+        ValueError
+            If the number of file names and of rated values differ.
+
+        Examples
+        --------
+        >>> hm = costa.build_heating_permap()
+        >>> hm.pm.mode = 'heating'
+        >>> filled = hm.pm.fill()
+        >>> rated = pd.DataFrame({'capacity': [4.69, 6], 'power': [1.01, 1.3]})
+        >>> filled.pm.normalize_many(rated, ["small.dat", "large.dat"])
+        ['small.dat', 'large.dat']
+
+        """
+        if self.normalized:
+            raise RuntimeError("values are already normalized.")
+        self._check_mode(before='normalizing')
+        if isinstance(values, pd.DataFrame):
+            values = [values.iloc[[i]] for i in range(len(values))]
+        factors = [self._column_factors(rated) for rated in values]
+        if filenames is None:
+            return self._normalized_variants(factors, threads)
+        filenames = list(filenames)
+        if len(filenames) != len(factors):
+            raise ValueError("there must be one file name per rated values.")
+        data = self.data.to_numpy()
+        # Floating point data keeps its precision (e.g. single)
+        dtype = data.dtype if data.dtype.kind == 'f' else np.float64
+        buffer = np.empty(data.shape, dtype)
+        variant = pd.DataFrame(
+            buffer, index=self.data.index, columns=self.data.columns,
+            copy=False
+        ).pm.copyattr(self, deep=False)
+        variant.pm._normalized = True
+        for column_factors, filename in zip(factors, filenames):
+            self._scale_into(buffer, column_factors, threads)
+            variant.pm.write(filename, majororder=majororder)
+        return filenames
+
+    def _normalized_variants(self, factors, threads):
+        """Yield the normalized performance maps of :meth:`normalize_many`."""
+        data = self.data.to_numpy()
+        dtype = data.dtype if data.dtype.kind == 'f' else np.float64
+        for column_factors in factors:
+            values = np.empty(data.shape, dtype)
+            self._scale_into(values, column_factors, threads)
+            variant = pd.DataFrame(
+                values, index=self.data.index, columns=self.data.columns
+            ).pm.copyattr(self, deep=False)
+            variant.pm._normalized = True
+            yield variant
+
+    def _scale_into(self, out, factors, threads=None):
+        """Scale the columns of the data into `out`, keeping -999 flags."""
+        data = self.data.to_numpy()
+
+        factors = factors.astype(out.dtype)
+        backend = get_backend()
+
+        def scale_rows(start, stop):
+            backend.scale(data[start:stop], factors, out[start:stop],
+                          keep_flags=True)
+
+        _blockwise(scale_rows, len(data), threads)
+
+    def _column_factors(self, values):
+        """Return the normalizing factor of each column of the data.
+
+        Power is normalized by the rated power, and any capacity
+        (``'capacity'``, ``'sensible_capacity'``, ``'latent_capacity'``)
+        by the rated capacity.
+        """
+        if 'capacity' not in values or 'power' not in values:
+            values = self._add_missing_df_column(values)
+        rated = values.iloc[0]
+        factors = []
+        for column in self.data.columns:
+            if column == 'power':
+                factors.append(1 / rated['power'])
+            elif column.endswith('capacity'):
+                factors.append(1 / rated['capacity'])
+            else:
+                raise ValueError(f"cannot normalize '{column}' values.")
+        return np.array(factors)
+
+    def _norm_factors(self, values):
+        """Return the factors normalizing each output quantity.
+
+        Parameters
+        ----------
+        values : :class:`~pandas.DataFrame`
+            Rated values (see :meth:`normalize`).
+
+        Returns
+        -------
+        :class:`~pandas.Series`
+            The inverse of the rated values, including the redundant
+            output quantity if it is missing in `values`.
+
+        Raises
+        ------
+        ValueError
+            If there is an inconsistency between the Permap column
+            index and the rated values DataFrame column index.
+
+        """
+        pmcols, vacols = set(self.data.columns), set(values.columns)
         mismatch = pmcols ^ vacols
-        if mismatch < {'capacity', 'power', 'COP'}:
-            if len(pmcols) > len(vacols):
-                values = pm.pm._add_missing_df_column(values)
-            elif len(pmcols) < len(vacols):
-                pm.pm.data = pm.pm._add_missing_df_column(pm.pm.data)
-            for quantity, value in values.iteritems():
-                pm[quantity] /= value[0]
-            pm.pm._normalized = True
-            return pm
-        else:
+        if not mismatch < {'capacity', 'power', 'COP'}:
             raise ValueError(
                 "DataFrame column index must match values column index."
                 f"\nIndex are {list(pmcols)}"
                 f" and {list(vacols)}"
             )
+        if len(pmcols) > len(vacols):
+            values = self._add_missing_df_column(values)
+        return 1 / values.iloc[0]
 
     @property
     def corrections(self):
@@ -643,17 +871,18 @@ class Permap:
             return self.copy()
         missing_key = (all_keys - keys).pop()
         if missing_key == 'power':
-            cap, COP = (corrections[qt] for qt in ('capacity', 'COP'))
-            def new_correction(x): return cap(x) / COP(x)
+            first, second = (corrections[qt] for qt in ('capacity', 'COP'))
+            operator = np.divide
         elif missing_key == 'capacity':
-            power, COP = (corrections[qt] for qt in ('power', 'COP'))
-            def new_correction(x): return power(x) * COP(x)
+            first, second = (corrections[qt] for qt in ('power', 'COP'))
+            operator = np.multiply
         elif missing_key == 'COP':
-            power, cap = (corrections[qt] for qt in ('power', 'capacity'))
-            def new_correction(x): return cap(x) / power(x)
+            first, second = (corrections[qt] for qt in ('capacity', 'power'))
+            operator = np.divide
         else:
             err_msg = "correction key should be 'capacity', 'power' or 'COP'."
             raise ValueError(err_msg)
+        def new_correction(x): return operator(first(x), second(x))
         if inplace:
             self.set_correction(
                 quantity, missing_key, new_correction, inplace=True)
@@ -710,7 +939,7 @@ class Permap:
             keep_restrictions=True
         )
 
-    def correct(self, corrections, entry, initial=1):
+    def correct(self, corrections, entry, initial=1, scale=None):
         """Apply corrections to ouput quantities.
 
         Parameters
@@ -724,6 +953,9 @@ class Permap:
         initial : int or float, default 1
             Initial normalized value
             (see attribute :attr:`initial_norm_values`).
+        scale : dict or :class:`~pandas.Series`, optional
+            Additional factor applied to each output quantity, e.g. to
+            normalize the values at the same time.
 
         Returns
         -------
@@ -744,12 +976,25 @@ class Permap:
 
         """
         self._check_columns(corrections.keys())
-        new = self.copy()
-        for quantity, correction in corrections.items():
-            new[quantity] *= correction(entry) / correction(initial)
-        return new
+        values = self.data.to_numpy()
+        factors = np.ones(len(self.data.columns))
+        for j, quantity in enumerate(self.data.columns):
+            if quantity in corrections:
+                correction = corrections[quantity]
+                factors[j] = correction(entry) / correction(initial)
+                if scale is not None:
+                    factors[j] *= scale[quantity]
+        if np.issubdtype(values.dtype, np.floating):
+            factors = factors.astype(values.dtype)
+        corrected = np.empty(values.shape, np.result_type(values, factors))
+        get_backend().scale(values, factors, corrected)
+        new = pd.DataFrame(
+            corrected, index=self.data.index, columns=self.data.columns
+        )
+        return new.pm.copyattr(self, deep=False)
 
-    def extend(self, corrections, entries, name='new dim'):
+    def extend(self, corrections, entries, name='new dim', scale=None,
+               threads=None):
         """Extend the performance map along a new dimension.
 
         Parameters
@@ -762,6 +1007,11 @@ class Permap:
             be applied.
         name : str, default 'new dim'
             Name of the quantity corresponding to the new dimension.
+        scale : dict or :class:`~pandas.Series`, optional
+            Additional factor applied to each output quantity
+            (see :meth:`correct`).
+        threads : int, optional
+            Number of threads among which blocks of rows are shared.
 
         Returns
         -------
@@ -782,28 +1032,194 @@ class Permap:
         """
         self._check_columns(corrections.keys())
         initial = self.initial_norm_values[name]
-        new = pd.concat(
-            [self.correct(corrections, entry, initial) for entry in entries],
-            keys=entries,
-            names=[name]
+        entries = list(entries)
+        values = self.data.to_numpy()
+        # Same factors as in correct, one row per entry
+        factors = np.empty((len(entries), len(self.data.columns)))
+        for j, quantity in enumerate(self.data.columns):
+            correction = corrections[quantity]
+            reference = correction(initial)
+            factors[:, j] = [
+                correction(entry) / reference for entry in entries
+            ]
+            if scale is not None:
+                factors[:, j] *= scale[quantity]
+        factors = factors.astype(values.dtype, copy=False)
+        extended = np.empty((len(entries),) + values.shape, values.dtype)
+        backend = get_backend()
+
+        def extend_rows(start, stop):
+            backend.outer(
+                factors, values[start:stop], extended[:, start:stop]
+            )
+
+        _blockwise(extend_rows, len(values), threads)
+        new = pd.DataFrame(
+            extended.reshape(-1, values.shape[-1]),
+            index=_prepend_level(self.data.index, entries, name),
+            columns=self.data.columns
         )
         return self.update_data(new, keep_restrictions=True)
 
-    def fill(self, norm=None):
+    def regrid(self, entries, method='linear', extrapolation='raise'):
+        """Resample the performance map on new level entries.
+
+        For each level to resample, the values are interpolated at the
+        new entries for all combinations of the other levels at once.
+        This is typically used to put manufacturer tables provided on
+        different outdoor temperatures on common axes.
+
+        Parameters
+        ----------
+        entries : dict
+            New entries, with the names of the levels to resample as keys.
+        method : {'linear', 'pchip'}, default 'linear'
+            Interpolation method
+            (see :class:`~costa.interpolate.TabulatedCorrection`).
+        extrapolation : {'raise', 'constant', 'linear'}, default 'raise'
+            Behaviour for entries out of the current level range
+            (see :func:`~costa.interpolate.interp_linear`).
+
+        Returns
+        -------
+        :class:`~pandas.DataFrame`
+            A resampled copy of the original DataFrame.
+
+        Raises
+        ------
+        ValueError
+            If a key of `entries` is not a level name, or if an entry is
+            out of range and `extrapolation` is ``'raise'``.
+
+        Examples
+        --------
+        >>> hm = costa.build_heating_permap()
+        >>> hm.pm.regrid({'Tdbo': [-25, -15, -5, 5, 15]}).index.levshape
+        (4, 5)
+
+        """
+        interpolators = {'linear': interp_linear, 'pchip': interp_pchip}
+        if method not in interpolators:
+            raise ValueError("'method' must be either 'linear' or 'pchip'.")
+        names = self.data.index.names
+        data = self.data
+        for level, new_entries in entries.items():
+            if level not in names:
+                raise ValueError(f"'{level}' is not a level name.")
+            new_entries = np.unique(np.asarray(new_entries, dtype=float))
+            # Put the level to resample along the last axis
+            wide = data.unstack(level)
+            outputs = wide.columns.unique(0)
+            xp = wide.columns.unique(1).to_numpy(dtype=float)
+            values = wide.to_numpy().reshape(len(wide), len(outputs), len(xp))
+            new_values = interpolators[method](
+                new_entries, xp, values, extrapolation=extrapolation
+            )
+            columns = pd.MultiIndex.from_product(
+                [outputs, pd.Index(new_entries, name=level)],
+                names=wide.columns.names
+            )
+            resampled = pd.DataFrame(
+                new_values.reshape(len(wide), -1),
+                index=wide.index,
+                columns=columns
+            )
+            data = (
+                resampled.stack(level, dropna=False)
+                .reorder_levels(names)
+                .sort_index()
+            )
+        regridded = self.update_data(data, keep_restrictions=True)
+        for level, rng in self.ranges.items():
+            if level not in entries:
+                regridded.pm.ranges[level] = rng
+        return regridded
+
+    def fill_gaps(self, method='linear', levels=None,
+                  extrapolation='constant'):
+        """Impute missing points of a manufacturer table.
+
+        Missing values (NaN) and missing rows are interpolated from the
+        neighbouring points along each level in turn, for all columns
+        at once.  Levels varying together with the interpolated one
+        (e.g. ``'Twbr'`` with ``'Tdbr'`` in cooling tables) follow it.
+        Points still missing after a level (e.g. a whole missing line)
+        may be imputed along the next one.
+
+        Parameters
+        ----------
+        method : {'linear', 'nearest'}, default 'linear'
+            Interpolation between neighbours, see
+            :func:`~costa.interpolate.fill_missing`.
+        levels : list of str, optional
+            The levels to interpolate along, in order.  By default,
+            ``'Tdbo'`` then ``'Tdbr'``.
+        extrapolation : {'constant', 'linear', 'raise'}, default 'constant'
+            Behaviour for missing points beyond the last valid point of
+            a line.
+
+        Returns
+        -------
+        filled : :class:`~pandas.DataFrame`
+            The performance map without gaps, ready to be filled.
+        imputed : :class:`~pandas.DataFrame`
+            For each point with imputed values, whether each column was
+            imputed.
+
+        Examples
+        --------
+        >>> hm = costa.build_heating_permap("holes.txt")
+        >>> hm.pm.mode = 'heating'
+        >>> complete, imputed = hm.pm.fill_gaps()
+        >>> filled = complete.pm.fill()
+
+        """
+        data = self.data
+        names = list(data.index.names)
+        if levels is None:
+            levels = [name for name in ('Tdbo', 'Tdbr') if name in names]
+        missing = [level for level in levels if level not in names]
+        if missing:
+            raise ValueError(f"unknown levels: {missing}.")
+        filled = data
+        for level in levels:
+            filled = _fill_gaps_along(filled, level, method, extrapolation)
+        before = data.reindex(filled.index)
+        imputed = before.isna() & filled.notna()
+        imputed = imputed[imputed.any(axis='columns')]
+        filled = self.update_data(
+            filled, update_ranges=False, keep_restrictions=True
+        )
+        return filled, imputed
+
+    def fill(self, norm=None, dtype=None, threads=None):
         """Extend the performance to include frequency, air flow rate and
         (in cooling mode) wet-bulb temperature entries.
 
         Parameters
         ----------
-        norm : :class:`~pandas.DataFrame`, optional
+        norm : :class:`~pandas.DataFrame` or list, optional
             DataFrame with the rated values used for normalizing the
             data (see `values` argument in the :meth:`normalize` method
             documentation). If not provided, the data is not normalized.
+            If a list of such DataFrames is given, the performance map is
+            extended once and an iterator over the normalized maps is
+            returned (see :meth:`normalize_many`), so that the variants
+            are computed one at a time, as they are iterated over.
+        dtype : data-type, optional
+            Floating point type of the filled values, e.g.
+            :class:`numpy.float32` to halve the memory footprint.  By
+            default, the type of the original data is kept.
+        threads : int, optional
+            Number of threads among which the computations are shared,
+            by blocks of rows.  Results are identical whatever the number
+            of threads.
 
         Returns
         -------
-        :class:`~pandas.DataFrame`
-            An extended copy of the original DataFrame.
+        :class:`~pandas.DataFrame` or iterator of :class:`~pandas.DataFrame`
+            An extended copy of the original DataFrame, or the normalized
+            copies if `norm` is a list.
 
         Raises
         ------
@@ -868,58 +1284,643 @@ class Permap:
 
         """
         self._check_mode("filling the performance map")
-        if norm is not None and self.normalized:
-            raise RuntimeError("values are already normalized")
+        if self.normalized:
+            raise RuntimeError("values are already normalized.")
+        if isinstance(norm, (list, tuple)):
+            # Extend once, then scale for each set of rated values lazily
+            filled = self.fill(dtype=dtype, threads=threads)
+            return filled.pm.normalize_many(norm, threads=threads)
+
+        if self.data.isna().to_numpy().any():
+            warnings.warn(
+                "The performance map has missing values, which propagate "
+                "to the extended rows. Use fill_gaps to impute them first."
+            )
+        base = self._add_missing_column()
+        if dtype is not None:
+            base = base.astype(dtype).pm.copyattr(base, deep=False)
+        # Normalization is folded into the first extension factors
+        scale = None if norm is None else base.pm._norm_factors(norm)
+        permap, pm_norm = self._extend_base(base, scale, threads)
+        pm_norm.pm._normalized = norm is not None
+        if dtype is not None:
+            permap = permap.astype(dtype, copy=False)
+        filled = permap.pm.copyattr(pm_norm, deep=False)
+        filled.pm._fill_inputs = self._record_fill_inputs(norm, dtype)
+        return filled
+
+    def _extend_base(self, base, scale, threads, Twbr=None):
+        """Extend base data along all the levels added by :meth:`fill`.
+
+        Each row of `base` gives its own block of rows of the result, so
+        that any subset of the rows can be extended alone, provided that
+        the wet-bulb temperature entries `Twbr` of the whole performance
+        map are given in cooling mode.
+
+        Returns
+        -------
+        permap : :class:`~pandas.DataFrame`
+            The extended values, with the final columns and level order.
+        pm_norm : :class:`~pandas.DataFrame`
+            The extended data whose attributes are given to the result.
 
+        """
         freq_corr = self.get_correction('freq')
-        with_freq = self._add_missing_column().pm.extend(
-            freq_corr, self.entries['freq'], name='freq'
+        with_freq = base.pm.extend(
+            freq_corr, self.entries['freq'], name='freq', scale=scale,
+            threads=threads
         )
         AFR_corr = self.get_correction('AFR')
         with_AFR = with_freq.pm.extend(
-            AFR_corr, self.entries['AFR'], name='AFR'
+            AFR_corr, self.entries['AFR'], name='AFR', threads=threads
         )
+        # Additional levels (e.g. 'unit' in collections) are kept in front
+        extra_levels = [
+            name for name in self.data.index.names
+            if name not in ('Tdbr', 'Twbr', 'Tdbo')
+        ]
         if self.mode == 'heating':
-            new_level_order = ['Tdbr', 'Tdbo', 'AFR', 'freq']
+            new_level_order = extra_levels + ['Tdbr', 'Tdbo', 'AFR', 'freq']
             pm_norm = (
                 with_AFR.reorder_levels(new_level_order).sort_index()
-                .pm.copyattr(with_AFR).pm.normalize(norm)
+                .pm.copyattr(with_AFR, deep=False)
             )
             permap = pm_norm.reindex(['power', 'capacity'], axis='columns')
         elif self.mode == 'cooling':
             without_Twbr = with_AFR.droplevel('Twbr').pm.copyattr(with_AFR)
-            Twbr = with_AFR.index.get_level_values('Twbr').unique().to_numpy()
+            if Twbr is None:
+                Twbr = base.index.get_level_values('Twbr').unique().to_numpy()
             Twbr_corr = self.get_correction('Twbr')
-            with_Twbr = without_Twbr.pm.extend(Twbr_corr, Twbr, name='Twbr')
-            pm_norm = with_Twbr.pm.normalize(norm)
-            Tdb = pm_norm.index.get_level_values('Tdbr').to_numpy()
-            Twb = pm_norm.index.get_level_values('Twbr').to_numpy()
-            invalid_states = Tdb < Twb
-            valid_states = np.logical_not(invalid_states)
-            wb_depression = Tdb[valid_states] - Twb[valid_states]
-            SHR = self.get_correction('SHR')
-            pm_norm.loc[valid_states, 'sensible_capacity'] = (
-                pm_norm.capacity.iloc[valid_states] * SHR(wb_depression)
+            pm_norm = without_Twbr.pm.extend(
+                Twbr_corr, Twbr, name='Twbr', threads=threads
             )
-            pm_norm.loc[valid_states, 'latent_capacity'] = (
-                pm_norm.capacity.iloc[valid_states]
-                - pm_norm.sensible_capacity.iloc[valid_states]
+            new_level_order = (
+                extra_levels + ['Tdbr', 'Twbr', 'Tdbo', 'AFR', 'freq']
             )
-            # Put -999 flag at invalid states
-            pm_norm.iloc[invalid_states, :] = -999
-            new_level_order = ['Tdbr', 'Twbr', 'Tdbo', 'AFR', 'freq']
-            new_index_order = ['power', 'sensible_capacity', 'latent_capacity']
-            permap = (
-                pm_norm.drop('capacity', axis='columns')
-                .reorder_levels(new_level_order)
-                .sort_index()
-                .reindex(new_index_order, axis='columns')
+            ordered = pm_norm.reorder_levels(new_level_order).sort_index()
+            Tdb = ordered.index.get_level_values('Tdbr').to_numpy()
+            Twb = ordered.index.get_level_values('Twbr').to_numpy()
+            capacity = ordered['capacity'].to_numpy()
+            power = ordered['power'].to_numpy()
+            SHR = self.get_correction('SHR')
+            values = np.empty(
+                (len(ordered), 3), np.result_type(capacity, power)
+            )
+            backend = get_backend()
+
+            def split_capacity(start, stop):
+                valid_states = Tdb[start:stop] >= Twb[start:stop]
+                ratio = np.zeros(stop - start)
+                ratio[valid_states] = SHR(
+                    (Tdb[start:stop] - Twb[start:stop])[valid_states]
+                )
+                # Invalid states are flagged with -999
+                backend.split_capacity(
+                    capacity[start:stop], power[start:stop], ratio,
+                    valid_states, values[start:stop]
+                )
+
+            _blockwise(split_capacity, len(values), threads)
+            permap = pd.DataFrame(
+                values,
+                index=ordered.index,
+                columns=pd.Index(
+                    ['power', 'sensible_capacity', 'latent_capacity'],
+                    name=pm_norm.columns.name
+                )
             )
         else:
             raise ValueError("mode must either be heating or cooling")
-        return permap.pm.copyattr(pm_norm)
+        return permap, pm_norm
+
+    def apply_spec(self, spec):
+        """Fill the performance map as described by a specification.
+
+        The mode, entries, initial normalized values and corrections of
+        the specification are applied to a copy of the performance map,
+        which is then filled and normalized with the rated values of the
+        specification.  Its source and output are ignored, see
+        :func:`costa.spec.run` to run a specification entirely.
+
+        Parameters
+        ----------
+        spec : :class:`~costa.spec.FillSpec`, dict or str
+            The specification, or the name of a JSON or TOML file.
+
+        Returns
+        -------
+        :class:`~pandas.DataFrame`
+            The filled performance map, with the operating ranges of the
+            specification.
+
+        Raises
+        ------
+        RuntimeError
+            If neither the specification nor the performance map give
+            the operating :attr:`mode`.
+
+        Examples
+        --------
+        >>> hm = costa.build_heating_permap()
+        >>> spec = {'mode': 'heating', 'entries': {'freq': [0.5, 1]}}
+        >>> hm.pm.apply_spec(spec).index.levshape
+        (4, 10, 2, 2)
+
+        """
+        spec = _coerce_spec(spec)
+        new = self.copy()
+        if spec.mode is not None and spec.mode != self.mode:
+            # Defaults of the new mode are used
+            new.pm.corrections = None
+            new.pm.initial_norm_values = None
+            new.pm.mode = spec.mode
+        new.pm._check_mode("applying a specification")
+        new.pm.entries.update(spec.entries)
+        new.pm.initial_norm_values.update(spec.initial_norm_values)
+        for quantity, corrections in spec.build_corrections().items():
+            new = new.pm.set_corrections(quantity, corrections)
+        norm = spec.norm
+        if norm is not None:
+            norm = pd.DataFrame({key: [value] for key, value in norm.items()})
+        filled = new.pm.fill(norm=norm, dtype=spec.dtype)
+        for level, bounds in spec.ranges.items():
+            filled.pm.ranges[level] = bounds
+        return filled
+
+    def _record_fill_inputs(self, norm, dtype):
+        """Return the inputs of a fill, to be compared by :meth:`refill`."""
+        return {
+            'base': self.data.copy(),
+            'mode': self.mode,
+            'corrections': _flatten(self.corrections),
+            'initial_norm_values': deepcopy(self.initial_norm_values),
+            'norm': None if norm is None else norm.copy(),
+            'dtype': None if dtype is None else np.dtype(dtype),
+            'entries': {
+                name: np.asarray(self.entries[name], dtype=float)
+                for name in ('freq', 'AFR')
+            }
+        }
+
+    def _same_fill_inputs(self, inputs, norm, dtype, base=True):
+        """Whether inputs other than the entries match a previous fill.
+
+        If `base` is ``False``, the data may differ too.
+        """
+        current = self._record_fill_inputs(norm, dtype)
+        previous_norm = inputs['norm']
+        same_norm = (
+            norm is None if previous_norm is None
+            else norm is not None and previous_norm.equals(current['norm'])
+        )
+        same_corrections = (
+            inputs['corrections'].keys() == current['corrections'].keys()
+            and all(
+                correction is current['corrections'][key]
+                for key, correction in inputs['corrections'].items()
+            )
+        )
+        return (
+            same_norm and same_corrections
+            and (not base or inputs['base'].equals(current['base']))
+            and inputs['mode'] == current['mode']
+            and inputs['initial_norm_values'] == current['initial_norm_values']
+            and inputs['dtype'] == current['dtype']
+        )
+
+    def refill(self, previous, norm=None, dtype=None):
+        """Update a filled performance map after a change of entries.
+
+        Only the slices corresponding to new ``'freq'`` or ``'AFR'``
+        entries are computed, and merged with the values of `previous`.
+        Slices of entries that were removed are dropped.  The result is
+        identical to the one of :meth:`fill`.
+
+        Parameters
+        ----------
+        previous : :class:`~pandas.DataFrame`
+            The result of a previous call to :meth:`fill` on this
+            performance map.
+        norm, dtype
+            See :meth:`fill`.
+
+        Returns
+        -------
+        :class:`~pandas.DataFrame`
+            An extended copy of the original DataFrame.
+
+        Notes
+        -----
+        The inputs of :meth:`fill` are recorded with its result.  If
+        anything else than the entries changed since (the data, the
+        corrections, the rated values, etc.), or if `previous` does not
+        come from :meth:`fill`, the performance map is filled again
+        from scratch.
+
+        Examples
+        --------
+        >>> hm = costa.build_heating_permap()
+        >>> hm.pm.mode = 'heating'
+        >>> filled = hm.pm.fill()
+        >>> hm.pm.entries['freq'] = [0.2, 0.5, 0.8, 1]
+        >>> hm.pm.refill(filled).equals(hm.pm.fill())
+        True
+
+        """
+        self._check_mode("filling the performance map")
+        inputs = previous.pm._fill_inputs
+        if inputs is None or not self._same_fill_inputs(inputs, norm, dtype):
+            return self.fill(norm, dtype)
+        entries = {
+            name: np.asarray(self.entries[name], dtype=float)
+            for name in ('freq', 'AFR')
+        }
+        kept = {
+            name: values[np.isin(values, inputs['entries'][name])]
+            for name, values in entries.items()
+        }
+        added = {
+            name: values[~np.isin(values, inputs['entries'][name])]
+            for name, values in entries.items()
+        }
+        # New frequencies for all flow rates, then new flow rates for the
+        # frequencies already computed
+        parts = [
+            previous[
+                previous.index.get_level_values('freq').isin(kept['freq'])
+                & previous.index.get_level_values('AFR').isin(kept['AFR'])
+            ]
+        ]
+        template = None
+        for freq, AFR in ((added['freq'], entries['AFR']),
+                          (kept['freq'], added['AFR'])):
+            if len(freq) == 0 or len(AFR) == 0:
+                continue
+            partial = self.copy()
+            partial.pm.entries = {**self.entries, 'freq': freq, 'AFR': AFR}
+            template = partial.pm.fill(norm, dtype)
+            parts.append(template)
+        if template is None:
+            template = previous
+        refilled = template.pm.update_data(
+            pd.concat(parts).sort_index(), keep_restrictions=True
+        )
+        refilled.pm._entries = deepcopy(self.entries)
+        refilled.pm._fill_inputs = self._record_fill_inputs(norm, dtype)
+        return refilled
+
+    def apply_base_update(self, filled, changed_rows=None, threads=None):
+        """Update a filled performance map after an edit of the data.
+
+        Each row of the original data is extended into its own block of
+        rows of the filled performance map.  When a few values of the
+        data are revised, only the blocks of the changed rows are
+        computed again (including the split of the capacity and the
+        -999 flags in cooling mode), and patched into a copy of
+        `filled`.  The result is identical to the one of :meth:`fill`
+        with the same rated values and type.
+
+        Parameters
+        ----------
+        filled : :class:`~pandas.DataFrame`
+            The result of a previous call to :meth:`fill` (or
+            :meth:`refill`) on the performance map before the edit.
+        changed_rows : optional
+            Labels of the rows of the data that changed, or a boolean
+            mask.  By default, they are found by comparing the data with
+            the one recorded by the previous fill.
+        threads : int, optional
+            Number of threads among which blocks of rows are shared.
+
+        Returns
+        -------
+        :class:`~pandas.DataFrame`
+            The updated copy of `filled`.
+
+        Raises
+        ------
+        ValueError
+            If `filled` does not come from :meth:`fill`.
+
+        Notes
+        -----
+        Rows that changed but are not in `changed_rows` keep their
+        previous values.  If anything else than the values of the data
+        changed since the previous fill (the index, the entries, the
+        corrections, etc.), the performance map is filled again from
+        scratch.
+
+        Examples
+        --------
+        >>> cm = costa.build_cooling_permap()
+        >>> cm.pm.mode = 'cooling'
+        >>> filled = cm.pm.fill()
+        >>> cm.loc[(26.7, 19.4, 35.0), 'capacity'] = 3.55
+        >>> updated = cm.pm.apply_base_update(filled)
+        >>> updated.equals(cm.pm.fill())
+        True
+
+        """
+        self._check_mode("filling the performance map")
+        inputs = filled.pm._fill_inputs
+        if inputs is None:
+            raise ValueError(
+                "the filled performance map does not come from fill."
+            )
+        norm, dtype = inputs['norm'], inputs['dtype']
+        previous = inputs['base']
+        same_entries = all(
+            np.array_equal(entries, self.entries[name])
+            for name, entries in inputs['entries'].items()
+        )
+        if not (
+            same_entries
+            and previous.index.equals(self.data.index)
+            and previous.columns.equals(self.data.columns)
+            and self._same_fill_inputs(inputs, norm, dtype, base=False)
+        ):
+            return self.fill(norm, dtype, threads)
+        if changed_rows is None:
+            data = self.data
+            same = (data == previous) | (data.isna() & previous.isna())
+            changed_rows = ~same.all(axis='columns')
+        changed = self.data.loc[changed_rows]
+        values = filled.to_numpy().copy()
+        if len(changed):
+            changed = self.update_data(changed)
+            base = changed.pm._add_missing_column()
+            if dtype is not None:
+                base = base.astype(dtype).pm.copyattr(base, deep=False)
+            scale = None if norm is None else base.pm._norm_factors(norm)
+            Twbr = None
+            if self.mode == 'cooling':
+                Twbr = self.data.index.get_level_values('Twbr').unique()
+                Twbr = Twbr.to_numpy()
+            blocks, _ = changed.pm._extend_base(
+                base, scale, threads, Twbr=Twbr
+            )
+            rows = filled.index.get_indexer(blocks.index)
+            columns = filled.columns.get_indexer(blocks.columns)
+            if (rows < 0).any() or (columns < 0).any():
+                return self.fill(norm, dtype, threads)
+            values[rows[:, np.newaxis], columns] = blocks.to_numpy()
+        updated = pd.DataFrame(
+            values, index=filled.index, columns=filled.columns
+        ).pm.copyattr(filled, deep=False)
+        updated.pm._fill_inputs = self._record_fill_inputs(norm, dtype)
+        return updated
+
+    def to_grid(self):
+        """Return the performance map as a multidimensional array.
+
+        Filled performance maps have one value for every combination of
+        the index level entries.  This method exposes them as a dense
+        array with one axis per level, plus one axis for the columns.
+
+        Returns
+        -------
+        levels : dict
+            Sorted entries of each level, with level names as keys.
+        values : :class:`~numpy.ndarray`
+            Performance values, with shape
+            ``tuple(len(v) for v in levels.values()) + (ncolumns,)``.
+
+        Raises
+        ------
+        ValueError
+            If the index is not the complete product of its levels.
+
+        See Also
+        --------
+        from_grid : inverse operation.
+
+        """
+        data = self.data.sort_index()
+        index = data.index
+        if isinstance(index, pd.MultiIndex):
+            index = index.remove_unused_levels()
+            levels = {
+                name: level.to_numpy()
+                for name, level in zip(index.names, index.levels)
+            }
+        else:
+            levels = {index.name: index.unique().to_numpy()}
+        shape = tuple(len(entries) for entries in levels.values())
+        if not index.is_unique or len(index) != np.prod(shape):
+            raise ValueError("performance map is not a complete grid.")
+        return levels, data.to_numpy().reshape(shape + (data.shape[1],))
+
+    @classmethod
+    def from_grid(cls, levels, values, columns):
+        """Build a performance map from a multidimensional array.
+
+        Parameters
+        ----------
+        levels : dict
+            Sorted entries of each level, with level names as keys.
+        values : array_like
+            Performance values, as returned by :meth:`to_grid`.
+        columns : :class:`~pandas.Index` or list
+            Names of the output quantities.
+
+        Returns
+        -------
+        :class:`~pandas.DataFrame`
+
+        """
+        values = np.asarray(values)
+        index = pd.MultiIndex.from_product(
+            list(levels.values()), names=list(levels)
+        )
+        data = values.reshape(len(index), values.shape[-1])
+        return pd.DataFrame(data, index=index, columns=columns)
+
+    def invert(self, quantity, along='freq', fractions=101):
+        """Build an inverse lookup table of the filled performance map.
+
+        The table gives the `along` level (e.g. the compressor frequency)
+        delivering a value of `quantity` at given operating conditions,
+        by interpolation instead of root-finding for each query.  See
+        :func:`costa.emulator.invert`.
+
+        Parameters
+        ----------
+        quantity : str
+            A column of the performance map, or ``'capacity'`` for the
+            total capacity in cooling mode.
+        along : str, default 'freq'
+            The level to express as a function of the quantity.
+        fractions : int or array_like, default 101
+            Fractions of the maximum of the quantity at which the level
+            is tabulated, or their number.
 
-    def write(self, filename, majororder='row'):
+        Returns
+        -------
+        :class:`~costa.emulator.InverseTable`
+
+        Examples
+        --------
+        >>> table = filled.pm.invert('capacity', along='freq')
+        >>> freq = table(conditions, values=loads)
+
+        """
+        # Deferred import: the emulator module depends on this one
+        from .emulator import invert
+
+        return invert(self.data, quantity, along=along, fractions=fractions)
+
+    def compact(self, rtol=1e-3, atol=0, levels=None):
+        """Remove entries that can be recovered by linear interpolation.
+
+        Along each level, interior entries are dropped as long as
+        interpolating linearly between the remaining ones gives back the
+        original values within tolerance.  Since the levels are processed
+        one after the other from the already reduced map, the tolerance
+        holds for the multilinear interpolation of the whole map.
+
+        Parameters
+        ----------
+        rtol, atol : float, default 1e-3 and 0
+            Relative and absolute tolerances on the interpolated values
+            (see :func:`~costa.interpolate.select_nodes`).
+        levels : list of str, optional
+            The levels to reduce, in processing order.  By default, the
+            levels among ``'Tdbo'``, ``'AFR'`` and ``'freq'``.
+
+        Returns
+        -------
+        compacted : :class:`~pandas.DataFrame`
+            The reduced performance map.
+        report : :class:`~pandas.DataFrame`
+            Maximum and mean absolute error, and maximum relative
+            error of the reduced map for each output quantity.
+
+        Raises
+        ------
+        ValueError
+            If the performance map is not a complete grid
+            (see :meth:`to_grid`).
+
+        Examples
+        --------
+        >>> hm = costa.build_heating_permap()
+        >>> hm.pm.entries['freq'] = np.arange(0.1, 2.1, 0.1)
+        >>> hm.pm.mode = 'heating'
+        >>> filled = hm.pm.fill()
+        >>> compacted, report = filled.pm.compact(rtol=1e-2)
+        >>> len(filled), len(compacted)
+        (1600, 1120)
+
+        """
+        grid_levels, values = self.to_grid()
+        names = list(grid_levels)
+        if levels is None:
+            levels = [n for n in ('Tdbo', 'AFR', 'freq') if n in names]
+        approx = values.astype(float)
+        nodes = {n: np.arange(len(v)) for n, v in grid_levels.items()}
+        for name in levels:
+            axis, entries = names.index(name), grid_levels[name]
+            kept = select_nodes(entries, approx, values, rtol, atol, axis)
+            approx = interp_linear(
+                entries, entries[kept], approx.take(kept, axis), axis=axis
+            )
+            nodes[name] = kept
+        compacted = self.from_grid(
+            {name: grid_levels[name][nodes[name]] for name in names},
+            values[np.ix_(*nodes.values())],
+            self.data.columns
+        )
+        error = abs(approx - values).reshape(-1, values.shape[-1])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            relative = error / abs(values.reshape(error.shape))
+        report = pd.DataFrame(
+            {
+                'max_abs_error': error.max(axis=0),
+                'mean_abs_error': error.mean(axis=0),
+                'max_rel_error': np.nanmax(
+                    np.where(error == 0, 0, relative), axis=0
+                )
+            },
+            index=self.data.columns
+        )
+        compacted = self.update_data(
+            compacted, update_ranges=False, keep_restrictions=True
+        )
+        return compacted, report
+
+    def save(self, filename, dtype=None):
+        """Save the performance map in a compact binary file.
+
+        Contrary to :meth:`write`, the file is meant to be read back with
+        :func:`~costa.buildpermap.load_permap`.  Only the entries of
+        each level are stored, together with the dense block of values,
+        in the NumPy ``.npz`` format.
+
+        Parameters
+        ----------
+        filename : str or path-like
+            The name of the file to be written to.
+        dtype : data-type, optional
+            Type of the stored values, e.g. :class:`numpy.float32`.
+            By default, the type of the data is kept.
+
+        """
+        levels, values = self.to_grid()
+        if dtype is not None:
+            values = values.astype(dtype, copy=False)
+        attributes = self._saved_attributes(levels)
+        arrays = {f'level{i}': v for i, v in enumerate(levels.values())}
+        with open(filename, 'wb') as f:
+            np.savez(
+                f, values=values, attributes=json.dumps(attributes), **arrays
+            )
+
+    def save_to_store(self, store, name, chunk_size=None):
+        """Save the performance map in a deduplicating map store.
+
+        The values are split into chunks identified by the hash of their
+        content, and only the chunks not yet in the store are written.
+        See :class:`~costa.store.MapStore`.
+
+        Parameters
+        ----------
+        store : :class:`~costa.store.MapStore`, str or path-like
+            The store, or its directory.
+        name : str
+            Name of the performance map in the store, replacing any map
+            with the same name.
+        chunk_size : int, optional
+            Size of the chunks in bytes, rounded down to whole rows, by
+            default :data:`costa.store.CHUNK_SIZE`.
+
+        Examples
+        --------
+        >>> filled.pm.save_to_store("maps", "unit-a")
+        >>> costa.MapStore("maps").load("unit-a")
+
+        """
+        # Deferred import: the store module depends on this one
+        from .store import MapStore
+
+        if not isinstance(store, MapStore):
+            store = MapStore(store)
+        store.save(self.data, name, chunk_size=chunk_size)
+
+    def _saved_attributes(self, levels):
+        """Return the attributes stored along with the values."""
+        return {
+            'mode': self.mode,
+            'normalized': self.normalized,
+            'columns': list(self.data.columns),
+            'levels': list(levels),
+            'ranges': {
+                name: [float(rng.left), float(rng.right)]
+                for name, rng in self.ranges.items()
+            }
+        }
+
+    def write(self, filename, majororder='row', parallel=None,
+              compression='infer'):
         """Write performance map to a file using a format compatible with
         the TRNSYS `Type 3254 <https://github.com/polymtl-bee/vcaahp-model>`_.
 
@@ -931,6 +1932,24 @@ class Permap:
             Choose to write the performance map either in
             `row- or column-major order
             <https://en.wikipedia.org/wiki/Row-_and_column-major_order>`_.
+        parallel : int, optional
+            If given, the values are written with a fixed width, so that
+            the position of each row in the file is known in advance, and
+            blocks of rows are formatted and written concurrently by
+            `parallel` processes.  Each level is written with as few
+            decimals as its entries need, and the values with 10
+            decimals.  By default, the rows are written one after the
+            other, with the shortest representation of each value.
+        compression : {'infer', 'gzip', 'bz2', 'xz', None}, default 'infer'
+            Compression of the file, inferred from the extension of
+            `filename` (``.gz``, ``.bz2`` or ``.xz``) by default.  The
+            rows are compressed as they are written.  Compressed files
+            cannot be written in parallel.
+
+        Examples
+        --------
+        >>> filled.pm.write("heating.dat", parallel=8)
+        >>> filled.pm.write("heating.dat.xz")
 
         """
         if not isinstance(majororder, str):
@@ -945,39 +1964,250 @@ class Permap:
             levels = permap_formatted.index.names
             flip_levels = [levels[0]] + levels[-1:0:-1]
             permap_formatted = permap_formatted.reorder_levels(flip_levels)
-        permap_formatted.sort_index().round(10).to_csv(filename, sep='\t')
-
-        def prepend_line(line):
-            with open(filename, 'r+') as f:
-                content = f.read()
-                f.seek(0, 0)
-                f.write(line.rstrip('\r\n') + '\n' + content)
+        permap_formatted = permap_formatted.sort_index()
+        header = self._type3254_header()
+        compression = _infer_compression(filename, compression)
+        if parallel is not None and compression is not None:
+            raise ValueError("compressed files cannot be written in parallel.")
+        if parallel is None:
+            with _open_text(filename, 'w', compression) as f:
+                f.write(header)
+                permap_formatted.round(10).to_csv(f, sep='\t')
+        else:
+            _write_fixed_width(
+                filename, header, permap_formatted.droplevel('!#'), parallel
+            )
 
+    def _type3254_header(self):
+        """Return the lines of a Type 3254 file preceding the values."""
         def fetch_index(i):
             index = self.data.index.get_level_values(i).unique()
             return index.name, index.values
 
-        prepend_line("!#\n!# Performance map\n!#")
-        nlevels = self.data.index.nlevels
-        for name, values in (fetch_index(i) for i in range(nlevels-1, -1, -1)):
-            values_str = '\t'.join(str(v) for v in values)
-            prepend_line(f"!# {name} values\n   {values_str}\n")
-        for name, values in (fetch_index(i) for i in range(nlevels-1, -1, -1)):
-            rng = self.ranges[name]
-            prepend_line(f"   {len(values)}\t{rng.left}\t{rng.right}\n")
-            s = f"!# Number of {name} data points, lower bound, upper bound\n"
-            prepend_line(s)
-
-        warning = (
-            "!# This is a data file for Type 3254. Do not change the format.\n"
+        lines = [
+            "!# This is a data file for Type 3254. Do not change the format.",
             "!# In PARTICULAR, LINES STARTING WITH !# MUST BE LEFT "
-            "IN THE FILE AT THEIR LOCATION.\n"
+            "IN THE FILE AT THEIR LOCATION.",
             '!# Comments within "normal lines" (not starting with !#) '
-            "are optional but the data must be there.\n"
-            "!#\n!# Independent variables\n!#"
+            "are optional but the data must be there.",
+            "!#", "!# Independent variables", "!#"
+        ]
+        nlevels = self.data.index.nlevels
+        for name, values in (fetch_index(i) for i in range(nlevels)):
+            rng = self.ranges[name]
+            lines.append(
+                f"!# Number of {name} data points, lower bound, upper bound"
+            )
+            lines.append(f"   {len(values)}\t{rng.left}\t{rng.right}")
+        for name, values in (fetch_index(i) for i in range(nlevels)):
+            lines.append(f"!# {name} values")
+            lines.append("   " + '\t'.join(str(v) for v in values))
+        lines.extend(["!#", "!# Performance map", "!#"])
+        return '\n'.join(lines) + '\n'
+
+
+_BLOCK_SIZE = 1 << 14
+
+
+_COMPRESSIONS = {
+    'gzip': ('.gz', gzip.open),
+    'bz2': ('.bz2', bz2.open),
+    'xz': ('.xz', lzma.open)
+}
+
+
+def _infer_compression(filename, compression='infer'):
+    """Return the compression of a file, possibly from its extension."""
+    if compression == 'infer':
+        suffix = os.path.splitext(os.fspath(filename))[1].lower()
+        for name, (extension, _) in _COMPRESSIONS.items():
+            if suffix == extension:
+                return name
+        return None
+    if compression is not None and compression not in _COMPRESSIONS:
+        raise ValueError(
+            f"compression must be one of {list(_COMPRESSIONS)}, "
+            "'infer' or None."
         )
+    return compression
+
+
+def _open_text(filename, mode, compression=None):
+    """Open a possibly compressed file in text mode."""
+    if compression is None:
+        return open(filename, mode)
+    return _COMPRESSIONS[compression][1](filename, mode + 't')
+
+
+_WRITE_BLOCK_SIZE = 1 << 16
+
+
+def _fixed_width_format(values, decimals):
+    """Return a printf-style format writing values with a fixed width."""
+    values = np.asarray(values)
+    finite = np.abs(values[np.isfinite(values)])
+    largest = finite.max(initial=0)
+    # The sign, the point and the strings 'nan' and '-inf' must fit
+    width = max(len(f"{largest:.{decimals}f}") + 1, 4)
+    return f"%{width}.{decimals}f"
+
+
+def _level_decimals(values, decimals=10):
+    """Return the fewest decimals representing the entries of a level."""
+    exact = np.round(values, decimals)
+    for fewer in range(decimals):
+        if np.array_equal(np.round(values, fewer), exact):
+            return fewer
+    return decimals
+
+
+def _format_rows(filename, offset, row_format, row_size, values):
+    """Format rows of values and write them at an offset of a file."""
+    buffer = (row_format * len(values)) % tuple(values.ravel().tolist())
+    data = buffer.encode('ascii')
+    if len(data) != row_size * len(values):
+        # Rows would overlap with the neighbouring blocks
+        raise ValueError("values do not fit in the fixed-width rows.")
+    descriptor = os.open(filename, os.O_WRONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        if hasattr(os, 'pwrite'):
+            while data:
+                written = os.pwrite(descriptor, data, offset)
+                data, offset = data[written:], offset + written
+        else:  # Windows
+            os.lseek(descriptor, offset, os.SEEK_SET)
+            with os.fdopen(descriptor, 'wb', closefd=False) as f:
+                f.write(data)
+    finally:
+        os.close(descriptor)
+
+
+def _write_fixed_width(filename, header, table, processes):
+    """Write the header and the rows of a table with a fixed width.
+
+    As all rows have the same length, the file is preallocated and blocks
+    of rows are written at their final position by several processes.
+    """
+    index = table.index
+    formats = [
+        _fixed_width_format(level, _level_decimals(level))
+        for level in index.levels
+    ] + [_fixed_width_format(table[column].to_numpy(float), 10)
+         for column in table.columns]
+    row_format = '\t' + '\t'.join(formats) + '\n'
+    values = np.column_stack(
+        [index.get_level_values(i).to_numpy(float)
+         for i in range(index.nlevels)]
+        + [np.round(table.to_numpy(float), 10)]
+    )
+    row_size = len(row_format % tuple(np.zeros(values.shape[1])))
+    header = (
+        header + '\t'.join(['!#', *index.names, *table.columns]) + '\n'
+    ).encode('ascii')
+    with open(filename, 'wb') as f:
+        f.write(header)
+        f.truncate(len(header) + row_size * len(values))
+    blocks = range(0, len(values), _WRITE_BLOCK_SIZE)
+    arguments = [
+        (filename, len(header) + start * row_size, row_format, row_size,
+         values[start:start + _WRITE_BLOCK_SIZE])
+        for start in blocks
+    ]
+    if processes > 1 and len(arguments) > 1:
+        with ProcessPoolExecutor(min(processes, len(arguments))) as pool:
+            for future in [pool.submit(_format_rows, *a) for a in arguments]:
+                future.result()
+    else:
+        for argument in arguments:
+            _format_rows(*argument)
+
+
+def _fill_gaps_along(data, level, method, extrapolation):
+    """Impute the missing points of a table along one level."""
+    frame = data.index.to_frame(index=False)
+    # Levels with one value for each entry of `level`, and conversely,
+    # are carried along instead of defining separate lines
+    partners = [
+        name for name in frame if name != level
+        and frame.groupby(level)[name].nunique().max() == 1
+        and frame.groupby(name)[level].nunique().max() == 1
+    ]
+    keys = [name for name in frame if name != level and name not in partners]
+    entries = np.unique(frame[level])
+    position = np.searchsorted(entries, frame[level])
+    if keys:
+        line = frame.groupby(keys, sort=False).ngroup().to_numpy()
+        lines = frame[keys].drop_duplicates().reset_index(drop=True)
+    else:
+        line, lines = np.zeros(len(frame), dtype=int), pd.DataFrame(index=[0])
+    values = np.full(
+        (len(lines), len(entries), data.shape[1]), np.nan,
+        dtype=np.result_type(data.dtypes.iloc[0], np.float32)
+    )
+    values[line, position] = data.to_numpy()
+    values = fill_missing(entries, values, axis=1, method=method,
+                          extrapolation=extrapolation)
+    # Rows of the complete grid, kept if they existed or were imputed
+    grid = lines.loc[lines.index.repeat(len(entries))].reset_index(drop=True)
+    grid[level] = np.tile(entries, len(lines))
+    carried = frame.groupby(level)[partners].first().reindex(entries)
+    for name in partners:
+        grid[name] = np.tile(carried[name].to_numpy(), len(lines))
+    values = values.reshape(-1, data.shape[1])
+    existed = np.zeros(len(grid), dtype=bool)
+    existed[line * len(entries) + position] = True
+    keep = existed | ~np.isnan(values).all(axis=1)
+    index = pd.MultiIndex.from_frame(grid[list(data.index.names)][keep])
+    filled = pd.DataFrame(values[keep], index=index, columns=data.columns)
+    return filled.sort_index()
+
+
+def _blockwise(function, size, threads=None):
+    """Call ``function(start, stop)`` on contiguous blocks of rows.
+
+    With several `threads`, the blocks are processed concurrently.  The
+    function should mostly run NumPy kernels, which release the GIL, and
+    write its results in place in a preallocated array.
+    """
+    blocks = 1 if threads is None else min(threads, -(-size // _BLOCK_SIZE))
+    if blocks <= 1:
+        function(0, size)
+        return
+    bounds = np.linspace(0, size, blocks + 1).astype(int)
+    with ThreadPoolExecutor(max_workers=blocks) as executor:
+        # Consume the results to propagate exceptions
+        list(executor.map(function, bounds[:-1], bounds[1:]))
+
+
+def _prepend_level(index, entries, name):
+    """Return the product of new entries (outer level) with an index.
+
+    This gives the same index as concatenating copies of a DataFrame
+    with the entries as keys, without building the copies.
+    """
+    outer_codes, outer_level = pd.factorize(pd.Index(entries))
+    if isinstance(index, pd.MultiIndex):
+        levels, codes = list(index.levels), list(index.codes)
+    else:
+        inner_codes, inner_level = pd.factorize(index)
+        levels, codes = [inner_level], [inner_codes]
+    return pd.MultiIndex(
+        levels=[outer_level] + levels,
+        codes=[np.repeat(outer_codes, len(index))]
+        + [np.tile(level_codes, len(entries)) for level_codes in codes],
+        names=[name] + list(index.names),
+        verify_integrity=False
+    )
+
 
-        prepend_line(warning)
+def _flatten(corrections, prefix=()):
+    """Return nested corrections as a flat dict with tuple keys."""
+    if not isinstance(corrections, dict):
+        return {prefix: corrections}
+    flat = {}
+    for key, value in corrections.items():
+        flat.update(_flatten(value, prefix + (key,)))
+    return flat
 
 
 class ADict(MutableMapping):
@@ -0,0 +1,201 @@
+"""
+The :mod:`~costa.pipeline` module runs many fills in a pipeline, so that
+reading manufacturer files, filling performance maps and writing them
+overlap instead of alternating.
+"""
+
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pandas as pd
+
+from .batch import detect_mode
+from .buildpermap import build_cooling_permap, build_heating_permap
+from .spec import _coerce, _write_output
+
+
+STAGES = ('read', 'fill', 'write')
+
+
+class PipelineReport(namedtuple('PipelineReport', ['stages', 'elapsed'])):
+    """Statistics of a pipeline run.
+
+    Attributes
+    ----------
+    stages : :class:`~pandas.DataFrame`
+        For each stage (``'read'``, ``'fill'`` and ``'write'``), the
+        number of workers, the number of tasks, the time spent working
+        (``'busy'``, in seconds) and the utilization of the workers, i.e.
+        the busy time divided by the elapsed time and the number of
+        workers.  A stage with a utilization close to 1 is the
+        bottleneck and would benefit from more workers.
+    elapsed : float
+        Elapsed time, in seconds.
+
+    """
+
+    __slots__ = ()
+
+
+def _read(spec):
+    """Build the base performance map of a specification."""
+    start = time.perf_counter()
+    mode = spec.mode
+    if mode is None:
+        if spec.source is None:
+            raise ValueError("'mode' is required without a source file.")
+        mode = detect_mode(spec.source)
+    build = {'cooling': build_cooling_permap,
+             'heating': build_heating_permap}[mode]
+    base = build(spec.source)
+    return (base, mode), time.perf_counter() - start
+
+
+def _fill(base, mode, spec):
+    """Fill a base performance map, possibly in another process.
+
+    Attributes of the accessor do not survive the process boundary, so
+    the mode and normalization state are returned along with the map.
+    """
+    start = time.perf_counter()
+    base.pm.mode = mode
+    filled = base.pm.apply_spec(spec)
+    state = {'mode': filled.pm.mode, 'normalized': filled.pm.normalized}
+    return (filled, state), time.perf_counter() - start
+
+
+def _write(filled, state, spec):
+    """Write a filled performance map to the output of a specification."""
+    start = time.perf_counter()
+    filled.pm.mode = state['mode']
+    filled.pm._normalized = state['normalized']
+    for level, bounds in spec.ranges.items():
+        filled.pm.ranges[level] = bounds
+    _write_output(filled, spec.output)
+    return spec.output['filename'], time.perf_counter() - start
+
+
+def run_pipeline(specs, read_threads=2, fill_processes=None,
+                 write_threads=2, queue_size=None):
+    """Run fill specifications in a pipeline.
+
+    Manufacturer files are read and performance maps are written in
+    pools of threads, while fills run in a pool of processes.  The three
+    stages overlap, and the number of specifications in progress is
+    bounded: reading is suspended while `queue_size` specifications are
+    waiting to be filled or written, which bounds memory use.
+
+    Parameters
+    ----------
+    specs : iterable of :class:`~costa.spec.FillSpec`, dict or str
+        The specifications, each with an output file name.
+    read_threads : int, default 2
+        Number of threads reading manufacturer files.
+    fill_processes : int, optional
+        Number of processes filling performance maps, by default the
+        number of CPUs.
+    write_threads : int, default 2
+        Number of threads writing performance maps.
+    queue_size : int, optional
+        Maximum number of specifications in progress, by default twice
+        the total number of workers.
+
+    Returns
+    -------
+    :class:`PipelineReport`
+        The utilization of each stage and the elapsed time.
+
+    Raises
+    ------
+    ValueError
+        If a specification has no output file name.
+
+    Examples
+    --------
+    >>> report = run_pipeline(specs, fill_processes=30)
+    >>> bottleneck = report.stages.utilization.idxmax()
+
+    """
+    specs = [_coerce(spec) for spec in specs]
+    if any(spec.output.get('filename') is None for spec in specs):
+        raise ValueError("specifications must have an output file name.")
+    fill_processes = fill_processes or os.cpu_count() or 1
+    workers = {'read': read_threads, 'fill': fill_processes,
+               'write': write_threads}
+    if queue_size is None:
+        queue_size = 2 * sum(workers.values())
+    slots = threading.Semaphore(queue_size)
+    lock = threading.Lock()
+    busy = dict.fromkeys(STAGES, 0.0)
+    tasks = dict.fromkeys(STAGES, 0)
+    errors = []
+
+    def record(stage, seconds):
+        with lock:
+            busy[stage] += seconds
+            tasks[stage] += 1
+
+    def fail(error):
+        errors.append(error)
+        slots.release()
+
+    def after_write(future):
+        try:
+            _, seconds = future.result()
+        except BaseException as error:
+            fail(error)
+            return
+        record('write', seconds)
+        slots.release()
+
+    # Errors are caught so that the slot of a failed specification is
+    # always released
+    def after_fill(future, spec):
+        try:
+            (filled, state), seconds = future.result()
+            record('fill', seconds)
+            writers.submit(_write, filled, state, spec).add_done_callback(
+                after_write
+            )
+        except BaseException as error:
+            fail(error)
+
+    def after_read(future, spec):
+        try:
+            (base, mode), seconds = future.result()
+            record('read', seconds)
+            fillers.submit(_fill, base, mode, spec).add_done_callback(
+                lambda future: after_fill(future, spec)
+            )
+        except BaseException as error:
+            fail(error)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(read_threads) as readers, \
+            ProcessPoolExecutor(fill_processes) as fillers, \
+            ThreadPoolExecutor(write_threads) as writers:
+        for spec in specs:
+            # Backpressure: wait for a specification to be completed
+            slots.acquire()
+            if errors:
+                slots.release()
+                break
+            readers.submit(_read, spec).add_done_callback(
+                lambda future, spec=spec: after_read(future, spec)
+            )
+        # Wait for all specifications in progress
+        for _ in range(queue_size):
+            slots.acquire()
+    elapsed = time.perf_counter() - start
+    if errors:
+        raise errors[0]
+    stages = pd.DataFrame({
+        'workers': pd.Series(workers),
+        'tasks': pd.Series(tasks),
+        'busy': pd.Series(busy),
+    }, index=list(STAGES))
+    stages['utilization'] = stages.busy / (elapsed * stages.workers)
+    return PipelineReport(stages, elapsed)
@@ -0,0 +1,381 @@
+"""
+The :mod:`~costa.spec` module describes fills declaratively, so that they
+can be saved, sent to worker processes and identified by a key.
+
+Pandas is only imported when a fill is run, so that specifications can
+be read and compared cheaply.
+"""
+
+import hashlib
+import json
+import os
+import re
+from functools import partial
+from pathlib import Path
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+
+FORMATS = ('type3254', 'npz')
+_CORRECTION_FUNCTIONS = ('weibull', 'compexp')
+
+
+class FillSpec:
+    """
+    Declarative description of a performance map fill.
+
+    All attributes are made of plain Python types (strings, numbers,
+    lists and dicts), so that a specification can be saved to and
+    loaded from JSON or TOML files.
+
+    Parameters
+    ----------
+    source : str, optional
+        Manufacturer data file, see
+        :func:`~costa.buildpermap.build_cooling_permap` and
+        :func:`~costa.buildpermap.build_heating_permap`.  By default,
+        the example data of the package is used.
+    mode : {'cooling', 'heating'}, optional
+        Operating mode, detected from the source file by default.
+    entries : dict, optional
+        Entries updating :attr:`Permap.entries
+        <costa.permap.Permap.entries>`.
+    initial_norm_values : dict, optional
+        Values updating :attr:`Permap.initial_norm_values
+        <costa.permap.Permap.initial_norm_values>`.
+    corrections : dict, optional
+        Corrections replacing the default ones, by input quantity and
+        output quantity, e.g. ``{'freq': {'power': p, 'COP': c}}``.  Two
+        output quantities must be given for each input quantity.  Each
+        correction is a dict, either with a ``'function'`` key
+        (``'weibull'`` or ``'compexp'``, see :mod:`costa.defaults`) and
+        the parameters of the function as other keys, or with ``'x'``
+        and ``'factors'`` keys (and optionally ``'method'`` and
+        ``'extrapolation'``) describing a
+        :class:`~costa.interpolate.TabulatedCorrection`.
+    norm : dict, optional
+        Rated values used to normalize the data, e.g.
+        ``{'capacity': 3.52, 'power': 0.79}``.
+    ranges : dict, optional
+        Operating ranges of the filled performance map, as
+        ``[lower, upper]`` bounds by level name.
+    dtype : str, optional
+        Floating point type of the filled values, e.g. ``'float32'``.
+    output : dict, optional
+        Output file, with the keys ``'filename'``, ``'format'``
+        (``'type3254'`` (default) or ``'npz'``) and, for the Type 3254
+        format, ``'majororder'`` and ``'compression'`` (see
+        :meth:`Permap.write <costa.permap.Permap.write>`).
+
+    Examples
+    --------
+    >>> spec = FillSpec(mode='heating', entries={'freq': [0.2, 0.6, 1]},
+    ...                 norm={'capacity': 4.69, 'power': 1.01},
+    ...                 output={'filename': 'heating.dat'})
+    >>> spec.save('heating.toml')
+    >>> FillSpec.load('heating.toml') == spec
+    True
+
+    """
+
+    _fields = (
+        'source', 'mode', 'entries', 'initial_norm_values', 'corrections',
+        'norm', 'ranges', 'dtype', 'output'
+    )
+
+    def __init__(self, source=None, mode=None, entries=None,
+                 initial_norm_values=None, corrections=None, norm=None,
+                 ranges=None, dtype=None, output=None):
+        """Constructor for the FillSpec class."""
+        if mode is not None and mode not in ('cooling', 'heating'):
+            raise ValueError("'mode' must be either 'cooling' or 'heating'.")
+        output = {} if output is None else dict(output)
+        if output.get('format', 'type3254') not in FORMATS:
+            raise ValueError(f"output format must be one of {FORMATS}.")
+        for quantity, outputs in (corrections or {}).items():
+            for correction in outputs.values():
+                _check_correction(correction)
+        self.source = None if source is None else os.fspath(source)
+        self.mode = mode
+        self.entries = _plain(entries or {})
+        self.initial_norm_values = _plain(initial_norm_values or {})
+        self.corrections = _plain(corrections or {})
+        self.norm = _plain(norm)
+        self.ranges = _plain(ranges or {})
+        self.dtype = None if dtype is None else _dtype_name(dtype)
+        self.output = _plain(output)
+
+    def to_dict(self):
+        """Return the specification as a dict, without empty fields."""
+        return {
+            field: getattr(self, field) for field in self._fields
+            if getattr(self, field) not in (None, {})
+        }
+
+    @classmethod
+    def from_dict(cls, spec):
+        """Build a specification from a dict.
+
+        Raises
+        ------
+        ValueError
+            If a key is not a field of the specification.
+
+        """
+        unknown = set(spec) - set(cls._fields)
+        if unknown:
+            raise ValueError(f"unknown specification fields: {unknown}.")
+        return cls(**spec)
+
+    @classmethod
+    def load(cls, filename):
+        """Load a specification from a JSON or TOML file."""
+        suffix = Path(filename).suffix.lower()
+        if suffix == '.toml':
+            if tomllib is None:
+                raise ImportError(
+                    "reading TOML files requires Python 3.11 or tomli."
+                )
+            with open(filename, 'rb') as f:
+                return cls.from_dict(tomllib.load(f))
+        with open(filename, 'r') as f:
+            return cls.from_dict(json.load(f))
+
+    def save(self, filename):
+        """Save the specification to a JSON or TOML file.
+
+        The format is chosen from the file extension (``.toml``, or JSON
+        otherwise).
+        """
+        with open(filename, 'w') as f:
+            if Path(filename).suffix.lower() == '.toml':
+                f.write('\n'.join(_toml_lines(self.to_dict())) + '\n')
+            else:
+                json.dump(self.to_dict(), f, indent=2)
+                f.write('\n')
+
+    def key(self):
+        """Return a key identifying the result of the fill.
+
+        Specifications giving the same filled performance map have the
+        same key.  The content of the source file is part of the key,
+        but not the output file name, apart from the compression it
+        implies.
+        """
+        spec = self.to_dict()
+        output = spec.pop('output', {})
+        spec['output'] = {
+            key: value for key, value in output.items() if key != 'filename'
+        }
+        if output.get('format', 'type3254') != 'npz':
+            from .permap import _infer_compression
+            spec['output']['compression'] = _infer_compression(
+                output.get('filename', ''), output.get('compression', 'infer')
+            )
+        if self.source is not None:
+            from .batch import file_hash
+            spec['source'] = file_hash(self.source)
+        encoded = json.dumps(spec, sort_keys=True).encode()
+        return hashlib.sha256(encoded).hexdigest()
+
+    def __eq__(self, other):
+        if not isinstance(other, FillSpec):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        arguments = ', '.join(
+            f"{field}={value!r}" for field, value in self.to_dict().items()
+        )
+        return f"{type(self).__name__}({arguments})"
+
+    def build_corrections(self):
+        """Return the corrections of the specification as callables."""
+        from . import defaults
+        from .interpolate import TabulatedCorrection
+
+        corrections = {}
+        for quantity, outputs in self.corrections.items():
+            corrections[quantity] = {}
+            for output, correction in outputs.items():
+                parameters = dict(correction)
+                if 'function' in parameters:
+                    function = getattr(defaults, parameters.pop('function'))
+                    new = partial(function, **parameters)
+                else:
+                    new = TabulatedCorrection(**parameters)
+                corrections[quantity][output] = new
+        return corrections
+
+
+def _check_correction(correction):
+    """Check the description of a correction."""
+    function = correction.get('function')
+    if function is None and not {'x', 'factors'} <= set(correction):
+        raise ValueError(
+            "corrections need either a 'function' or 'x' and 'factors'."
+        )
+    if function is not None and function not in _CORRECTION_FUNCTIONS:
+        raise ValueError(
+            f"correction function must be one of {_CORRECTION_FUNCTIONS}."
+        )
+
+
+def _plain(value):
+    """Convert arrays and scalars (e.g. from NumPy) to plain Python types."""
+    if isinstance(value, dict):
+        return {str(key): _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return value
+
+
+def _dtype_name(dtype):
+    """Return the name of a data type, e.g. ``'float32'``."""
+    return getattr(dtype, '__name__', None) or str(dtype)
+
+
+def _toml_key(key):
+    if re.fullmatch(r'[A-Za-z0-9_-]+', key):
+        return key
+    return json.dumps(key)
+
+
+def _toml_value(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (list, tuple)):
+        return '[' + ', '.join(_toml_value(item) for item in value) + ']'
+    if isinstance(value, str):
+        return json.dumps(value)
+    return repr(value)
+
+
+def _toml_lines(data, prefix=()):
+    """Return the lines of a TOML document describing nested dicts."""
+    lines, tables = [], []
+    for key, value in data.items():
+        if isinstance(value, dict):
+            tables.append((key, value))
+        elif value is not None:
+            lines.append(f"{_toml_key(key)} = {_toml_value(value)}")
+    for key, value in tables:
+        name = '.'.join(_toml_key(part) for part in prefix + (key,))
+        lines.extend(['', f"[{name}]"] + _toml_lines(value, prefix + (key,)))
+    return lines
+
+
+def _coerce(spec):
+    """Return a FillSpec from a FillSpec, a dict or a file name."""
+    if isinstance(spec, FillSpec):
+        return spec
+    if isinstance(spec, dict):
+        return FillSpec.from_dict(spec)
+    return FillSpec.load(spec)
+
+
+def run(spec):
+    """Run a fill described by a specification.
+
+    The base performance map is built from the source file, filled with
+    :meth:`Permap.apply_spec <costa.permap.Permap.apply_spec>`, and
+    written to the output file if one is given.
+
+    Parameters
+    ----------
+    spec : :class:`FillSpec`, dict or str
+        The specification, or the name of a JSON or TOML file.
+
+    Returns
+    -------
+    :class:`~pandas.DataFrame`
+        The filled performance map.
+
+    Examples
+    --------
+    >>> filled = costa.run("heating.toml")
+
+    """
+    from .batch import detect_mode
+    from .buildpermap import build_cooling_permap, build_heating_permap
+
+    spec = _coerce(spec)
+    mode = spec.mode
+    if mode is None:
+        if spec.source is None:
+            raise ValueError("'mode' is required without a source file.")
+        mode = detect_mode(spec.source)
+    build = {'cooling': build_cooling_permap,
+             'heating': build_heating_permap}[mode]
+    base = build(spec.source)
+    base.pm.mode = mode
+    filled = base.pm.apply_spec(spec)
+    if spec.output.get('filename') is not None:
+        _write_output(filled, spec.output)
+    return filled
+
+
+def _write_output(filled, output):
+    """Write a filled performance map to the output of a specification."""
+    if output.get('format', 'type3254') == 'npz':
+        filled.pm.save(output['filename'])
+    else:
+        filled.pm.write(
+            output['filename'], majororder=output.get('majororder', 'row'),
+            compression=output.get('compression', 'infer')
+        )
+
+
+def run_all(specs, jobs=1):
+    """Run several fills, once for each distinct specification.
+
+    Specifications with the same :meth:`~FillSpec.key` (e.g. the same
+    fill written to several files) are run only once, and the output is
+    copied to the other files.
+
+    Parameters
+    ----------
+    specs : iterable of :class:`FillSpec`, dict or str
+        The specifications, each with an output file name.
+    jobs : int, default 1
+        Number of processes filling the performance maps, which are
+        read and written in other threads (see
+        :func:`~costa.pipeline.run_pipeline`).
+
+    Returns
+    -------
+    dict
+        Lists of output file names, by specification key.
+
+    """
+    import shutil
+
+    unique = {}
+    for spec in map(_coerce, specs):
+        if spec.output.get('filename') is None:
+            raise ValueError("specifications must have an output file name.")
+        unique.setdefault(spec.key(), []).append(spec)
+    first = [duplicates[0] for duplicates in unique.values()]
+    if jobs > 1 and len(first) > 1:
+        from .pipeline import run_pipeline
+        run_pipeline(first, fill_processes=jobs)
+    else:
+        for spec in first:
+            run(spec)
+    filenames = {}
+    for key, (spec, *duplicates) in unique.items():
+        for duplicate in duplicates:
+            shutil.copyfile(spec.output['filename'],
+                            duplicate.output['filename'])
+        filenames[key] = [
+            duplicate.output['filename'] for duplicate in [spec, *duplicates]
+        ]
+    return filenames
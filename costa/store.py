@@ -0,0 +1,304 @@
+"""
+The :mod:`~costa.store` module keeps performance maps in a local
+content-addressed store, where identical blocks of values shared by
+several maps are stored only once.
+"""
+
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .buildpermap import _from_grid
+
+
+CHUNK_SIZE = 1 << 20
+_NAME = re.compile(r'[\w.-]+')
+
+
+class MapStore:
+    """Local store of performance maps with deduplicated values.
+
+    The values of each performance map are split into chunks of whole
+    rows, written once under the SHA-256 digest of their content.  A
+    small manifest per map, in JSON, gives the entries of the levels,
+    the attributes of the map and the list of its chunks.  Maps sharing
+    blocks of values (e.g. the same map under different names) therefore
+    cost about as much as their unique content.
+
+    Parameters
+    ----------
+    path : str or path-like
+        Directory of the store, created if needed.
+
+    Examples
+    --------
+    >>> store = MapStore("maps")
+    >>> store.save(filled, "unit-a")
+    >>> store.save(filled, "unit-b")
+    >>> store.usage()
+    maps                   2
+    chunks                 3
+    logical_bytes    5529600
+    stored_bytes     2764800
+    dtype: int64
+    >>> filled = store.load("unit-b")
+
+    """
+
+    def __init__(self, path):
+        """Constructor for the MapStore class."""
+        self.path = Path(path)
+        (self.path / 'chunks').mkdir(parents=True, exist_ok=True)
+        (self.path / 'maps').mkdir(exist_ok=True)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({os.fspath(self.path)!r})"
+
+    def __contains__(self, name):
+        return self._manifest_path(name).exists()
+
+    def __iter__(self):
+        return iter(self.names())
+
+    def __len__(self):
+        return len(self.names())
+
+    def names(self):
+        """Return the sorted names of the performance maps."""
+        manifests = (self.path / 'maps').glob('*.json')
+        return sorted(path.stem for path in manifests)
+
+    def _manifest_path(self, name):
+        if not _NAME.fullmatch(name):
+            raise ValueError(
+                "map names may only contain letters, digits, '_', '.' and '-'."
+            )
+        return self.path / 'maps' / f"{name}.json"
+
+    def _chunk_path(self, digest):
+        return self.path / 'chunks' / digest[:2] / digest
+
+    def _manifest(self, name):
+        """Return the manifest of a performance map."""
+        try:
+            with open(self._manifest_path(name), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise KeyError(name) from None
+
+    def save(self, permap, name, chunk_size=None):
+        """Save a performance map, writing only its new chunks.
+
+        Parameters
+        ----------
+        permap : :class:`~pandas.DataFrame`
+            A filled performance map.
+        name : str
+            Name of the performance map, replacing any map with the same
+            name.
+        chunk_size : int, optional
+            Size of the chunks in bytes, rounded down to whole rows, by
+            default :data:`CHUNK_SIZE`.  Maps only share chunks written
+            with the same size.
+
+        Returns
+        -------
+        int
+            The number of chunks written.
+
+        """
+        path = self._manifest_path(name)
+        levels, values = permap.pm.to_grid()
+        rows = np.ascontiguousarray(values.reshape(-1, values.shape[-1]))
+        row_size = rows.itemsize * rows.shape[1]
+        chunk_rows = max((chunk_size or CHUNK_SIZE) // row_size, 1)
+        digests, written = [], 0
+        for start in range(0, len(rows), chunk_rows):
+            chunk = rows[start:start + chunk_rows]
+            digest = hashlib.sha256(chunk).hexdigest()
+            digests.append(digest)
+            chunk_path = self._chunk_path(digest)
+            if chunk_path.exists():
+                # Reused chunks count as recent for collect_garbage
+                os.utime(chunk_path)
+            else:
+                chunk_path.parent.mkdir(exist_ok=True)
+                _write_atomically(chunk_path, chunk)
+                written += 1
+        manifest = {
+            'version': 1,
+            **permap.pm._saved_attributes(levels),
+            'entries': [entries.tolist() for entries in levels.values()],
+            'dtype': rows.dtype.str,
+            'rows': len(rows),
+            'chunk_rows': chunk_rows,
+            'chunks': digests
+        }
+        _write_atomically(path, json.dumps(manifest).encode())
+        return written
+
+    def load(self, name, dtype=None):
+        """Load a performance map.
+
+        The chunks are read directly into the array of values, without
+        intermediate copies.
+
+        Parameters
+        ----------
+        name : str
+            Name of the performance map.
+        dtype : data-type, optional
+            Type of the returned values.  By default, the stored type is
+            kept.
+
+        Returns
+        -------
+        :class:`~pandas.DataFrame`
+            The performance map, with its operating mode, ranges and
+            normalization state restored.
+
+        Raises
+        ------
+        KeyError
+            If there is no performance map with this name.
+        ValueError
+            If a chunk is missing or truncated.
+
+        """
+        manifest = self._manifest(name)
+        ncolumns = len(manifest['columns'])
+        values = np.empty(
+            (manifest['rows'], ncolumns), dtype=np.dtype(manifest['dtype'])
+        )
+        for start, digest in self._chunk_positions(manifest):
+            chunk = values[start:start + manifest['chunk_rows']]
+            with open(self._chunk_path(digest), 'rb') as f:
+                read = f.readinto(memoryview(chunk).cast('B'))
+            if read != chunk.nbytes:
+                raise ValueError(f"chunk {digest} of '{name}' is truncated.")
+        if dtype is not None:
+            values = values.astype(dtype, copy=False)
+        levels = dict(zip(manifest['levels'], manifest['entries']))
+        shape = tuple(len(entries) for entries in levels.values())
+        return _from_grid(levels, values.reshape(shape + (ncolumns,)),
+                          manifest)
+
+    def iter_chunks(self, name):
+        """Iterate over the chunks of a performance map.
+
+        Chunks are memory-mapped, so that maps larger than the memory
+        can be processed block by block.
+
+        Parameters
+        ----------
+        name : str
+            Name of the performance map.
+
+        Yields
+        ------
+        :class:`~pandas.DataFrame`
+            Consecutive rows of the performance map, backed by read-only
+            memory maps of the chunk files.
+
+        """
+        manifest = self._manifest(name)
+        index = pd.MultiIndex.from_product(
+            manifest['entries'], names=manifest['levels']
+        )
+        columns = pd.Index(manifest['columns'], name=manifest['mode'])
+        for start, digest in self._chunk_positions(manifest):
+            stop = min(start + manifest['chunk_rows'], manifest['rows'])
+            values = np.memmap(
+                self._chunk_path(digest), dtype=np.dtype(manifest['dtype']),
+                mode='r', shape=(stop - start, len(columns))
+            )
+            yield pd.DataFrame(values, index=index[start:stop],
+                               columns=columns)
+
+    def _chunk_positions(self, manifest):
+        """Return the first row and the digest of each chunk."""
+        for i, digest in enumerate(manifest['chunks']):
+            if not self._chunk_path(digest).exists():
+                raise ValueError(f"chunk {digest} is missing from the store.")
+            yield i * manifest['chunk_rows'], digest
+
+    def _chunk_paths(self):
+        """Iterate over the chunk files, without temporary files."""
+        for path in (self.path / 'chunks').glob('*/*'):
+            if not path.name.endswith('.tmp'):
+                yield path
+
+    def remove(self, name):
+        """Remove a performance map.
+
+        Its chunks are kept until :meth:`collect_garbage` is called.
+        """
+        try:
+            self._manifest_path(name).unlink()
+        except FileNotFoundError:
+            raise KeyError(name) from None
+
+    def collect_garbage(self):
+        """Delete the chunks no longer used by any performance map.
+
+        Chunks are written before the manifest of their map, so chunks
+        written or reused since the last change of the manifests (a map
+        saved or removed) may belong to a save in progress.  They are
+        kept until a later collection.
+
+        Returns
+        -------
+        int
+            The number of deleted chunks.
+
+        """
+        # Saving or removing a map changes the directory of manifests
+        last_change = (self.path / 'maps').stat().st_mtime_ns
+        used = {
+            digest for name in self.names()
+            for digest in self._manifest(name)['chunks']
+        }
+        deleted = 0
+        for path in self._chunk_paths():
+            if path.name in used or path.stat().st_mtime_ns >= last_change:
+                continue
+            path.unlink()
+            deleted += 1
+        return deleted
+
+    def usage(self):
+        """Return the number of maps and chunks and their sizes in bytes.
+
+        Returns
+        -------
+        :class:`~pandas.Series`
+            The number of maps and chunks, the total size of the maps
+            (``'logical_bytes'``) and the size of the stored chunks
+            (``'stored_bytes'``).
+
+        """
+        manifests = [self._manifest(name) for name in self.names()]
+        chunks = list(self._chunk_paths())
+        return pd.Series({
+            'maps': len(manifests),
+            'chunks': len(chunks),
+            'logical_bytes': sum(
+                manifest['rows'] * len(manifest['columns'])
+                * np.dtype(manifest['dtype']).itemsize
+                for manifest in manifests
+            ),
+            'stored_bytes': sum(path.stat().st_size for path in chunks)
+        })
+
+
+def _write_atomically(path, data):
+    """Write a file under a temporary name, then rename it."""
+    temporary = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(temporary, 'wb') as f:
+        f.write(data)
+    os.replace(temporary, path)
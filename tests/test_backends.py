@@ -0,0 +1,143 @@
+import importlib.util
+
+import pytest
+import numpy as np
+import pandas as pd
+from numpy.testing import assert_allclose
+
+import costa
+from costa import backends
+from costa.backends import (
+    BACKENDS, FLAG, NumpyBackend, benchmark, get_backend, set_backend,
+    use_backend
+)
+
+
+def _backend(name):
+    requires = BACKENDS[name].requires
+    if requires is not None and importlib.util.find_spec(requires) is None:
+        pytest.skip(f"{requires} is not installed")
+    return backends._instance(name)
+
+
+@pytest.fixture(params=list(BACKENDS))
+def backend(request):
+    return _backend(request.param)
+
+
+@pytest.fixture
+def reference():
+    return NumpyBackend()
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+@pytest.mark.parametrize('size', [100, 3 * backends._MIN_SIZE])
+class TestKernels:
+    @pytest.fixture
+    def arrays(self, size, dtype):
+        rng = np.random.default_rng(3254)
+        values = rng.uniform(0.1, 5, (size, 3)).astype(dtype)
+        values[::7] = FLAG
+        return {
+            'x': rng.uniform(0, 1.5, size).astype(dtype),
+            'values': values,
+            'factors': rng.uniform(0.5, 1.5, (4, 3)).astype(dtype),
+        }
+
+    def run(self, backend, kernel, shape, dtype, *args, **kwargs):
+        out = np.empty(shape, dtype)
+        getattr(backend, kernel)(*args, out=out, **kwargs)
+        return out
+
+    def test_corrections(self, backend, reference, arrays, dtype):
+        x = arrays['x']
+        rtol = 1e-5 if dtype == np.float32 else 1e-12
+        # Values close to zero lose their relative precision in all backends
+        atol = 4 * np.finfo(dtype).eps
+        for kernel, parameters in [('weibull', (1.0, 0.75, 2.3)),
+                                   ('compexp', (1.03, 0.47, 1.86, -0.16,
+                                                0.07))]:
+            assert_allclose(
+                self.run(backend, kernel, x.shape, dtype, x, *parameters),
+                self.run(reference, kernel, x.shape, dtype, x, *parameters),
+                rtol=rtol, atol=atol
+            )
+
+    def test_outer(self, backend, reference, arrays, dtype):
+        factors, values = arrays['factors'], arrays['values']
+        shape = (len(factors),) + values.shape
+        result = self.run(backend, 'outer', shape, dtype, factors, values)
+        assert_allclose(
+            result, self.run(reference, 'outer', shape, dtype, factors, values)
+        )
+        assert_allclose(result[2, 5], factors[2] * values[5])
+
+    @pytest.mark.parametrize('keep_flags', [False, True])
+    def test_scale(self, backend, reference, arrays, dtype, keep_flags):
+        values, factors = arrays['values'], arrays['factors'][0]
+        result = self.run(backend, 'scale', values.shape, dtype, values,
+                          factors, keep_flags=keep_flags)
+        assert_allclose(
+            result, self.run(reference, 'scale', values.shape, dtype, values,
+                             factors, keep_flags=keep_flags)
+        )
+        assert (result[::7] == FLAG).all() == keep_flags
+
+    def test_split_capacity(self, backend, reference, arrays, dtype):
+        values, ratio = arrays['values'], arrays['x'].clip(0, 1)
+        valid = values[:, 0] != FLAG
+        args = (values[:, 1], values[:, 0], ratio, valid)
+        result = self.run(backend, 'split_capacity', values.shape, dtype,
+                          *args)
+        assert_allclose(
+            result,
+            self.run(reference, 'split_capacity', values.shape, dtype, *args)
+        )
+        assert (result[~valid] == FLAG).all()
+        assert_allclose(result[valid, 1] + result[valid, 2],
+                        values[valid, 1], rtol=1e-6)
+
+
+@pytest.mark.parametrize('min_size', [backends._MIN_SIZE, 0])
+@pytest.mark.parametrize('mode', ['cooling', 'heating'])
+def test_fill(backend, mode, manufacturer_data_file, root, min_size,
+              monkeypatch):
+    # Without a minimum size, the kernels of the backend run on all blocks
+    monkeypatch.setattr(backends, '_MIN_SIZE', min_size)
+    build = {'cooling': costa.build_cooling_permap,
+             'heating': costa.build_heating_permap}[mode]
+    permap = build(manufacturer_data_file)
+    permap.pm.mode = mode
+    permap.pm.entries['freq'] = np.linspace(0.1, 1.4, 14)
+    rated_values = pd.DataFrame({'capacity': [3.52], 'power': [0.79]})
+    with use_backend(backend.name):
+        filled = permap.pm.fill(norm=rated_values)
+    with use_backend('numpy'):
+        expected = permap.pm.fill(norm=rated_values)
+    pd.testing.assert_frame_equal(filled, expected, rtol=1e-10)
+    if mode == 'cooling':
+        table = pd.read_pickle(root / "tests/data/filled-table-cooling.pkl")
+        pd.testing.assert_frame_equal(filled, table, rtol=1e-10)
+
+
+def test_selection():
+    previous = get_backend()
+    with use_backend('numpy') as backend:
+        assert get_backend() is backend
+        assert backend.name == 'numpy'
+    assert get_backend() is previous
+    assert set_backend('auto').name in backends.available_backends()
+    set_backend(previous.name)
+    with pytest.raises(ValueError):
+        set_backend('fortran')
+    assert get_backend() is previous
+
+
+def test_benchmark():
+    timings = benchmark(backends=['numpy'], rows=(1000,), repeat=1)
+    assert list(timings.columns) == ['numpy']
+    assert timings.index.names == ['kernel', 'rows']
+    assert set(timings.index.get_level_values('kernel')) == {
+        'weibull', 'compexp', 'outer', 'scale', 'split_capacity'
+    }
+    assert (timings > 0).all(axis=None)
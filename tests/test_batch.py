@@ -0,0 +1,68 @@
+import shutil
+from pathlib import Path
+
+import pytest
+
+import costa
+from costa.batch import detect_mode
+
+
+@pytest.fixture
+def input_dir(root, tmp_path):
+    directory = tmp_path / "input"
+    (directory / "sub").mkdir(parents=True)
+    for mode in ('cooling', 'heating'):
+        source = root / f"costa/resources/manufacturer-data-{mode}.txt"
+        shutil.copy(source, directory / f"{mode}.txt")
+        shutil.copy(source, directory / "sub" / f"{mode}.txt")
+    return directory
+
+
+@pytest.mark.parametrize('mode', ['cooling', 'heating'])
+def test_detect_mode(mode, manufacturer_data_file):
+    assert detect_mode(manufacturer_data_file) == mode
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_build_directory(input_dir, tmp_path, jobs):
+    output_dir = tmp_path / "output"
+    settings = {'entries': {'freq': [0.5, 1]}}
+    report = costa.build_directory(input_dir, output_dir, settings, jobs=jobs)
+    assert (report.status == 'built').all()
+    assert len(report) == 4
+    permap = costa.read_permap(output_dir / "sub" / "cooling.dat")
+    assert permap.pm.mode == 'cooling'
+    assert list(permap.index.unique('freq')) == [0.5, 1]
+
+    mtimes = {
+        path: Path(path).stat().st_mtime_ns for path in report.output
+    }
+    report = costa.build_directory(input_dir, output_dir, settings, jobs=jobs)
+    assert (report.status == 'unchanged').all()
+
+    # Only modified inputs are rebuilt
+    with open(input_dir / "heating.txt", 'a') as f:
+        f.write("\n")
+    report = costa.build_directory(input_dir, output_dir, settings, jobs=jobs)
+    assert list(report.index[report.status == 'built']) == ['heating.txt']
+    for path, mtime in mtimes.items():
+        if path != str(output_dir / "heating.dat"):
+            assert Path(path).stat().st_mtime_ns == mtime
+
+    # All inputs are rebuilt when settings change
+    settings['norm'] = {'capacity': 3, 'power': 1}
+    report = costa.build_directory(input_dir, output_dir, settings, jobs=jobs)
+    assert (report.status == 'built').all()
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_failed_job(input_dir, tmp_path, jobs):
+    output_dir = tmp_path / "output"
+    (input_dir / "broken.txt").write_text("not manufacturer data\n")
+    with pytest.raises(Exception):
+        costa.build_directory(input_dir, output_dir, jobs=jobs)
+    # The other maps are recorded, and not rebuilt on the next run
+    (input_dir / "broken.txt").unlink()
+    report = costa.build_directory(input_dir, output_dir, jobs=jobs)
+    assert (report.status == 'unchanged').all()
+    assert len(report) == 4
@@ -1,8 +1,22 @@
+import bz2
+import gzip
+import lzma
+
 import pytest
+import numpy as np
+from numpy import float32
 from pandas import read_pickle
 from pandas.testing import assert_frame_equal
 
-from costa.buildpermap import build_cooling_permap, build_heating_permap
+import costa.permap
+from costa.buildpermap import (
+    build_cooling_permap, build_heating_permap, read_permap
+)
+
+
+@pytest.fixture
+def filled_table(mode, root):
+    return read_pickle(root / f"tests/data/filled-table-{mode}.pkl")
 
 
 @pytest.fixture
@@ -17,3 +31,84 @@ def test_build_permap(mode, manufacturer_table, manufacturer_data_file):
                     'heating': build_heating_permap}[mode]
     table = build_permap(manufacturer_data_file)
     assert_frame_equal(table, manufacturer_table)
+
+
+@pytest.mark.parametrize('mode', ['cooling', 'heating'])
+def test_build_permap_dtype(mode, manufacturer_table, manufacturer_data_file):
+    build_permap = {'cooling': build_cooling_permap,
+                    'heating': build_heating_permap}[mode]
+    table = build_permap(manufacturer_data_file, dtype=float32)
+    assert (table.dtypes == float32).all()
+    assert_frame_equal(table, manufacturer_table, check_dtype=False)
+
+
+@pytest.mark.parametrize('majororder', ['row', 'col'])
+@pytest.mark.parametrize('mode', ['cooling', 'heating'])
+def test_read_permap(mode, majororder, filled_table, tmp_path):
+    filled_table.pm.write(tmp_path / "permap.dat", majororder=majororder)
+    table = read_permap(tmp_path / "permap.dat")
+    assert_frame_equal(table, filled_table, check_names=False)
+    assert table.pm.mode == mode
+    assert table.pm.ranges == filled_table.pm.ranges
+    chunks = list(read_permap(tmp_path / "permap.dat", chunksize=100))
+    assert sum(len(chunk) for chunk in chunks) == len(filled_table)
+
+
+@pytest.mark.parametrize('majororder', ['row', 'col'])
+@pytest.mark.parametrize('mode', ['cooling', 'heating'])
+def test_write_parallel(mode, majororder, filled_table, tmp_path,
+                        monkeypatch):
+    monkeypatch.setattr(costa.permap, '_WRITE_BLOCK_SIZE', 100)
+    filled_table.pm.write(tmp_path / "serial.dat", majororder=majororder)
+    filled_table.pm.write(tmp_path / "parallel.dat", majororder=majororder,
+                          parallel=2)
+    serial = (tmp_path / "serial.dat").read_text().splitlines()
+    parallel = (tmp_path / "parallel.dat").read_text().splitlines()
+    header = serial.index('!# Performance map') + 2
+    assert parallel[:header] == serial[:header]
+    assert len({len(line) for line in parallel[header + 1:]}) == 1
+    table = read_permap(tmp_path / "parallel.dat")
+    assert_frame_equal(table, read_permap(tmp_path / "serial.dat"))
+
+
+@pytest.mark.parametrize('mode', ['cooling', 'heating'])
+def test_write_parallel_non_finite(mode, filled_table, tmp_path,
+                                   monkeypatch):
+    # Non-finite values do not widen the fields of the finite ones
+    monkeypatch.setattr(costa.permap, '_WRITE_BLOCK_SIZE', 100)
+    table = filled_table.copy()
+    table.iloc[3, 0], table.iloc[150, 1], table.iloc[-1, 0] = (
+        np.inf, -np.inf, np.nan
+    )
+    table.pm.write(tmp_path / "serial.dat")
+    table.pm.write(tmp_path / "parallel.dat", parallel=2)
+    written = read_permap(tmp_path / "parallel.dat")
+    assert len(written) == len(table)
+    assert_frame_equal(written, read_permap(tmp_path / "serial.dat"))
+    with pytest.raises(ValueError):
+        costa.permap._format_rows(tmp_path / "parallel.dat", 0, "%4.1f",
+                                  4, np.array([[1234.5]]))
+
+
+@pytest.mark.parametrize('compression', ['gzip', 'bz2', 'xz'])
+@pytest.mark.parametrize('mode', ['cooling', 'heating'])
+def test_write_compressed(mode, compression, filled_table, tmp_path):
+    filled_table.pm.write(tmp_path / "permap.dat")
+    suffix = {'gzip': '.gz', 'bz2': '.bz2', 'xz': '.xz'}[compression]
+    inferred = tmp_path / f"permap.dat{suffix}"
+    filled_table.pm.write(inferred)
+    explicit = tmp_path / "permap.arc"
+    filled_table.pm.write(explicit, compression=compression)
+    opener = {'gzip': gzip.open, 'bz2': bz2.open, 'xz': lzma.open}
+    with opener[compression](inferred, 'rt') as f:
+        assert f.read() == (tmp_path / "permap.dat").read_text()
+    assert inferred.stat().st_size < (tmp_path / "permap.dat").stat().st_size
+    table = read_permap(inferred)
+    assert_frame_equal(table, read_permap(tmp_path / "permap.dat"))
+    assert_frame_equal(read_permap(explicit, compression=compression), table)
+    chunks = list(read_permap(inferred, chunksize=100))
+    assert sum(len(chunk) for chunk in chunks) == len(filled_table)
+    with pytest.raises(ValueError):
+        filled_table.pm.write(inferred, parallel=2)
+    with pytest.raises(ValueError):
+        filled_table.pm.write(explicit, compression='zip')
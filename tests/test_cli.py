@@ -0,0 +1,57 @@
+import json
+import shutil
+
+import pytest
+
+import costa
+from costa.cli import main
+
+
+@pytest.fixture
+def input_dir(root, tmp_path):
+    directory = tmp_path / "input"
+    directory.mkdir()
+    for mode in ('cooling', 'heating'):
+        source = root / f"costa/resources/manufacturer-data-{mode}.txt"
+        shutil.copy(source, directory / f"{mode}.txt")
+    return directory
+
+
+def test_build(input_dir, tmp_path, capsys):
+    output_dir = tmp_path / "output"
+    status = main([
+        'build', str(input_dir / "*.txt"), '-o', str(output_dir),
+        '--freq', '0.5', '1', '--rated-capacity', '3.5', '--rated-power', '1'
+    ])
+    assert status == 0
+    out = capsys.readouterr().out
+    assert "2 maps built, 0 unchanged" in out
+    permap = costa.read_permap(output_dir / "heating.dat")
+    assert list(permap.index.unique('freq')) == [0.5, 1]
+    main(['build', str(input_dir), '-o', str(output_dir), '--freq', '0.5',
+          '1', '--rated-capacity', '3.5', '--rated-power', '1', '--quiet'])
+    assert "0 maps built, 2 unchanged" in capsys.readouterr().out
+
+
+def test_job_file(input_dir, tmp_path, capsys):
+    job_file = tmp_path / "job.json"
+    job_file.write_text(json.dumps({
+        'inputs': [str(input_dir / "cooling.txt")],
+        'output_dir': str(tmp_path / "output"),
+        'settings': {'entries': {'AFR': [0.5, 1]}},
+        'jobs': 2
+    }))
+    main(['build', '--job-file', str(job_file), '--afr', '1'])
+    assert "1 maps built" in capsys.readouterr().out
+    permap = costa.read_permap(tmp_path / "output" / "cooling.dat")
+    assert list(permap.index.unique('AFR')) == [1]
+
+
+def test_errors(input_dir, tmp_path):
+    with pytest.raises(SystemExit):
+        main(['build', '-o', str(tmp_path)])
+    with pytest.raises(SystemExit):
+        main(['build', str(input_dir), '-o', str(tmp_path),
+              '--rated-power', '1'])
+    with pytest.raises(SystemExit):
+        main(['build', str(input_dir / "*.csv"), '-o', str(tmp_path)])
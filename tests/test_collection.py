@@ -0,0 +1,74 @@
+import pytest
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+import costa
+
+
+@pytest.fixture
+def permaps(mode, manufacturer_data_file):
+    build_permap = {'cooling': costa.build_cooling_permap,
+                    'heating': costa.build_heating_permap}[mode]
+    base = build_permap(manufacturer_data_file)
+    return {'small': base, 'large': 1.5 * base, 'medium': 1.2 * base}
+
+
+@pytest.fixture
+def rated():
+    return pd.DataFrame({'capacity': [3.5, 5, 4], 'power': [1, 1.2, 1.1]})
+
+
+@pytest.fixture
+def collection(mode, permaps):
+    fleet = costa.PermapCollection(permaps)
+    fleet.mode = mode
+    fleet.entries['freq'] = [0.2, 0.6, 1, 1.4]
+    return fleet
+
+
+@pytest.mark.parametrize('mode', ['cooling', 'heating'])
+class TestPermapCollection:
+    def test_stack(self, permaps, collection):
+        assert collection.values.shape[0] == len(permaps)
+        assert list(collection.units) == list(permaps)
+        for unit, permap in permaps.items():
+            assert_frame_equal(collection[unit], permap, check_names=False)
+
+    def test_mismatch(self, permaps):
+        truncated = permaps['small'].iloc[1:]
+        with pytest.raises(ValueError):
+            costa.PermapCollection([truncated, permaps['large']])
+
+    def test_fill(self, mode, permaps, collection, rated):
+        filled = collection.fill(norm=rated)
+        assert filled.normalized
+        for (unit, permap), i in zip(permaps.items(), range(len(rated))):
+            permap.pm.mode = mode
+            permap.pm.entries['freq'] = collection.entries['freq']
+            expected = permap.pm.fill(norm=rated.iloc[[i]])
+            assert_frame_equal(filled[unit], expected)
+            assert filled[unit].pm.ranges == expected.pm.ranges
+
+    def test_normalize(self, collection, rated):
+        normalized = collection.normalize(rated)
+        assert normalized.normalized
+        for i, unit in enumerate(collection):
+            expected = collection[unit].pm.normalize(rated.iloc[[i]])
+            assert_frame_equal(normalized[unit], expected)
+        with pytest.raises(RuntimeError):
+            normalized.normalize(rated)
+
+    def test_reduce(self, collection):
+        filled = collection.fill()
+        maxima = filled.reduce(np.max)
+        assert list(maxima.index) == list(collection.units)
+        for unit in collection:
+            assert (maxima.loc[unit] == filled[unit].max()).all()
+
+    def test_write(self, collection, tmp_path):
+        filled = collection.fill()
+        filenames = filled.write(str(tmp_path / "permap-{unit}.dat"))
+        assert len(filenames) == len(collection)
+        assert all((tmp_path / f"permap-{unit}.dat").exists()
+                   for unit in collection)
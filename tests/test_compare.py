@@ -0,0 +1,74 @@
+import pytest
+import numpy as np
+import pandas as pd
+
+import costa
+
+
+@pytest.fixture
+def filled_table(mode, root):
+    return pd.read_pickle(root / f"tests/data/filled-table-{mode}.pkl")
+
+
+@pytest.mark.parametrize('mode', ['cooling', 'heating'])
+class TestDiff:
+    def test_equal(self, filled_table):
+        report = costa.diff(filled_table, filled_table.copy())
+        assert report.equal
+        assert (report.summary.max_abs_error == 0).all()
+        shuffled = filled_table.sample(frac=1, random_state=0)
+        assert costa.diff(filled_table, shuffled).equal
+
+    def test_deviations(self, filled_table):
+        modified = filled_table.copy()
+        modified.iloc[7, 0] += 0.5
+        modified.iloc[100, 1] += 0.1
+        report = costa.diff(modified, filled_table, chunksize=64, worst=3)
+        assert not report.equal
+        summary = report.summary
+        assert summary.n_exceeding.sum() == 2
+        assert summary.max_abs_error.iloc[0] == pytest.approx(0.5)
+        assert summary.mean_abs_error.iloc[0] == pytest.approx(
+            0.5 / len(filled_table)
+        )
+        assert set(report.worst.index[:2]) == {
+            filled_table.index[7], filled_table.index[100]
+        }
+        assert len(report.worst) == 3
+        for name, level_report in report.levels.items():
+            assert set(level_report.index) == set(
+                filled_table.index.unique(name)
+            )
+            maxima = level_report.xs('max_abs_error', axis=1, level=1)
+            assert maxima.max().iloc[0] == pytest.approx(0.5)
+        assert costa.diff(modified, filled_table, atol=0.6).equal
+
+    def test_files(self, filled_table, tmp_path):
+        modified = filled_table.copy()
+        modified.iloc[-1, -1] += 1
+        filled_table.pm.write(tmp_path / "a.dat")
+        modified.pm.write(tmp_path / "b.dat")
+        from_files = costa.diff(tmp_path / "a.dat", tmp_path / "b.dat",
+                                chunksize=100)
+        in_memory = costa.diff(filled_table, modified)
+        assert from_files.summary.n_exceeding.sum() == 1
+        assert np.allclose(from_files.summary, in_memory.summary)
+
+    def test_mismatch(self, filled_table):
+        with pytest.raises(ValueError):
+            costa.diff(filled_table, filled_table.iloc[:-1], chunksize=50)
+        with pytest.raises(ValueError):
+            costa.diff(filled_table, filled_table, levels=['speed'])
+
+    def test_zero_tolerance(self, filled_table):
+        reference = filled_table.copy()
+        reference.iloc[5] = 0
+        modified = reference.copy()
+        modified.iloc[5, 0] = 1e-9
+        modified.iloc[50, 0] *= 2
+        report = costa.diff(modified, reference, atol=0, worst=2)
+        assert report.summary.n_exceeding.sum() == 2
+        assert report.worst.index[0] == reference.index[5]
+        excess = report.worst[('excess', '')]
+        assert np.isinf(excess.iloc[0]) and np.isfinite(excess.iloc[1])
+        assert costa.diff(reference, reference.copy(), atol=0).equal
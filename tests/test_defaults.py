@@ -2,9 +2,9 @@ from collections import namedtuple
 
 import pytest
 import numpy as np
-from numpy.testing import assert_almost_equal
+from numpy.testing import assert_allclose, assert_almost_equal
 
-from costa.defaults import default_correction
+from costa.defaults import compexp, default_correction, weibull
 
 
 Quantity = namedtuple('Quantity', ['name', 'value'])
@@ -61,3 +61,37 @@ def test_heating_corrections_values(pminput, pmoutput):
 def test_heating_corrections_asymptotic_behavior(mode, pminput, pmoutput):
     corr = default_correction(mode, pminput, pmoutput)
     assert np.isfinite(corr(np.inf))
+
+
+@pytest.mark.parametrize(
+    "function, parameters",
+    [
+        (weibull, (2.5121, 1.30389, 2.5551829)),
+        (compexp, (2.195, 0.5185, 2, 0.8884, 0.1868)),
+    ]
+)
+class TestKernels:
+    def test_out_buffer(self, function, parameters):
+        x = np.linspace(0, 2, 11)
+        out = np.empty_like(x)
+        result = function(x, *parameters, out=out)
+        assert result is out
+        assert_almost_equal(out, function(x, *parameters))
+
+    def test_single_precision(self, function, parameters):
+        x = np.linspace(0, 2, 11)
+        single = function(x.astype(np.float32), *parameters)
+        assert single.dtype == np.float32
+        double = function(x, *parameters)
+        assert_allclose(single, double, rtol=1e-5, atol=1e-6)
+
+    def test_parameters_matrix(self, function, parameters):
+        x = np.linspace(0, 2, 11)
+        scales = np.array([[1], [1.2], [1.5]])
+        args = [np.full_like(scales, p) for p in parameters]
+        args[1] = parameters[1] * scales
+        matrix = function(x, *args)
+        assert matrix.shape == (3, 11)
+        for row, scale in zip(matrix, scales[:, 0]):
+            params = (parameters[0], parameters[1] * scale, *parameters[2:])
+            assert_allclose(row, function(x, *params))
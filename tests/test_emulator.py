@@ -0,0 +1,95 @@
+import pytest
+import numpy as np
+import pandas as pd
+from numpy.testing import assert_allclose
+
+import costa
+from costa.emulator import evaluate, seasonal_performance
+
+
+@pytest.fixture
+def filled_table(mode, root):
+    return pd.read_pickle(root / f"tests/data/filled-table-{mode}.pkl")
+
+
+@pytest.fixture
+def conditions(filled_table):
+    rng = np.random.default_rng(3254)
+    return pd.DataFrame({
+        name: rng.uniform(rng_.left - 5, rng_.right + 5, 100)
+        for name, rng_ in costa.Permap.index_ranges(filled_table.index).items()
+    })
+
+
+@pytest.mark.parametrize('mode', ['cooling', 'heating'])
+class TestEmulator:
+    def test_nodes(self, filled_table):
+        valid = filled_table[(filled_table != -999).all(axis='columns')]
+        nodes = valid.index.to_frame(index=False)
+        performance = evaluate(filled_table, nodes)
+        assert_allclose(performance[valid.columns], valid.to_numpy())
+
+    def test_clamping(self, filled_table, conditions):
+        clamped = conditions.copy()
+        for name, rng in filled_table.pm.ranges.items():
+            clamped[name] = clamped[name].clip(rng.left, rng.right)
+        assert_allclose(
+            evaluate(filled_table, conditions),
+            evaluate(filled_table, clamped)
+        )
+
+    def test_collection(self, filled_table, conditions):
+        doubled = filled_table.where(filled_table == -999, 2 * filled_table)
+        fleet = costa.PermapCollection([filled_table, doubled])
+        single = evaluate(filled_table, conditions)
+        performance = evaluate(fleet, conditions)
+        assert_allclose(performance[0], single)
+        assert_allclose(performance[1].power, 2 * single.power)
+
+    def test_seasonal_performance(self, filled_table, conditions):
+        rated = pd.DataFrame({'capacity': [3], 'power': [1]})
+        summary = seasonal_performance(
+            filled_table, conditions, rated, timestep=0.5
+        )
+        performance = evaluate(filled_table, conditions, rated)
+        assert_allclose(
+            summary.energy_input, performance.power.sum() / 2
+        )
+        assert_allclose(
+            summary.SCOP,
+            performance.capacity.sum() / performance.power.sum()
+        )
+
+    def test_missing_conditions(self, filled_table, conditions):
+        with pytest.raises(ValueError):
+            evaluate(filled_table, conditions.drop(columns='freq'))
+
+    def test_invert(self, filled_table):
+        levels, _ = filled_table.pm.to_grid()
+        table = filled_table.pm.invert('capacity', fractions=401)
+        assert list(table.levels) == [name for name in levels
+                                      if name != 'freq']
+        rng = np.random.default_rng(3254)
+        conditions = pd.DataFrame({
+            name: rng.uniform(entries[0], entries[-1], 200)
+            for name, entries in table.levels.items()
+        })
+        conditions['capacity'] = rng.uniform(0.5, 4, 200)
+        freq = table(conditions)
+        performance = evaluate(filled_table, conditions.assign(freq=freq))
+        bounds = levels['freq'][[0, -1]]
+        inner = (freq > bounds[0] + 1e-6) & (freq < bounds[1] - 1e-6)
+        assert inner.sum() > 20
+        assert_allclose(performance.capacity[inner],
+                        conditions.capacity[inner], rtol=1e-3)
+        # Loads out of reach give the bounds of the frequency range
+        low = table(conditions, values=np.zeros(200))
+        assert_allclose(low.dropna(), bounds[0])
+        high = table(conditions, values=np.full(200, 100))
+        assert_allclose(high.dropna(), bounds[1])
+        with pytest.raises(ValueError):
+            table(conditions.drop(columns='Tdbo'))
+        with pytest.raises(ValueError):
+            filled_table.pm.invert('capacity', along='speed')
+        with pytest.raises(ValueError):
+            filled_table.pm.invert('COP')
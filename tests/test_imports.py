@@ -0,0 +1,89 @@
+import subprocess
+import sys
+
+import pytest
+
+
+def run(code):
+    """Run Python code in a fresh interpreter and return its output."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, check=True
+    )
+    return result.stdout, result.stderr
+
+
+def cumulative_import_time(stderr, module):
+    """Return the cumulative import time of a module in microseconds."""
+    for line in stderr.splitlines():
+        fields = line.split('|')
+        if line.startswith('import time:') and fields[-1].strip() == module:
+            return int(fields[1])
+    raise LookupError(module)
+
+
+@pytest.mark.parametrize('statement', [
+    'import costa',
+    'import costa.cli',
+    'from costa.batch import detect_mode, file_hash, settings_hash',
+    'from costa.spec import FillSpec',
+])
+def test_no_heavy_imports(statement):
+    out, _ = run(
+        f"{statement}; import sys; "
+        "print(sorted({'numpy', 'pandas'} & set(sys.modules)))"
+    )
+    assert out.strip() == '[]'
+
+
+def test_import_time():
+    # Importing costa must stay cheap compared with importing pandas
+    _, stderr = run('import costa; import pandas')
+    costa_time = cumulative_import_time(stderr, 'costa')
+    pandas_time = cumulative_import_time(stderr, 'pandas')
+    assert costa_time < pandas_time / 10
+
+
+@pytest.mark.parametrize('order', [
+    'import pandas as pd; import costa',
+    'import costa; import pandas as pd; costa.read_permap',
+    'import costa; import pandas as pd; costa.compare',
+    # Checking for an optional dependency must not prevent registration
+    'import costa, importlib.util; importlib.util.find_spec("pandas"); '
+    'import pandas as pd; costa.diff',
+])
+def test_accessor_registration(order):
+    out, _ = run(f"{order}; print(hasattr(pd.DataFrame, 'pm'))")
+    assert out.strip() == 'True'
+
+
+def test_no_import_hook():
+    out, _ = run(
+        "import sys; finders = list(sys.meta_path); import costa; "
+        "print(sys.meta_path == finders)"
+    )
+    assert out.strip() == 'True'
+
+
+@pytest.mark.parametrize('module', [
+    'backends', 'batch', 'buildpermap', 'cli', 'collection', 'compare',
+    'defaults', 'emulator', 'interpolate', 'permap', 'pipeline', 'spec',
+    'store'
+])
+def test_import_submodule_first(module):
+    # Submodules importing pandas register the accessor
+    out, _ = run(
+        f"import sys; import costa.{module}; "
+        "uses_pandas = 'pandas' in sys.modules; import pandas as pd; "
+        "print(uses_pandas, hasattr(pd.DataFrame, 'pm'))"
+    )
+    uses_pandas, registered = out.split()
+    assert registered == 'True' or uses_pandas == 'False'
+
+
+def test_lazy_attributes():
+    out, _ = run(
+        "import costa; import sys; "
+        "print(costa.Permap.__module__, 'costa.compare' in sys.modules)"
+    )
+    assert out.split() == ['costa.permap', 'False']
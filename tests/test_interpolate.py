@@ -0,0 +1,104 @@
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose
+
+from costa.interpolate import (
+    TabulatedCorrection, fill_missing, interp_linear, interp_pchip,
+    select_nodes
+)
+
+
+@pytest.fixture
+def table():
+    x = np.array([0, 0.3, 0.5, 1, 1.4, 2])
+    factors = np.array([0, 0.1, 0.5, 0.9, 1, 1.05])
+    return x, factors
+
+
+@pytest.mark.parametrize('method', ['linear', 'pchip'])
+def test_nodes_are_reproduced(method, table):
+    corr = TabulatedCorrection(*table, method=method)
+    assert_allclose(corr(table[0]), table[1])
+
+
+def test_linear_matches_numpy(table):
+    x = np.linspace(-1, 3, 41)
+    assert_allclose(interp_linear(x, *table), np.interp(x, *table))
+
+
+def test_pchip_is_monotone(table):
+    values = interp_pchip(np.linspace(0, 2, 201), *table)
+    assert np.all(np.diff(values) >= 0)
+
+
+@pytest.mark.parametrize('interp', [interp_linear, interp_pchip])
+def test_interpolation_along_axis(interp, table):
+    x, factors = table
+    data = np.stack([factors, 2 * factors, factors ** 2])
+    entries = np.linspace(0, 2, 7)
+    along_last = interp(entries, x, data)
+    assert along_last.shape == (3, 7)
+    assert_allclose(interp(entries, x, data.T, axis=0), along_last.T)
+    assert_allclose(along_last[1], 2 * along_last[0])
+
+
+@pytest.mark.parametrize('method', ['linear', 'pchip'])
+def test_extrapolation(method, table):
+    x, factors = table
+    constant = TabulatedCorrection(x, factors, method=method)
+    assert constant(-1) == factors[0] and constant(3) == factors[-1]
+    linear = TabulatedCorrection(x, 2 * x + 1, method, 'linear')
+    assert_allclose(linear([-1, 3]), [-1, 7])
+    with pytest.raises(ValueError):
+        TabulatedCorrection(x, factors, method, 'raise')(3)
+
+
+def test_scalar_evaluation(table):
+    assert np.ndim(TabulatedCorrection(*table)(0.75)) == 0
+
+
+def test_invalid_nodes():
+    with pytest.raises(ValueError):
+        TabulatedCorrection([0, 1, 1], [0, 1, 2])
+
+
+def test_from_csv(table, tmp_path):
+    csvfile = tmp_path / "correction.csv"
+    np.savetxt(csvfile, np.column_stack(table), delimiter=',',
+               header='freq,power', comments='')
+    corr = TabulatedCorrection.from_csv(csvfile, x='freq', factors='power')
+    assert_allclose(corr(table[0]), table[1])
+
+
+def test_select_nodes(table):
+    x, factors = table
+    data = np.stack([factors, np.ones_like(x)])
+    assert_allclose(select_nodes(x, data, rtol=0), np.arange(len(x)))
+    linear = select_nodes(x, 3 * x + 1, rtol=0, atol=1e-12)
+    assert_allclose(linear, [0, len(x) - 1])
+    nodes = select_nodes(x, data, atol=0.1)
+    assert nodes[0] == 0 and nodes[-1] == len(x) - 1
+    approx = interp_linear(x, x[nodes], data[:, nodes])
+    assert np.all(abs(approx - data) <= 0.1)
+
+
+def test_fill_missing(table):
+    x, factors = table
+    values = np.stack([factors, 2 * factors])
+    values[0, [0, 2]] = np.nan
+    values[1, [4, 5]] = np.nan
+    filled = fill_missing(x, values)
+    between = interp_linear(0.5, x[[1, 3]], factors[[1, 3]])
+    assert_allclose(filled[0, [0, 2]], [factors[1], between])
+    assert_allclose(filled[1, [4, 5]], 2 * factors[3])
+    assert_allclose(fill_missing(x, values.T, axis=0), filled.T)
+    extrapolated = fill_missing(x, values, extrapolation='linear')
+    assert_allclose(extrapolated[1, 5], 2 * interp_linear(
+        2, x[[2, 3]], factors[[2, 3]], extrapolation='linear'
+    ))
+    nearest = fill_missing(x, values, method='nearest')
+    assert_allclose(nearest[0, 2], factors[1])
+    with pytest.raises(ValueError):
+        fill_missing(x, values, extrapolation='raise')
+    with pytest.raises(ValueError):
+        fill_missing(x, values, method='cubic')
@@ -5,6 +5,7 @@ from pandas.testing import assert_frame_equal, assert_series_equal
 
 import costa
 from costa.defaults import build_default_corrections
+from costa.interpolate import interp_linear
 
 
 @pytest.fixture
@@ -155,6 +156,219 @@ class TestPermap:
         with pytest.raises(RuntimeError):
             permap_normalized.pm.normalize(rated_values)
 
+    def test_fill_normalization(self, mode, permap):
+        permap.pm.entries['freq'] = [0.2, 0.6, 1]
+        permap.pm.mode = mode
+        rated = pd.DataFrame({'capacity': [2.5], 'power': [0.5]})
+        filled = permap.pm.fill()
+        assert not filled.pm.normalized
+        if mode == 'cooling':
+            # SHR values are computed from the capacity after normalization
+            expected = filled.where(filled == -999, filled / 2.5)
+            expected['power'] = filled.power.where(
+                filled.power == -999, filled.power / 0.5
+            )
+        else:
+            expected = filled.pm.normalize(rated)
+        normalized = permap.pm.fill(norm=rated)
+        assert normalized.pm.normalized
+        assert_frame_equal(normalized, expected, check_exact=False)
+
+    def test_fill_dtype(self, mode, complete_permap, permap):
+        rated = pd.DataFrame({
+            'capacity': [{'cooling': 3.52, 'heating': 4.69}[mode]],
+            'power': [{'cooling': 0.79, 'heating': 1.01}[mode]]
+        })
+        single = permap.astype(np.float32).pm.copyattr(permap, deep=False)
+        compact = single.pm.fill(norm=rated, dtype=np.float32)
+        assert (compact.dtypes == np.float32).all()
+        assert compact.pm.normalized
+        assert compact.values.nbytes == complete_permap.values.nbytes / 2
+        assert_frame_equal(
+            compact, complete_permap, check_dtype=False, atol=1e-6
+        )
+
+    def test_fill_threads(self, mode, permap, monkeypatch):
+        permap.pm.mode = mode
+        permap.pm.entries['freq'] = np.arange(1, 11) / 10
+        rated = pd.DataFrame({'capacity': [2.5], 'power': [0.5]})
+        expected = permap.pm.fill(norm=rated)
+        # Small blocks so that all threads get some work
+        monkeypatch.setattr(costa.permap, '_BLOCK_SIZE', 16)
+        filled = permap.pm.fill(norm=rated, threads=4)
+        assert_frame_equal(filled, expected, check_exact=True)
+        assert_frame_equal(
+            permap.pm.normalize(rated, threads=3),
+            permap.pm.normalize(rated), check_exact=True
+        )
+
+    def test_normalize_many(self, mode, permap, tmp_path):
+        permap.pm.mode = mode
+        rated = [
+            pd.DataFrame({'capacity': [2.5], 'power': [0.5]}),
+            pd.DataFrame({'capacity': [4], 'COP': [3.2]})
+        ]
+        expected = [permap.pm.fill(norm=values) for values in rated]
+        variants = permap.pm.fill(norm=rated)
+        assert not isinstance(variants, list)  # computed one at a time
+        for normalized, reference in zip(variants, expected):
+            assert normalized.pm.normalized
+            assert_frame_equal(normalized, reference, check_exact=False)
+        filled = permap.pm.fill(dtype=np.float32)
+        filenames = [tmp_path / "a.dat", tmp_path / "b.dat"]
+        assert filled.pm.normalize_many(rated, filenames) == filenames
+        for filename, reference in zip(filenames, expected):
+            written = costa.read_permap(filename)
+            assert_frame_equal(written, reference, check_names=False,
+                               check_exact=False, rtol=1e-6)
+        with pytest.raises(ValueError):
+            filled.pm.normalize_many(rated, filenames[:1])
+
+    def test_fill_gaps(self, mode, permap):
+        permap.pm.mode = mode
+        holes = permap.copy()
+        holes.iloc[[3, 14], 0] = np.nan
+        holes.iloc[26] = np.nan
+        holes = holes.drop(holes.index[[7, 16]])
+        holes.pm.mode = mode
+        with pytest.warns(UserWarning):
+            holes.pm.fill()
+        filled, imputed = holes.pm.fill_gaps()
+        assert filled.pm.mode == mode
+        assert filled.index.equals(permap.index)
+        assert list(imputed.index) == list(permap.index[[3, 7, 14, 16, 26]])
+        assert imputed.iloc[0].tolist() == [True, False]
+        assert_frame_equal(filled.drop(imputed.index),
+                           permap.drop(imputed.index))
+        assert_frame_equal(filled, permap, rtol=0.1)
+        assert not filled.pm.fill().isna().to_numpy().any()
+        # A whole line is imputed along the second level
+        line = permap.index.get_level_values('Tdbr') == 18.3
+        holes = permap.mask(np.broadcast_to(line[:, np.newaxis], permap.shape))
+        filled, imputed = holes.pm.fill_gaps()
+        assert len(imputed) == line.sum()
+        assert_frame_equal(filled, permap, rtol=0.1)
+        nearest, _ = holes.pm.fill_gaps(method='nearest', levels=['Tdbr'])
+        assert not nearest.isna().to_numpy().any()
+        edge = permap.copy()
+        edge.iloc[0] = np.nan
+        with pytest.raises(ValueError):
+            edge.pm.fill_gaps(extrapolation='raise')
+        with pytest.raises(ValueError):
+            holes.pm.fill_gaps(levels=['AFR'])
+
+    def test_refill(self, mode, permap):
+        permap.pm.mode = mode
+        rated = pd.DataFrame({'capacity': [2.5], 'power': [0.5]})
+        previous = permap.pm.fill(norm=rated)
+        permap.pm.entries['freq'] = [0.1, 0.2, 0.5, 0.7, 1]
+        permap.pm.entries['AFR'] = [1e-5, 0.5, 1]
+        refilled = permap.pm.refill(previous, norm=rated)
+        full = permap.pm.fill(norm=rated)
+        assert_frame_equal(refilled, full)
+        assert refilled.pm.ranges == full.pm.ranges
+        assert refilled.pm.normalized
+        permap.pm.entries['freq'] = [0.5, 1]
+        assert_frame_equal(
+            permap.pm.refill(refilled, norm=rated), permap.pm.fill(norm=rated)
+        )
+        # Other changes trigger a complete fill
+        assert_frame_equal(permap.pm.refill(refilled), permap.pm.fill())
+
+    @pytest.mark.parametrize('dtype', [None, np.float32])
+    def test_apply_base_update(self, mode, permap, dtype):
+        permap.pm.mode = mode
+        rated = pd.DataFrame({'capacity': [2.5], 'power': [0.5]})
+        previous = permap.pm.fill(norm=rated, dtype=dtype)
+        permap.iloc[[3, 17]] *= [1.1, 0.9]
+        full = permap.pm.fill(norm=rated, dtype=dtype)
+        updated = permap.pm.apply_base_update(previous)
+        assert_frame_equal(updated, full, check_exact=True)
+        assert updated.pm.ranges == full.pm.ranges
+        assert updated.pm.normalized
+        if mode == 'cooling':
+            assert (updated == -999).any(axis=None)
+        # Only the blocks of the changed rows are patched
+        changed = (updated != previous).any(axis='columns')
+        assert 0 < changed.sum() < len(updated) / 4
+        assert_frame_equal(
+            permap.pm.apply_base_update(previous, permap.index[[3, 17]]),
+            full, check_exact=True
+        )
+        assert_frame_equal(
+            permap.pm.apply_base_update(updated, changed_rows=[]), full
+        )
+        # Other changes trigger a complete fill
+        permap.pm.entries['freq'] = [0.5, 1]
+        assert_frame_equal(
+            permap.pm.apply_base_update(updated),
+            permap.pm.fill(norm=rated, dtype=dtype)
+        )
+        with pytest.raises(ValueError):
+            permap.pm.apply_base_update(full.copy())
+
+    def test_grid(self, complete_permap):
+        levels, values = complete_permap.pm.to_grid()
+        assert list(levels) == complete_permap.index.names
+        assert values.shape[:-1] == tuple(len(v) for v in levels.values())
+        rebuilt = costa.Permap.from_grid(
+            levels, values, complete_permap.columns
+        )
+        assert_frame_equal(rebuilt, complete_permap)
+        with pytest.raises(ValueError):
+            complete_permap.iloc[1:].pm.to_grid()
+
+    @pytest.mark.parametrize('dtype', [None, np.float32])
+    def test_save(self, complete_permap, dtype, tmp_path):
+        filename = tmp_path / "permap.npz"
+        complete_permap.pm.save(filename, dtype=dtype)
+        loaded = costa.load_permap(filename)
+        assert loaded.pm.mode == complete_permap.pm.mode
+        assert loaded.pm.normalized
+        assert loaded.pm.ranges == complete_permap.pm.ranges
+        assert_frame_equal(
+            loaded, complete_permap, check_dtype=dtype is None, atol=1e-6
+        )
+
+    @pytest.mark.parametrize('rtol', [0, 1e-2])
+    def test_compact(self, complete_permap, rtol):
+        compacted, report = complete_permap.pm.compact(rtol=rtol)
+        assert len(compacted) <= len(complete_permap)
+        assert compacted.pm.ranges == complete_permap.pm.ranges
+        assert (report.max_rel_error <= rtol).all()
+        # Rebuild the full map by multilinear interpolation
+        levels, values = compacted.pm.to_grid()
+        full_levels, full_values = complete_permap.pm.to_grid()
+        for axis, (name, entries) in enumerate(full_levels.items()):
+            values = interp_linear(entries, levels[name], values, axis=axis)
+        tolerance = rtol * abs(full_values) + 1e-12
+        assert np.all(abs(values - full_values) <= tolerance)
+
+    def test_suggest_entries(self, mode, permap):
+        permap.pm.mode = mode
+        entries = permap.pm.suggest_entries('freq', tol=1e-2, bounds=(0.1, 2))
+        assert entries[0] == 0.1 and entries[-1] == 2
+        assert len(entries) < 20
+        freq = np.linspace(0.1, 2, 191)
+        for corr in permap.pm.corrections['freq'].values():
+            approx = np.interp(freq, entries, corr(entries))
+            assert np.all(abs(approx - corr(freq)) <= 1e-2)
+
+    def test_regrid(self, permap):
+        Tdbo = permap.index.unique('Tdbo').to_numpy()
+        assert_frame_equal(permap.pm.regrid({'Tdbo': Tdbo}), permap)
+        middle = (Tdbo[1:] + Tdbo[:-1]) / 2
+        regridded = permap.pm.regrid({'Tdbo': middle})
+        assert regridded.index.unique('Tdbo').equals(pd.Index(middle))
+        others = [name for name in permap.index.names if name != 'Tdbo']
+        expected = (
+            permap.groupby(level=others).rolling(2).mean()
+            .dropna().droplevel(0).to_numpy()
+        )
+        np.testing.assert_allclose(regridded.to_numpy(), expected)
+        with pytest.raises(ValueError):
+            permap.pm.regrid({'Tdbo': [Tdbo.max() + 1]})
+
     def test_copy(self, permap):
         copy = permap.pm.copy()
         assert_frame_equal(permap, copy)
@@ -227,6 +441,30 @@ class TestPermap:
         permap.pm._add_correction('freq', inplace=True)
         assert len(permap.pm.corrections['freq'].keys()) == 3
 
+    def test_add_tabulated_correction(self, mode, permap):
+        permap.pm.mode = mode
+        freq = np.linspace(0, 2, 9)
+        corrections = {
+            'power': costa.TabulatedCorrection(freq, freq),
+            'COP': costa.TabulatedCorrection(freq, 2 - freq / 2)
+        }
+        new = permap.pm.set_corrections('freq', corrections)
+        capacity = new.pm.corrections['freq']['capacity']
+        np.testing.assert_allclose(capacity(0.5), 0.5 * 1.75)
+        # The deduced correction is exact between the tabulated points
+        freq = np.array([0.2, 0.5, 1])
+        corrections = {
+            'power': costa.TabulatedCorrection(freq, [0.3, 0.6, 1]),
+            'COP': costa.TabulatedCorrection(freq, [1.5, 1.5, 1])
+        }
+        new = permap.pm.set_corrections('freq', corrections)
+        capacity = new.pm.corrections['freq']['capacity']
+        x = np.array([0.35, 0.75, 1.5])
+        np.testing.assert_allclose(
+            capacity(x), corrections['power'](x) * corrections['COP'](x)
+        )
+        np.testing.assert_allclose(capacity(0.75), 1)
+
     def test_add_missing_df_column(self, permap):
         assert len(permap.columns) == 2
         extended = costa.Permap._add_missing_df_column(permap)
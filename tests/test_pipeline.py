@@ -0,0 +1,67 @@
+import pytest
+from pandas.testing import assert_frame_equal
+
+import costa
+from costa.pipeline import run_pipeline
+from costa.spec import FillSpec, run
+
+
+@pytest.fixture
+def specs(root, tmp_path):
+    specs = []
+    for mode in ('cooling', 'heating'):
+        source = root / f"costa/resources/manufacturer-data-{mode}.txt"
+        for number, freq in enumerate([[0.5, 1], [0.2, 0.6, 1]]):
+            specs.append(FillSpec(
+                source=source,
+                entries={'freq': freq},
+                norm={'capacity': 3, 'power': 1},
+                ranges={'Tdbo': [-40, 50]},
+                output={'filename': str(tmp_path / f"{mode}-{number}.dat")}
+            ))
+    return specs
+
+
+def test_pipeline(specs):
+    report = run_pipeline(specs, read_threads=1, fill_processes=2,
+                          write_threads=1, queue_size=2)
+    stages = report.stages
+    assert list(stages.index) == ['read', 'fill', 'write']
+    assert (stages.tasks == len(specs)).all()
+    assert ((stages.utilization > 0) & (stages.utilization <= 1)).all()
+    for spec in specs:
+        written = costa.read_permap(spec.output['filename'])
+        expected = run(FillSpec.from_dict(spec.to_dict() | {'output': {}}))
+        assert_frame_equal(written, expected, check_names=False)
+        assert written.pm.ranges['Tdbo'].left == -40
+
+
+def test_pipeline_errors(specs, tmp_path):
+    specs[1] = FillSpec(source=tmp_path / "missing.txt", mode='heating',
+                        output={'filename': str(tmp_path / "missing.dat")})
+    with pytest.raises(FileNotFoundError):
+        run_pipeline(specs, fill_processes=1, queue_size=1)
+    with pytest.raises(ValueError):
+        run_pipeline([FillSpec(mode='heating')])
+
+
+def test_pipeline_npz(specs, tmp_path):
+    # The state of the accessor survives the fill processes
+    serial = []
+    for spec in specs[::2]:
+        filename = spec.output['filename'].replace('.dat', '.npz')
+        spec.output = {'filename': filename, 'format': 'npz'}
+        serial.append(filename.replace('.npz', '-serial.npz'))
+        run(FillSpec.from_dict(
+            spec.to_dict() | {'output': {'filename': serial[-1],
+                                         'format': 'npz'}}
+        ))
+    run_pipeline(specs[::2], read_threads=1, fill_processes=2,
+                 write_threads=1)
+    for spec, filename in zip(specs[::2], serial):
+        expected = costa.load_permap(filename)
+        loaded = costa.load_permap(spec.output['filename'])
+        assert loaded.pm.mode == expected.pm.mode is not None
+        assert loaded.pm.normalized and expected.pm.normalized
+        assert loaded.pm.ranges == expected.pm.ranges
+        assert_frame_equal(loaded, expected)
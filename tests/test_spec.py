@@ -0,0 +1,119 @@
+import json
+
+import pytest
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+import costa
+from costa.cli import main
+from costa.spec import FillSpec, run, run_all
+
+
+@pytest.fixture
+def spec(manufacturer_data_file, tmp_path):
+    return FillSpec(
+        source=manufacturer_data_file,
+        entries={'freq': np.array([0.2, 0.6, 1])},
+        initial_norm_values={'AFR': 1},
+        corrections={'freq': {
+            'power': {'function': 'weibull', 'amp': 2.5, 'scale': 1.3,
+                      'shape': 2.5},
+            'COP': {'x': [0, 0.5, 1.5], 'factors': [0.5, 1.2, 0.9],
+                    'method': 'pchip'}
+        }},
+        norm={'capacity': 4, 'power': 1},
+        ranges={'Tdbo': [-30, 50]},
+        dtype=np.float32,
+        output={'filename': str(tmp_path / "permap.dat")}
+    )
+
+
+@pytest.mark.parametrize('mode', ['cooling', 'heating'])
+class TestFillSpec:
+    @pytest.mark.parametrize('suffix', ['.json', '.toml'])
+    def test_save_load(self, spec, tmp_path, suffix):
+        spec.save(tmp_path / f"spec{suffix}")
+        loaded = FillSpec.load(tmp_path / f"spec{suffix}")
+        assert loaded == spec
+        assert loaded.key() == spec.key()
+        assert json.loads(json.dumps(spec.to_dict())) == spec.to_dict()
+
+    def test_key(self, spec, tmp_path):
+        other = FillSpec.from_dict(
+            spec.to_dict() | {'output': {'filename': 'other.dat'}}
+        )
+        assert other.key() == spec.key()
+        # The compression implied by the file name is part of the key
+        gzipped = FillSpec.from_dict(
+            spec.to_dict() | {'output': {'filename': 'other.dat.gz'}}
+        )
+        assert gzipped.key() != spec.key()
+        explicit = FillSpec.from_dict(spec.to_dict() | {
+            'output': {'filename': 'other.dat', 'compression': 'gzip'}
+        })
+        assert explicit.key() == gzipped.key()
+        other.entries['freq'] = [0.2, 1]
+        assert other.key() != spec.key()
+
+    def test_run(self, mode, spec):
+        filled = run(spec)
+        assert filled.pm.mode == mode
+        assert filled.pm.normalized
+        assert (filled.dtypes == np.float32).all()
+        assert list(filled.index.unique('freq')) == [0.2, 0.6, 1]
+        assert filled.pm.ranges['Tdbo'] == pd.Interval(-30, 50, 'both')
+        written = costa.read_permap(spec.output['filename'])
+        assert_frame_equal(written, filled.astype(float),
+                           check_names=False, atol=1e-6)
+
+    def test_apply_spec(self, mode, spec, manufacturer_data_file):
+        build = {'cooling': costa.build_cooling_permap,
+                 'heating': costa.build_heating_permap}[mode]
+        permap = build(manufacturer_data_file)
+        permap.pm.mode = mode
+        permap.pm.entries['freq'] = [0.2, 0.6, 1]
+        permap.pm.initial_norm_values['AFR'] = 1
+        permap = permap.pm.set_corrections(
+            'freq', spec.build_corrections()['freq']
+        )
+        norm = pd.DataFrame({'capacity': [4], 'power': [1]})
+        expected = permap.pm.fill(norm=norm, dtype=np.float32)
+        assert_frame_equal(permap.pm.apply_spec(spec), expected)
+
+    def test_run_all(self, spec, tmp_path, capsys):
+        copy = spec.to_dict()
+        copy['output'] = {'filename': str(tmp_path / "copy.dat")}
+        other = spec.to_dict()
+        other['entries'] = {'freq': [0.5, 1]}
+        other['output'] = {'filename': str(tmp_path / "other.dat"),
+                           'compression': 'gzip'}
+        gzipped = spec.to_dict()
+        gzipped['output'] = {'filename': str(tmp_path / "copy.dat.gz")}
+        filenames = run_all([spec, copy, other, gzipped])
+        assert len(filenames) == 3
+        assert (tmp_path / "other.dat").read_bytes()[:2] == b'\x1f\x8b'
+        assert (tmp_path / "copy.dat").read_text() == \
+            (tmp_path / "permap.dat").read_text()
+        assert_frame_equal(
+            costa.read_permap(tmp_path / "copy.dat.gz"),
+            costa.read_permap(tmp_path / "permap.dat")
+        )
+        for number, options in enumerate([spec, copy, other]):
+            FillSpec.from_dict(
+                options if isinstance(options, dict) else options.to_dict()
+            ).save(tmp_path / f"spec{number}.json")
+        specs = [str(tmp_path / f"spec{number}.json") for number in range(3)]
+        main(['run', *specs, '--jobs', '2'])
+        assert "2 fills for 3 specifications" in capsys.readouterr().out
+
+
+def test_invalid_spec():
+    with pytest.raises(ValueError):
+        FillSpec(mode='ventilation')
+    with pytest.raises(ValueError):
+        FillSpec.from_dict({'entry': {'freq': [1]}})
+    with pytest.raises(ValueError):
+        FillSpec(corrections={'freq': {'power': {'function': 'exp'}}})
+    with pytest.raises(ValueError):
+        run(FillSpec())
@@ -0,0 +1,92 @@
+import os
+import time
+
+import pytest
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+import costa
+
+
+@pytest.fixture
+def filled_table(mode, root):
+    table = pd.read_pickle(root / f"tests/data/filled-table-{mode}.pkl")
+    table.pm.mode = mode
+    return table
+
+
+@pytest.fixture
+def store(tmp_path):
+    return costa.MapStore(tmp_path / "store")
+
+
+def age_chunks(store, seconds=3600):
+    """Make the chunks look written some time ago."""
+    past = time.time_ns() - seconds * 10**9
+    for path in (store.path / "chunks").glob("*/*"):
+        os.utime(path, ns=(past, past))
+
+
+@pytest.mark.parametrize('mode', ['cooling', 'heating'])
+class TestMapStore:
+    def test_round_trip(self, mode, filled_table, store):
+        filled_table.pm.save_to_store(store, "unit-a", chunk_size=1024)
+        loaded = store.load("unit-a")
+        assert_frame_equal(loaded, filled_table, check_names=False)
+        assert loaded.pm.mode == mode
+        assert loaded.pm.ranges == filled_table.pm.ranges
+        single = store.load("unit-a", dtype=np.float32)
+        assert (single.dtypes == np.float32).all()
+        chunks = list(store.iter_chunks("unit-a"))
+        assert len(chunks) > 1
+        assert_frame_equal(pd.concat(chunks), filled_table,
+                           check_names=False)
+
+    def test_deduplication(self, filled_table, store):
+        assert store.save(filled_table, "unit-a", chunk_size=1024) > 1
+        assert store.save(filled_table, "unit-b", chunk_size=1024) == 0
+        modified = filled_table.copy()
+        modified.iloc[-1] = 1
+        assert store.save(modified, "unit-c", chunk_size=1024) == 1
+        usage = store.usage()
+        assert usage.maps == 3
+        assert usage.stored_bytes < usage.logical_bytes / 2
+        assert list(store) == ["unit-a", "unit-b", "unit-c"]
+        age_chunks(store)
+        store.remove("unit-c")
+        assert "unit-c" not in store
+        assert store.collect_garbage() == 1
+        assert_frame_equal(store.load("unit-b"), filled_table,
+                           check_names=False)
+
+    def test_errors(self, filled_table, store):
+        with pytest.raises(KeyError):
+            store.load("unit-a")
+        with pytest.raises(ValueError):
+            store.save(filled_table, "../unit-a")
+        store.save(filled_table, "unit-a", chunk_size=1024)
+        next((store.path / "chunks").glob("*/*")).unlink()
+        with pytest.raises(ValueError):
+            store.load("unit-a")
+
+    def test_concurrent_save(self, filled_table, store):
+        store.save(filled_table, "unit-a", chunk_size=1024)
+        saved = store.usage()
+        age_chunks(store)
+        # Chunks of a save in progress, whose manifest is not yet written
+        pending = store.path / "chunks" / "ab" / ("ab" + "0" * 62)
+        pending.parent.mkdir(exist_ok=True)
+        pending.write_bytes(b"pending")
+        temporary = pending.with_name(f"{pending.name}.123.tmp")
+        temporary.write_bytes(b"partial")
+        usage = store.usage()
+        assert store.collect_garbage() == 0
+        assert pending.exists()
+        # Temporary files are neither counted nor collected
+        assert usage.chunks == saved.chunks + 1
+        assert usage.stored_bytes == saved.stored_bytes + len(b"pending")
+        age_chunks(store)
+        store.remove("unit-a")
+        assert store.collect_garbage() == usage.chunks
+        assert temporary.exists()